@@ -0,0 +1,109 @@
+"""Peak memory and time of the image decode path, before and after scaled decoding.
+
+Each measurement runs in a fresh process so ``ru_maxrss`` reflects only that
+case. Run with ``python -m benchmarks.bench_decode [--sizes 12mp 48mp]``.
+"""
+
+import argparse
+import base64
+import io
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+from PIL import Image
+from math_assistant.config import Config
+from math_assistant.image_processor import ImageProcessor
+from benchmarks.fixtures import PHONE_RESOLUTIONS, phone_photo
+
+
+def legacy_process_image(path: Path) -> None:
+    """The process_image path before scaled decoding (full decode, then resize)."""
+    max_size = Config.MAX_IMAGE_SIZE
+    with Image.open(path) as img:
+        if img.mode not in ImageProcessor.VALID_MODES:
+            img = img.convert("RGB")
+        width, height = img.size
+        if width > max_size or height > max_size:
+            ratio = min(max_size / width, max_size / height)
+            img = img.resize(
+                (int(width * ratio), int(height * ratio)), Image.Resampling.LANCZOS
+            )
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=95, optimize=True)
+        base64.b64encode(buffer.getvalue())
+
+
+def legacy_estimate_file_size(path: Path) -> None:
+    """estimate_file_size before the proxy (re-encodes the full image)."""
+    with Image.open(path) as img:
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=95)
+
+
+CASES: Dict[str, Callable[[Path], object]] = {
+    "noop": lambda p: None,
+    "process_image (before)": legacy_process_image,
+    "process_image (after)": lambda p: ImageProcessor._encode(
+        p, Config.MAX_IMAGE_SIZE, ImageProcessor.DEFAULT_QUALITY
+    ),
+    "estimate_file_size (before)": legacy_estimate_file_size,
+    "estimate_file_size (after)": ImageProcessor.estimate_file_size,
+    "check_image": ImageProcessor.check_image,
+}
+
+
+def _measure(case: str, path: str, queue: "multiprocessing.Queue") -> None:
+    start = time.perf_counter()
+    CASES[case](Path(path))
+    elapsed = time.perf_counter() - start
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_kib //= 1024
+    queue.put((elapsed, peak_kib))
+
+
+def measure(case: str, path: Path) -> Tuple[float, int]:
+    """Run one case in a fresh process; return (seconds, peak RSS in KiB)."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()  # type: ignore[var-annotated]
+    process = ctx.Process(target=_measure, args=(case, str(path), queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", nargs="+", default=list(PHONE_RESOLUTIONS), choices=PHONE_RESOLUTIONS
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Generate fixtures in a child so this process stays small; Linux
+        # children inherit the parent's peak RSS when forked.
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(1) as pool:
+            paths = pool.starmap(phone_photo, [(Path(tmp), s) for s in args.sizes])
+
+        # Interpreter and import overhead, subtracted from every case
+        baseline = measure("noop", paths[0])[1]
+        print(f"{'image':<8} {'case':<30} {'time':>9} {'peak RSS':>12}")
+        for size, path in zip(args.sizes, paths):
+            for case in CASES:
+                if case == "noop":
+                    continue
+                elapsed, peak = measure(case, path)
+                print(
+                    f"{size:<8} {case:<30} {elapsed * 1000:>7.0f}ms "
+                    f"{(peak - baseline) / 1024:>+9.1f} MiB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Lookup latency of the perceptual-hash dedup index as it grows.
+
+Fills an index with random 64-bit hashes and times near-duplicate lookups
+(hits) and lookups of unseen hashes (misses) against a linear scan. Entries
+are added one at a time, as the assistant does, so filling a large index takes
+a minute or two. Run with
+``python -m benchmarks.bench_dedup [--entries 100000] [--distance 6]``.
+"""
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+from math_assistant.dedup import DedupIndex, hamming
+
+
+def timed(lookup: Callable[[int], object], queries: List[int]) -> List[float]:
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        lookup(query)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def report(name: str, times: List[float]) -> None:
+    times = sorted(times)
+    p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+    print(f"{name:<22} p50 {statistics.median(times):>7.3f} ms  p99 {p99:>7.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--distance", type=int, default=6)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image = Path(tmp) / "page.jpg"
+        image.write_bytes(b"not really an image")
+        index = DedupIndex(Path(tmp) / "dedup.sqlite3", args.distance)
+        hashes = [rng.getrandbits(64) for _ in range(args.entries)]
+
+        start = time.perf_counter()
+        for image_hash in hashes:
+            index.add(image_hash, "explain", image, {})
+        print(
+            f"{args.entries} entries added in {time.perf_counter() - start:.1f}s, "
+            f"max distance {args.distance}"
+        )
+
+        def near(image_hash: int) -> int:
+            for bit in rng.sample(range(64), rng.randint(0, args.distance)):
+                image_hash ^= 1 << bit
+            return image_hash
+
+        hits = [near(rng.choice(hashes)) for _ in range(args.queries)]
+        misses = [rng.getrandbits(64) for _ in range(args.queries)]
+
+        def linear(query: int) -> object:
+            return min(hashes, key=lambda stored: hamming(query, stored))
+
+        report(
+            "index, near-duplicate", timed(lambda q: index.lookup(q, "explain"), hits)
+        )
+        report("index, unseen", timed(lambda q: index.lookup(q, "explain"), misses))
+        report("linear scan", timed(linear, misses[:20]))
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Time ImageProcessor and ResponseFormatter hot paths against a saved baseline.
+
+``run`` times ``process_image``, ``check_image`` and ``estimate_file_size``
+on synthetic phone-photo JPEGs, PNG scans, RGBA and palette images, and
+``clean_text``, ``format_steps``, ``rich_print`` and ``to_markdown`` on long
+responses (synthetic, or the ones recorded in a ``--record`` cassette). The
+image cache is disabled so every call does the work. Each benchmark reports
+the fastest of several repeats, per call. ``compare`` flags benchmarks that
+got slower than the baseline by more than a threshold and exits non-zero if
+any did. Run with::
+
+    python -m benchmarks.bench_hotpaths run --save baseline.json
+    python -m benchmarks.bench_hotpaths run --compare baseline.json [--threshold 10]
+    python -m benchmarks.bench_hotpaths compare baseline.json current.json
+
+Timings only compare on the same machine; the saved file records which.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, TypedDict
+from anthropic.types import TextBlock
+from math_assistant.config import Config
+from math_assistant.formatters import ResponseFormatter
+from math_assistant.image_processor import ImageProcessor
+from benchmarks.fixtures import (
+    PHONE_RESOLUTIONS,
+    SCAN_RESOLUTIONS,
+    long_response,
+    palette_png,
+    phone_photo,
+    png_scan,
+    recorded_responses,
+    rgba_screenshot,
+)
+
+DEFAULT_THRESHOLD = 10.0
+
+
+class Timing(TypedDict):
+    """Type definition for the timing of one benchmark, in seconds per call."""
+
+    min: float
+    median: float
+    number: int
+    repeat: int
+
+
+def measure(func: Callable[[], object], repeat: int) -> Timing:
+    """Time a call: loops of at least 0.2s, repeated, divided per call."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [total / number for total in timer.repeat(repeat, number)]
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def image_cases(directory: Path, quick: bool) -> Dict[str, Path]:
+    """Generate the image fixtures, by case name."""
+    photos = list(PHONE_RESOLUTIONS)[:1] if quick else list(PHONE_RESOLUTIONS)
+    scans = list(SCAN_RESOLUTIONS)[:1] if quick else list(SCAN_RESOLUTIONS)
+    images = {f"jpeg_{name}": phone_photo(directory, name) for name in photos}
+    images.update({f"png_{name}": png_scan(directory, name) for name in scans})
+    images["rgba_1920x1080"] = rgba_screenshot(directory)
+    images["palette_1600x1200"] = palette_png(directory)
+    return images
+
+
+def benchmarks(
+    images: Dict[str, Path], responses: Dict[str, str]
+) -> Dict[str, Callable[[], object]]:
+    """Every benchmark, by name."""
+    cases: Dict[str, Callable[[], object]] = {}
+    for name, path in images.items():
+        cases[f"process_image[{name}]"] = partial(ImageProcessor.process_image, path)
+        cases[f"check_image[{name}]"] = partial(ImageProcessor.check_image, path)
+        cases[f"estimate_file_size[{name}]"] = partial(
+            ImageProcessor.estimate_file_size, path
+        )
+    for name, text in responses.items():
+        # Responses arrive as a list of content blocks
+        blocks = [TextBlock(type="text", text=text)]
+        cases[f"clean_text[{name}]"] = partial(ResponseFormatter.clean_text, blocks)
+        cases[f"format_steps[{name}]"] = partial(ResponseFormatter.format_steps, text)
+        cases[f"rich_print[{name}]"] = partial(ResponseFormatter.rich_print, blocks)
+        cases[f"to_markdown[{name}]"] = partial(ResponseFormatter.to_markdown, blocks)
+    return cases
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    """Run the selected benchmarks and return the results document."""
+    Config.IMAGE_CACHE_ENABLED = False
+    responses = {
+        "synthetic_30_steps": long_response(30),
+        "synthetic_120_steps": long_response(120, seed=1),
+    }
+    if args.responses:
+        recorded = recorded_responses(args.responses)
+        # The longest recorded answers are the interesting ones
+        for i, text in enumerate(sorted(recorded, key=len, reverse=True)[:3]):
+            responses[f"recorded_{i}"] = text
+
+    with contextlib.ExitStack() as stack:
+        directory = Path(
+            args.fixtures or stack.enter_context(tempfile.TemporaryDirectory())
+        )
+        directory.mkdir(parents=True, exist_ok=True)
+        cases = benchmarks(image_cases(directory, args.quick), responses)
+        pattern = re.compile(args.filter) if args.filter else None
+
+        results: Dict[str, Timing] = {}
+        for name, func in cases.items():
+            if pattern and not pattern.search(name):
+                continue
+            # rich_print writes to the console
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[name] = measure(func, args.repeat)
+            print(f"{name:<48} {results[name]['min'] * 1000:>10.3f} ms")
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(
+    baseline: Dict[str, object], current: Dict[str, object], threshold: float
+) -> List[str]:
+    """Print a comparison table; return the names of regressed benchmarks."""
+    if baseline.get("machine") != current.get("machine"):
+        print("warning: baseline was recorded on a different machine or Python")
+    before: Dict[str, Timing] = baseline["benchmarks"]  # type: ignore[assignment]
+    after: Dict[str, Timing] = current["benchmarks"]  # type: ignore[assignment]
+    regressions = []
+    print(f"{'benchmark':<48} {'baseline':>11} {'current':>11} {'change':>8}")
+    for name in sorted(after):
+        if name not in before:
+            print(f"{name:<48} {'':>11} {after[name]['min'] * 1000:>9.3f}ms {'new':>8}")
+            continue
+        old, new = before[name]["min"], after[name]["min"]
+        change = (new / old - 1) * 100 if old else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(
+            f"{name:<48} {old * 1000:>9.3f}ms {new * 1000:>9.3f}ms "
+            f"{change:>+7.1f}%{flag}"
+        )
+    not_run = len(set(before) - set(after))
+    if not_run:
+        print(f"({not_run} baseline benchmarks were not run)")
+    return regressions
+
+
+def load(path: str) -> Dict[str, object]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def report(regressions: List[str], threshold: float) -> int:
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) more than {threshold:g}% slower")
+        return 1
+    print(f"No regressions above {threshold:g}%")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--save", help="Write the results to this JSON file")
+    run_parser.add_argument("--compare", help="Baseline JSON to compare against")
+    run_parser.add_argument("--filter", help="Only run benchmarks matching this regex")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument(
+        "--quick", action="store_true", help="One photo and one scan resolution"
+    )
+    run_parser.add_argument(
+        "--responses", help="Also format the responses recorded in this cassette"
+    )
+    run_parser.add_argument(
+        "--fixtures", help="Keep generated images here and reuse them next time"
+    )
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Percent slowdown reported as a regression (default: 10)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        regressions = compare(load(args.baseline), load(args.current), args.threshold)
+        return report(regressions, args.threshold)
+
+    results = run(args)
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Results written to {args.save}")
+    if args.compare:
+        print()
+        regressions = compare(load(args.compare), results, args.threshold)
+        return report(regressions, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
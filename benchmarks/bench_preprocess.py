@@ -0,0 +1,72 @@
+"""Throughput of bulk image preprocessing, sequential versus a process pool.
+
+The image cache is disabled so every run encodes every image. Run with
+``python -m benchmarks.bench_preprocess [--images 16] [--workers 1 2 4]``.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+from math_assistant.config import Config
+from math_assistant.image_processor import ImageProcessor
+from benchmarks.fixtures import PHONE_RESOLUTIONS, phone_photo
+
+
+def sequential(paths: List[Path]) -> None:
+    for path in paths:
+        ImageProcessor.encode_for_api(path)
+
+
+def pooled(paths: List[Path], workers: int) -> None:
+    for result in ImageProcessor.process_many(paths, workers=workers):
+        if result["error"]:
+            raise RuntimeError(result["error"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument(
+        "--size", default="12mp", choices=PHONE_RESOLUTIONS, help="Photo resolution"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+    )
+    args = parser.parse_args()
+    Config.IMAGE_CACHE_ENABLED = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = phone_photo(Path(tmp), args.size)
+        paths = []
+        for i in range(args.images):
+            path = Path(tmp) / f"scan_{i:03d}.jpg"
+            shutil.copyfile(source, path)
+            paths.append(path)
+
+        print(f"{args.images} x {args.size} JPEG, {os.cpu_count()} CPUs")
+        start = time.perf_counter()
+        sequential(paths)
+        base = time.perf_counter() - start
+        print(f"{'sequential':<14} {base:>7.2f}s {args.images / base:>7.1f} img/s")
+
+        for workers in args.workers:
+            start = time.perf_counter()
+            pooled(paths, workers)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{f'{workers} workers':<14} {elapsed:>7.2f}s "
+                f"{args.images / elapsed:>7.1f} img/s  x{base / elapsed:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,79 @@
+"""Cold-start import cost of the CLI, checked against a budget.
+
+Runs ``python -X importtime -c "import math_assistant.cli"`` in fresh
+interpreters, reports the fastest cumulative import time and the slowest
+packages, and exits non-zero if the budget is exceeded. Run with
+``python -m benchmarks.bench_startup [--budget-ms 150] [--runs 5]``.
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Modules the CLI must not import before a command needs them
+HEAVY_MODULES: Tuple[str, ...] = ("anthropic", "PIL", "rich")
+
+DEFAULT_BUDGET_MS = 150.0
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def importtime(module: str = "math_assistant.cli") -> Dict[str, int]:
+    """Import a module in a fresh interpreter; return cumulative µs per top-level import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    totals: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            totals[match.group(4)] = int(match.group(2))
+    return totals
+
+
+def heavy_imports(module: str = "math_assistant.cli") -> List[str]:
+    """Return the heavy packages a fresh import of a module pulls in."""
+    code = (
+        f"import sys, {module}; "
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return result.stdout.split()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="math_assistant.cli")
+    args = parser.parse_args()
+
+    runs = [importtime(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda totals: totals[args.module])
+    total_ms = best[args.module] / 1000
+
+    print(f"import {args.module}: {total_ms:.1f}ms (best of {args.runs})")
+    slowest = sorted(best.items(), key=lambda item: item[1], reverse=True)[1:8]
+    for name, micros in slowest:
+        print(f"  {name:<40} {micros / 1000:>7.1f}ms")
+
+    failures = []
+    heavy = heavy_imports(args.module)
+    if heavy:
+        failures.append(f"imports heavy packages at startup: {', '.join(heavy)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"{total_ms:.1f}ms exceeds the {args.budget_ms:.0f}ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Synthetic problem images and responses for benchmarks."""
+
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+from PIL import Image, ImageDraw, ImageFilter
+
+# Common phone camera resolutions
+PHONE_RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "12mp": (4032, 3024),
+    "24mp": (6000, 4000),
+    "48mp": (8000, 6000),
+}
+
+
+def worksheet(size: Tuple[int, int], seed: int = 0) -> Image.Image:
+    """Draw a worksheet-like page: paper texture, ruled lines and equations."""
+    rng = random.Random(seed)
+    width, height = size
+    img = Image.effect_noise((width // 8, height // 8), 12).convert("RGB")
+    img = img.resize(size).point(lambda v: 200 + v // 5)
+    draw = ImageDraw.Draw(img)
+    line_gap = max(24, height // 40)
+    for y in range(line_gap, height, line_gap):
+        draw.line(
+            [(0, y), (width, y)], fill=(150, 170, 210), width=max(1, width // 2000)
+        )
+        if rng.random() < 0.7:
+            x = rng.randint(0, width // 4)
+            draw.text(
+                (x, y - line_gap // 2),
+                "f(x) = 3x^2 - 2x + 7,  solve for x",
+                fill=(20, 20, 30),
+            )
+    return img.filter(ImageFilter.GaussianBlur(radius=1))
+
+
+def phone_photo(directory: Path, name: str = "24mp", quality: int = 90) -> Path:
+    """Write a phone-photo-sized JPEG worksheet and return its path."""
+    path = Path(directory) / f"photo_{name}.jpg"
+    if not path.exists():
+        worksheet(PHONE_RESOLUTIONS[name]).save(path, quality=quality)
+    return path
+
+
+# Flatbed scans of an A4 page
+SCAN_RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "a4_150dpi": (1240, 1754),
+    "a4_300dpi": (2480, 3508),
+}
+
+
+def png_scan(directory: Path, name: str = "a4_300dpi") -> Path:
+    """Write a grayscale PNG scan of a worksheet and return its path."""
+    path = Path(directory) / f"scan_{name}.png"
+    if not path.exists():
+        worksheet(SCAN_RESOLUTIONS[name], seed=1).convert("L").save(path)
+    return path
+
+
+def rgba_screenshot(directory: Path, size: Tuple[int, int] = (1920, 1080)) -> Path:
+    """Write an RGBA PNG, like a screenshot with transparent margins."""
+    path = Path(directory) / f"screenshot_{size[0]}x{size[1]}.png"
+    if not path.exists():
+        img = Image.new("RGBA", size, (0, 0, 0, 0))
+        margin = size[0] // 10
+        page = worksheet((size[0] - 2 * margin, size[1]), seed=2).convert("RGBA")
+        img.paste(page, (margin, 0))
+        img.save(path)
+    return path
+
+
+def palette_png(directory: Path, size: Tuple[int, int] = (1600, 1200)) -> Path:
+    """Write a palette (mode P) PNG, as diagram exports often are."""
+    path = Path(directory) / f"palette_{size[0]}x{size[1]}.png"
+    if not path.exists():
+        worksheet(size, seed=3).quantize(colors=16).save(path)
+    return path
+
+
+def long_response(steps: int = 30, seed: int = 0) -> str:
+    """A long explanation in the shape the model writes them."""
+    rng = random.Random(seed)
+    lines = [
+        "1 Understanding the Problem:",
+        "We need every real x with 3x^2 - 2x + 7 = 2x + 12.",
+        "• The equation is quadratic, so expect up to two roots",
+        "2 Step-by-step solution:",
+    ]
+    for step in range(steps):
+        a, b = rng.randint(2, 9), rng.randint(2, 99)
+        lines += [
+            f"{'abcdefghijklmnopqrstuvwxyz'[step % 26]}) Multiply both sides by {a}",
+            f"   {a}x^2 - {b}x = {a * b}, so $x = \\frac{{{b}}}{{{a}}}$",
+            f"• **Note:** dividing by {a} is allowed because {a} ≠ 0",
+            "",
+        ]
+    lines += [
+        "3 Key Concepts:",
+        "• Factoring, the quadratic formula and checking roots",
+        "4 Common Mistakes:",
+        "• Dropping the negative root",
+        "**Final answer:** x = 5 or x = -1/3",
+    ]
+    return "\n".join(lines)
+
+
+def recorded_responses(cassette_path: Path) -> List[str]:
+    """Text of every recorded response in a cassette (see ``--record``)."""
+    from math_assistant.cassette import Cassette
+
+    return [
+        "".join(
+            block["text"]
+            for block in interaction["response"]["content"]
+            if block["type"] == "text"
+        )
+        for interaction in Cassette(cassette_path)
+    ]
@@ -0,0 +1,33 @@
+"""AI-powered math problem solver and tutor."""
+
+from typing import TYPE_CHECKING, Any
+
+from .version import __version__
+
+if TYPE_CHECKING:
+    from .async_assistant import AsyncMathAssistant
+    from .math_assistant import MathAssistant
+
+__all__ = ["AsyncMathAssistant", "MathAssistant", "__version__"]
+
+# The assistants pull in anthropic and Pillow; import them on first use so
+# that `import math_assistant.cli` (and `math-assist --help`) stays fast.
+_LAZY_ATTRIBUTES = {
+    "AsyncMathAssistant": ".async_assistant",
+    "MathAssistant": ".math_assistant",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_ATTRIBUTES:
+        import importlib
+
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list:
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
@@ -0,0 +1,484 @@
+"""State, request building and response handling shared by both assistants.
+
+``MathAssistant`` and ``AsyncMathAssistant`` differ only in how a request
+reaches the API: a blocking call on ``anthropic.Anthropic``, or an awaited
+one on ``anthropic.AsyncAnthropic``. Everything on either side of that call
+lives in ``BaseAssistant``.
+"""
+
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+import anthropic
+from .cassette import cassette_client
+from .config import Config
+from .dedup import DedupIndex, DedupMatch, Provenance
+from .exceptions import ConfigurationError
+from .fanout import (
+    ProblemMerger,
+    join_problems,
+    problem_key,
+    split_problems,
+    statement_key,
+)
+from .formatters import ResponseFormatter, ResponseType
+from .history import content_text, history_tokens, summary_turns
+from .local_check import LocalChecker, LocalCheckStats, ReferenceAnswers
+from .metrics import METRICS, USAGE_FIELDS
+from .packing import PackingStats, split_packed
+from .prompts import (
+    check_request,
+    conversation_request,
+    explanation_request,
+    practice_request,
+)
+from .response_cache import ResponseCache
+from .scheduler import RequestScheduler
+from .schemas import StructuredKind, structured_request, tool_result
+
+RequestParams = Dict[str, Any]
+TextCallback = Callable[[str], None]
+
+
+class BaseAssistant:
+    """Shared base of MathAssistant and AsyncMathAssistant.
+
+    Subclasses provide the client (``_make_client``), the single-flight
+    group for their concurrency model, and the methods that send requests.
+    """
+
+    # Set by subclasses
+    _single_flight_class: Any = None
+    _asynchronous = False
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        use_cache: Optional[bool] = None,
+        refresh_cache: bool = False,
+        history_token_budget: Optional[int] = None,
+        history_keep_turns: Optional[int] = None,
+        local_check: Optional[bool] = None,
+        dedup: Optional[bool] = None,
+        cassette: Optional[Union[str, Path]] = None,
+        cassette_mode: Optional[str] = None,
+        replay_latency: Optional[float] = None,
+        base_url: Optional[str] = None,
+    ):
+        """Initialize the Math Assistant.
+
+        Args:
+            api_key: Optional API key. If not provided, will use environment variable.
+            use_cache: Cache deterministic responses on disk. Defaults to
+                Config.RESPONSE_CACHE_ENABLED.
+            refresh_cache: Skip cache lookups but still store fresh responses
+            history_token_budget: Estimated tokens of conversation history to
+                keep before older turns are summarized
+            history_keep_turns: Recent turns that are never summarized
+            local_check: Answer solution checks locally when the final answer
+                clearly matches or contradicts a stored reference answer.
+                Defaults to Config.LOCAL_CHECK_ENABLED.
+            dedup: Reuse the explanation of a previously answered image that
+                looks the same (by perceptual hash). Defaults to
+                Config.DEDUP_ENABLED.
+            cassette: Record API exchanges to, or replay them from, this
+                file (see ``cassette``). Defaults to Config.CASSETTE_PATH.
+            cassette_mode: 'record' or 'replay'. Defaults to
+                Config.CASSETTE_MODE. Replaying needs no API key.
+            replay_latency: Replayed latency relative to the recorded one
+                (1 as recorded, 0 none). Defaults to
+                Config.REPLAY_LATENCY_SCALE.
+            base_url: Send requests to this server instead of the public
+                API (see ``mock_server``). Defaults to Config.API_BASE_URL.
+        """
+        cassette = cassette or Config.CASSETTE_PATH
+        cassette_mode = cassette_mode or Config.CASSETTE_MODE
+        replaying = cassette is not None and cassette_mode == "replay"
+        self.api_key = api_key or Config.ANTHROPIC_API_KEY
+        if not self.api_key and not replaying:
+            raise ConfigurationError("No API key provided")
+
+        # Retries are handled by the scheduler, which can see every request
+        self.client: Any = None
+        if not replaying:
+            self.client = self._make_client(base_url or Config.API_BASE_URL)
+        if cassette is not None:
+            self.client = cassette_client(
+                cassette,
+                cassette_mode,  # type: ignore[arg-type]
+                self.client,
+                latency_scale=(
+                    Config.REPLAY_LATENCY_SCALE
+                    if replay_latency is None
+                    else replay_latency
+                ),
+                asynchronous=self._asynchronous,
+            )
+        self.scheduler = RequestScheduler()
+        # Identical deterministic requests in flight at once share one call
+        self.single_flight = self._single_flight_class()
+        self.conversation_history: List[Dict[str, Any]] = []
+        # Image the conversation is about, and the turn that introduced it
+        self.conversation_image: Optional[Dict[str, Any]] = None
+        self.conversation_image_turn: int = 0
+        self.history_token_budget = history_token_budget or Config.HISTORY_TOKEN_BUDGET
+        self.history_keep_turns = (
+            Config.HISTORY_KEEP_TURNS
+            if history_keep_turns is None
+            else history_keep_turns
+        )
+        # An explicit key (e.g. for the mock server) needs no environment
+        if not replaying and api_key is None:
+            Config.initialize()
+
+        if use_cache is None:
+            use_cache = Config.RESPONSE_CACHE_ENABLED
+        self.response_cache: Optional[ResponseCache] = None
+        if use_cache:
+            self.response_cache = ResponseCache(
+                Config.CACHE_DIR / "responses.sqlite3",
+                ttl_seconds=Config.RESPONSE_CACHE_TTL,
+                max_bytes=Config.RESPONSE_CACHE_MAX_BYTES,
+            )
+        self.refresh_cache = refresh_cache
+
+        if local_check is None:
+            local_check = Config.LOCAL_CHECK_ENABLED
+        self.local_checker: Optional[LocalChecker] = None
+        if local_check:
+            self.local_checker = LocalChecker(
+                ReferenceAnswers(Config.CACHE_DIR / "answers.sqlite3")
+            )
+
+        if dedup is None:
+            dedup = Config.DEDUP_ENABLED
+        self.dedup_index: Optional[DedupIndex] = None
+        if dedup:
+            self.dedup_index = DedupIndex(
+                Config.CACHE_DIR / "dedup.sqlite3",
+                max_distance=Config.DEDUP_MAX_DISTANCE,
+            )
+        # Provenance of reused explanations, by image path
+        self.reused_answers: Dict[str, Provenance] = {}
+        self.last_time_to_first_token: Optional[float] = None
+        self.last_usage: Optional[Dict[str, int]] = None
+        self.last_stop_reason: Optional[str] = None
+        self.usage_totals: Dict[str, int] = dict.fromkeys(USAGE_FIELDS, 0)
+        self.packing_totals: PackingStats = {
+            "packed_requests": 0,
+            "packed_problems": 0,
+            "single_requests": 0,
+        }
+        self._usage_lock = threading.Lock()
+
+    def _make_client(self, base_url: Optional[str]) -> Any:
+        """Build the SDK client requests are sent with."""
+        raise NotImplementedError
+
+    # Requests
+
+    @staticmethod
+    def _explanation_params(
+        image_block: Dict[str, Any], additional_text: str, structured: bool
+    ) -> RequestParams:
+        params = explanation_request(image_block, additional_text)
+        return structured_request(params, "explain") if structured else params
+
+    @staticmethod
+    def _practice_params(
+        image_block: Dict[str, Any],
+        num_problems: int,
+        structured: bool,
+        difficulty: Optional[str],
+    ) -> RequestParams:
+        params = practice_request(image_block, num_problems, difficulty)
+        return structured_request(params, "practice") if structured else params
+
+    @staticmethod
+    def _check_params(
+        image_block: Dict[str, Any], student_solution: str, structured: bool
+    ) -> RequestParams:
+        params = check_request(image_block, student_solution)
+        return structured_request(params, "check") if structured else params
+
+    def _conversation_params(self) -> RequestParams:
+        """Build the request for the current conversation."""
+        return conversation_request(
+            self.conversation_history,
+            self.conversation_image,
+            self.conversation_image_turn,
+        )
+
+    def _use_cache(self, cacheable: bool, params: RequestParams) -> bool:
+        """Whether a request may be answered from the response cache."""
+        return (
+            cacheable
+            and self.response_cache is not None
+            and params.get("temperature") == 0
+        )
+
+    # Responses
+
+    @staticmethod
+    def _cached_message(cached: Dict[str, Any]) -> Any:
+        """Rebuild a message stored in the response cache."""
+        METRICS.increment("responses_total", source="cache")
+        return anthropic.types.Message.model_validate(cached)
+
+    def _record_usage(self, message: Any) -> None:
+        """Keep token usage, including prompt-cache reads and writes."""
+        METRICS.record_message(message)
+        self.last_stop_reason = getattr(message, "stop_reason", None)
+        usage = getattr(message, "usage", None)
+        if usage is None:
+            return
+        last_usage = {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+        with self._usage_lock:
+            self.last_usage = last_usage
+            for field, value in last_usage.items():
+                self.usage_totals[field] += value
+
+    @staticmethod
+    def _result(message: Any, kind: StructuredKind, structured: bool) -> Any:
+        """Return a response's content, or its parsed tool call if structured."""
+        if structured:
+            return tool_result(message.content, kind, message.stop_reason)
+        return message.content
+
+    @staticmethod
+    def _dedup_kind(structured: bool) -> str:
+        return "explain-structured" if structured else "explain"
+
+    def _reuse(self, image_path: Union[str, Path], match: DedupMatch) -> Any:
+        """Record where a reused explanation came from and return its message."""
+        self.reused_answers[str(image_path)] = {
+            "image": match["image"],
+            "digest": match["digest"],
+            "distance": match["distance"],
+            "answered_at": match["answered_at"],
+        }
+        return anthropic.types.Message.model_validate(match["response"])
+
+    def _remember_answer(
+        self, image_path: Union[str, Path], explanation: Dict[str, Any]
+    ) -> None:
+        """Keep a structured explanation's answer as the local reference."""
+        if self.local_checker is not None and explanation.get("answer"):
+            self.local_checker.answers.put(
+                image_path, explanation["answer"], source="explanation"
+            )
+
+    def _local_feedback(
+        self, image_path: Union[str, Path], student_solution: str
+    ) -> Optional[List[Any]]:
+        """Answer a check from the stored reference answer, if it is clear."""
+        if self.local_checker is None:
+            return None
+        feedback = self.local_checker.check(image_path, student_solution)
+        if feedback is None:
+            return None
+        return [anthropic.types.TextBlock(type="text", text=feedback)]
+
+    def _packed_sections(self, message: Any, count: int) -> Dict[int, str]:
+        """Split a packed response into explanations, by problem index."""
+        sections = split_packed(
+            content_text(message.content),
+            count,
+            truncated=message.stop_reason == "max_tokens",
+        )
+        with self._usage_lock:
+            self.packing_totals["packed_requests"] += 1
+            self.packing_totals["packed_problems"] += len(sections)
+        return sections
+
+    def _count_single_request(self) -> None:
+        with self._usage_lock:
+            self.packing_totals["single_requests"] += 1
+
+    @staticmethod
+    def _problem_merger(structured: bool) -> ProblemMerger:
+        return ProblemMerger(statement_key if structured else problem_key)
+
+    def _merge_problems(
+        self,
+        merger: ProblemMerger,
+        result: Any,
+        structured: bool,
+        show: bool,
+        format_style: str,
+    ) -> None:
+        """Add one slice's problems to the merged set, printing new ones."""
+        if structured:
+            problems = result["problems"]
+        else:
+            problems = split_problems(content_text(result))
+        for number, problem in merger.add(problems):
+            if show:
+                self._show_problem(number, problem, format_style)
+
+    @staticmethod
+    def _merged_problems(
+        merger: ProblemMerger, structured: bool, format_output: bool, show: bool
+    ) -> Any:
+        """Return the merged problems in the shape the caller asked for."""
+        if structured:
+            return {"problems": merger.problems}
+        text = join_problems(merger.problems)
+        if not format_output:
+            return [anthropic.types.TextBlock(type="text", text=text)]
+        if show:
+            return None
+        return ResponseFormatter.clean_text(text)
+
+    # Conversation state
+
+    def history_tokens(self) -> int:
+        """Estimate the token count of the conversation history."""
+        return history_tokens(self.conversation_history)
+
+    def _needs_compaction(self, force: bool) -> bool:
+        return force or self.history_tokens() > self.history_token_budget
+
+    def _replace_older_turns(
+        self, older: List[Dict[str, Any]], recent: List[Dict[str, Any]], message: Any
+    ) -> None:
+        """Replace older turns with the summary in ``message``."""
+        summary = summary_turns(content_text(message.content))
+        self.conversation_history = summary + recent
+
+        # Keep the image on the turn that introduced it, or on the summary
+        # turn if that turn was compacted away
+        if self.conversation_image_turn >= len(older):
+            self.conversation_image_turn += len(summary) - len(older)
+        else:
+            self.conversation_image_turn = 0
+
+    def _reset_conversation(self) -> None:
+        self.conversation_history = []
+        self.conversation_image = None
+        self.conversation_image_turn = 0
+
+    def _add_question(
+        self, question: str, image_block: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Append a user turn, attaching the image if it is a new one."""
+        # Attach the image once; follow-ups reuse it from the cached prefix
+        if image_block is not None and (
+            self.conversation_image is None
+            or self.conversation_image["source"] != image_block["source"]
+        ):
+            self.conversation_image = image_block
+            self.conversation_image_turn = len(self.conversation_history)
+
+        self.conversation_history.append({"role": "user", "content": question})
+
+    def _add_reply(self, message: Any) -> Any:
+        """Append the assistant's reply to the history and return its content."""
+        response = message.content
+        self.conversation_history.append({"role": "assistant", "content": response})
+        return response
+
+    # Output
+
+    @staticmethod
+    def _render(
+        response: ResponseType, format_style: str, title: Optional[str] = None
+    ) -> Optional[str]:
+        """Print a response ('pretty', 'rich') or return it as clean text."""
+        if format_style == "pretty":
+            ResponseFormatter.pretty_print(response)
+        elif format_style == "rich":
+            if title:
+                ResponseFormatter.rich_print(response, title=title)
+            else:
+                ResponseFormatter.rich_print(response)
+        else:
+            return ResponseFormatter.clean_text(response)
+        return None
+
+    @staticmethod
+    def _show_problem(number: int, problem: str, format_style: str) -> None:
+        """Print one practice problem ('pretty' or 'rich' style)."""
+        title = f"Similar Problem {number}"
+        if format_style == "rich":
+            ResponseFormatter.rich_print(problem, title=title)
+        else:
+            print(f"\n{title}")
+            ResponseFormatter.pretty_print(problem)
+
+    # Public accessors
+
+    def save_conversation(self, filename: str) -> None:
+        """Save the current conversation to a file.
+
+        Args:
+            filename: Path where to save the conversation
+        """
+        with open(filename, "w") as f:
+            for message in self.conversation_history:
+                role = message["role"].upper()
+                if isinstance(message["content"], str):
+                    content = message["content"]
+                else:
+                    # Handle cases where content might be a list of message parts
+                    content = str(message["content"])
+                f.write(f"{role}: {content}\n\n")
+
+    def get_usage(self) -> Dict[str, int]:
+        """Get token usage totals for this assistant.
+
+        Returns:
+            Input, output, cache-creation and cache-read token counts
+        """
+        with self._usage_lock:
+            return dict(self.usage_totals)
+
+    def get_packing_stats(self) -> PackingStats:
+        """Get counts of packed and single-image explanation requests.
+
+        Returns:
+            Packed requests, problems answered by them, and problems that
+            needed a request of their own
+        """
+        with self._usage_lock:
+            return PackingStats(**self.packing_totals)
+
+    def set_reference_answer(self, image_path: Union[str, Path], answer: str) -> None:
+        """Store the expected final answer for a problem image.
+
+        Args:
+            image_path: Path to the problem image
+            answer: Final answer, e.g. 'x = 4' or '3/4'
+        """
+        if self.local_checker is None:
+            raise ConfigurationError("Local answer checking is disabled")
+        self.local_checker.answers.put(image_path, answer)
+
+    def reused_from(self, image_path: Union[str, Path]) -> Optional[Provenance]:
+        """Get the provenance of a reused explanation.
+
+        Returns:
+            The previously answered image whose explanation was reused the
+            last time ``image_path`` was explained, or None if the model
+            answered it
+        """
+        return self.reused_answers.get(str(image_path))
+
+    def get_check_stats(self) -> Optional[LocalCheckStats]:
+        """Get how many solution checks were answered locally.
+
+        Returns:
+            Check counts and the fraction resolved locally, or None if local
+            checking is disabled
+        """
+        if self.local_checker is None:
+            return None
+        return self.local_checker.stats()
+
+    def get_conversation_history(self) -> List[Dict[str, Any]]:
+        """Get the current conversation history.
+
+        Returns:
+            List of conversation messages
+        """
+        return self.conversation_history
@@ -0,0 +1,599 @@
+"""Asyncio Math Assistant implementation."""
+
+import asyncio
+import functools
+import time
+import anthropic
+from typing import (
+    Optional,
+    Dict,
+    List,
+    Union,
+    Any,
+    Awaitable,
+    Callable,
+    Mapping,
+    Tuple,
+    TypeVar,
+)
+from pathlib import Path
+from .assistant_base import BaseAssistant, TextCallback
+from .config import Config
+from .exceptions import APIError
+from .fanout import plan_slices
+from .image_processor import ImageProcessor
+from .metrics import METRICS, STAGE_SECONDS, timed
+from .formatters import ResponseFormatter
+from .history import content_text, split_history, transcript
+from .packing import chunked
+from .prompts import image_content, packed_explanation_request, summary_request
+from .response_cache import request_key
+from .singleflight import AsyncSingleFlight
+
+T = TypeVar("T")
+
+
+class AsyncMathAssistant(BaseAssistant):
+    """Asyncio counterpart of MathAssistant built on ``anthropic.AsyncAnthropic``.
+
+    Image preprocessing and cache I/O run in the default executor so the
+    event loop stays free while requests are in flight.
+    """
+
+    _single_flight_class = AsyncSingleFlight
+    _asynchronous = True
+
+    def _make_client(self, base_url: Optional[str]) -> Any:
+        return anthropic.AsyncAnthropic(
+            api_key=self.api_key, base_url=base_url, max_retries=0
+        )
+
+    async def __aenter__(self) -> "AsyncMathAssistant":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the underlying HTTP client."""
+        await self.client.close()
+
+    @staticmethod
+    async def _run_blocking(func: Callable[..., T], *args: Any) -> T:
+        """Run a blocking function in the default executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args))
+
+    async def _image_block(self, image_path: Union[str, Path]) -> Dict[str, Any]:
+        """Build an image content block, encoding off the event loop."""
+        encoded_image, media_type = await self._run_blocking(
+            ImageProcessor.encode_for_api, image_path
+        )
+        return image_content(encoded_image, media_type)
+
+    async def _create_message(
+        self,
+        cacheable: bool = False,
+        on_text: Optional[TextCallback] = None,
+        coalesce: bool = True,
+        **params: Any,
+    ) -> Any:
+        """Send a request to the Messages API.
+
+        Args:
+            cacheable: Allow the response cache for this request. Only
+                honoured for deterministic (temperature=0) requests.
+            on_text: Stream the response, calling this with each text delta.
+                A cached response is delivered as a single chunk.
+            coalesce: Share the call with concurrent identical requests.
+                Requests that may be cancelled mid-stream pass False, so
+                no other caller ever waits on them.
+            **params: Arguments for ``client.messages.create``
+        """
+        use_cache = self._use_cache(cacheable, params)
+        key = request_key(params) if use_cache else None
+
+        if use_cache and not self.refresh_cache:
+            cached = await self._run_blocking(self.response_cache.get, key)
+            if cached is not None:
+                message = self._cached_message(cached)
+                if on_text:
+                    on_text(
+                        "".join(b.text for b in message.content if b.type == "text")
+                    )
+                return message
+
+        async def send() -> Any:
+            with METRICS.span("api.request", model=params.get("model")):
+                if on_text:
+                    message = await self.scheduler.acall(
+                        lambda: self._stream_message(on_text, **params), params
+                    )
+                else:
+                    message = await self.scheduler.acall(
+                        lambda: self._send_message(params), params
+                    )
+            METRICS.increment("responses_total", source="api")
+            self._record_usage(message)
+            if use_cache:
+                await self._run_blocking(
+                    self.response_cache.put, key, message.model_dump(mode="json")
+                )
+            return message
+
+        if params.get("temperature") != 0 or not coalesce:
+            return await send()
+
+        # Concurrent identical deterministic requests share one call
+        message, shared = await self.single_flight.do(key or request_key(params), send)
+        if shared:
+            METRICS.increment("responses_total", source="coalesced")
+        if shared and on_text:
+            on_text("".join(b.text for b in message.content if b.type == "text"))
+        return message
+
+    async def _send_message(
+        self, params: Dict[str, Any]
+    ) -> Tuple[Any, Mapping[str, str]]:
+        """Send one request; return the message and the response headers."""
+        raw = await self.client.messages.with_raw_response.create(**params)
+        return await raw.parse(), raw.headers
+
+    async def _stream_message(
+        self, on_text: TextCallback, **params: Any
+    ) -> Tuple[Any, Mapping[str, str]]:
+        """Stream a response and record the time to first token.
+
+        Returns:
+            The final message and the response headers
+        """
+        start = time.perf_counter()
+        self.last_time_to_first_token = None
+        async with self.client.messages.stream(**params) as stream:
+            try:
+                async for text in stream.text_stream:
+                    if self.last_time_to_first_token is None:
+                        self.last_time_to_first_token = time.perf_counter() - start
+                        METRICS.observe(
+                            STAGE_SECONDS,
+                            self.last_time_to_first_token,
+                            stage="api.first_token",
+                        )
+                    on_text(text)
+            except anthropic.APIError as e:
+                if self.last_time_to_first_token is None:
+                    raise
+                # Text was already shown; a retry would repeat it
+                raise APIError(f"Stream interrupted: {str(e)}")
+            headers = getattr(getattr(stream, "response", None), "headers", {})
+            return await stream.get_final_message(), headers
+
+    @staticmethod
+    async def _stream_to_console(
+        request: Callable[[TextCallback], Awaitable[Any]],
+        format_style: str,
+        title: str,
+    ) -> Any:
+        """Run a streaming request, rendering text as it arrives."""
+        if format_style == "rich":
+            with ResponseFormatter.live_panel(title=title) as live:
+                return await request(live.append)
+        response = await request(lambda chunk: print(chunk, end="", flush=True))
+        print()
+        return response
+
+    async def compact_history(self, force: bool = False) -> bool:
+        """Summarize older turns once the history exceeds its token budget.
+
+        Args:
+            force: Compact even if the history is within budget
+
+        Returns:
+            True if the history was compacted
+        """
+        if not self._needs_compaction(force):
+            return False
+
+        older, recent = split_history(
+            self.conversation_history, self.history_keep_turns
+        )
+        if not older:
+            return False
+
+        message = await self._create_message(**summary_request(transcript(older)))
+        self._replace_older_turns(older, recent, message)
+        return True
+
+    async def _get_explanation(
+        self,
+        image_path: Union[str, Path],
+        additional_text: str,
+        on_text: Optional[TextCallback] = None,
+        structured: bool = False,
+    ) -> Any:
+        """Request an explanation, reusing a near-duplicate's when possible.
+
+        Returns:
+            The response content, or the parsed ``Explanation`` if structured
+        """
+        self.reused_answers.pop(str(image_path), None)
+        kind = self._dedup_kind(structured)
+        image_hash: Optional[int] = None
+        if self.dedup_index is not None and not additional_text:
+            image_hash = await self._run_blocking(
+                ImageProcessor.perceptual_hash, image_path
+            )
+            match = await self._run_blocking(self.dedup_index.lookup, image_hash, kind)
+            if match is not None:
+                message = self._reuse(image_path, match)
+                if on_text and not structured:
+                    on_text(content_text(message.content))
+                return self._result(message, "explain", structured)
+
+        try:
+            image_block = await self._image_block(image_path)
+            params = self._explanation_params(image_block, additional_text, structured)
+            message = await self._create_message(
+                cacheable=True, on_text=on_text, **params
+            )
+        except anthropic.APIError as e:
+            raise APIError(f"API error: {str(e)}")
+
+        if image_hash is not None:
+            await self._run_blocking(
+                self.dedup_index.add,
+                image_hash,
+                kind,
+                image_path,
+                message.model_dump(mode="json"),
+            )
+        return self._result(message, "explain", structured)
+
+    async def _get_packed_explanations(
+        self, image_paths: List[Union[str, Path]], additional_text: str
+    ) -> List[str]:
+        """Explain several problems with one request.
+
+        Problems whose answer cannot be split out of the packed response
+        are explained concurrently with single-image requests instead.
+        """
+        sections: Dict[int, str] = {}
+        if len(image_paths) > 1:
+            try:
+                image_blocks = await asyncio.gather(
+                    *(self._image_block(path) for path in image_paths)
+                )
+                message = await self._create_message(
+                    cacheable=True,
+                    **packed_explanation_request(image_blocks, additional_text),
+                )
+            except anthropic.APIError as e:
+                raise APIError(f"API error: {str(e)}")
+            sections = self._packed_sections(message, len(image_paths))
+
+        missing = [index for index in range(len(image_paths)) if index not in sections]
+        responses = await asyncio.gather(
+            *(
+                self._get_explanation(image_paths[index], additional_text)
+                for index in missing
+            )
+        )
+        for index, response in zip(missing, responses):
+            sections[index] = content_text(response)
+            self._count_single_request()
+        return [sections[index] for index in range(len(image_paths))]
+
+    async def _generate_problems(
+        self,
+        image_path: Union[str, Path],
+        num_problems: int,
+        structured: bool = False,
+        difficulty: Optional[str] = None,
+    ) -> Any:
+        """Request similar problems and return the response content.
+
+        With ``structured`` the parsed ``PracticeSet`` is returned instead.
+        """
+        try:
+            image_block = await self._image_block(image_path)
+            params = self._practice_params(
+                image_block, num_problems, structured, difficulty
+            )
+            message = await self._create_message(**params)
+        except anthropic.APIError as e:
+            raise APIError(f"API error: {str(e)}")
+        return self._result(message, "practice", structured)
+
+    async def _check_solution(
+        self,
+        image_path: Union[str, Path],
+        student_solution: str,
+        structured: bool = False,
+    ) -> Any:
+        """Request feedback on a solution and return the response content.
+
+        With ``structured`` the parsed ``SolutionFeedback`` is returned instead.
+        """
+        try:
+            image_block = await self._image_block(image_path)
+            params = self._check_params(image_block, student_solution, structured)
+            message = await self._create_message(cacheable=True, **params)
+        except anthropic.APIError as e:
+            raise APIError(f"API error: {str(e)}")
+        return self._result(message, "check", structured)
+
+    @timed("assistant.explain")
+    async def explain_problem(
+        self,
+        image_path: Union[str, Path],
+        additional_text: str = "",
+        format_output: bool = True,
+        format_style: str = "basic",
+        stream: bool = False,
+        structured: bool = False,
+    ) -> Union[Dict, str]:
+        """Get explanation for a math problem from an image.
+
+        Args:
+            image_path: Path to the image file
+            additional_text: Optional additional context or questions
+            format_output: Whether to format the output (default: True)
+            format_style: Formatting style ('basic', 'pretty', or 'rich')
+            stream: Render the explanation as it is generated ('pretty' and
+                'rich' only)
+            structured: Return an ``Explanation`` dict parsed from a tool
+                call instead of text; formatting options are ignored
+
+        Returns:
+            Formatted explanation if format_output=True, otherwise raw response
+        """
+        if structured:
+            explanation = await self._get_explanation(
+                image_path, additional_text, structured=True
+            )
+            await self._run_blocking(self._remember_answer, image_path, explanation)
+            return explanation
+
+        if stream and format_output and format_style in ("pretty", "rich"):
+            await self._stream_to_console(
+                lambda on_text: self._get_explanation(
+                    image_path, additional_text, on_text=on_text
+                ),
+                format_style,
+                "Math Problem Explanation",
+            )
+            return None
+
+        response = await self._get_explanation(image_path, additional_text)
+
+        if not format_output:
+            return response
+        return self._render(response, format_style, "Math Problem Explanation")
+
+    @timed("assistant.explain_packed")
+    async def explain_problems(
+        self,
+        image_paths: List[Union[str, Path]],
+        additional_text: str = "",
+        pack_size: Optional[int] = None,
+    ) -> List[str]:
+        """Get explanations for several problems, packing images into requests.
+
+        Up to ``pack_size`` images are sent in one request and the response
+        is split back into one explanation per image. Packed requests run
+        concurrently.
+
+        Args:
+            image_paths: Paths to the image files
+            additional_text: Optional additional context or questions
+            pack_size: Images per request (default: Config.PACK_SIZE)
+
+        Returns:
+            Plain-text explanations in the same order as ``image_paths``
+        """
+        pack_size = max(1, pack_size or Config.PACK_SIZE)
+        groups = await asyncio.gather(
+            *(
+                self._get_packed_explanations(group, additional_text)
+                for group in chunked(image_paths, pack_size)
+            )
+        )
+        return [explanation for group in groups for explanation in group]
+
+    @timed("assistant.practice")
+    async def generate_similar_problems(
+        self,
+        image_path: Union[str, Path],
+        num_problems: int = 3,
+        format_output: bool = True,
+        format_style: str = "basic",
+        structured: bool = False,
+    ) -> Union[List[Dict], str]:
+        """Generate similar practice problems based on an image.
+
+        Args:
+            image_path: Path to the image file
+            num_problems: Number of similar problems to generate
+            format_output: Whether to format the output (default: True)
+            format_style: Formatting style ('basic', 'pretty', or 'rich')
+            structured: Return a ``PracticeSet`` dict parsed from a tool call
+                instead of text; formatting options are ignored
+
+        Requests for more than ``Config.PRACTICE_FANOUT_THRESHOLD`` problems
+        are split into concurrent sub-requests; see ``_fan_out_problems``.
+
+        Returns:
+            Formatted problems if format_output=True, otherwise raw response
+        """
+        if num_problems > Config.PRACTICE_FANOUT_THRESHOLD:
+            return await self._fan_out_problems(
+                image_path, num_problems, format_output, format_style, structured
+            )
+
+        response = await self._generate_problems(image_path, num_problems, structured)
+
+        if structured or not format_output:
+            return response
+        return self._render(response, format_style, "Similar Problems")
+
+    async def _fan_out_problems(
+        self,
+        image_path: Union[str, Path],
+        num_problems: int,
+        format_output: bool,
+        format_style: str,
+        structured: bool,
+    ) -> Any:
+        """Generate problems in concurrent slices of ``Config.PRACTICE_SLICE_SIZE``.
+
+        Each slice has its own difficulty target, from easier to harder.
+        Problems are merged as each sub-request completes, dropping any that
+        another slice already produced, and numbered in arrival order. With
+        the 'pretty' and 'rich' styles they are printed as they arrive.
+        """
+        slices = plan_slices(num_problems, Config.PRACTICE_SLICE_SIZE)
+        merger = self._problem_merger(structured)
+        show = format_output and not structured and format_style in ("pretty", "rich")
+
+        tasks = [
+            asyncio.ensure_future(
+                self._generate_problems(image_path, count, structured, difficulty)
+            )
+            for count, difficulty in slices
+        ]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                self._merge_problems(
+                    merger, await completed, structured, show, format_style
+                )
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return self._merged_problems(merger, structured, format_output, show)
+
+    @timed("assistant.check")
+    async def check_solution(
+        self,
+        image_path: Union[str, Path],
+        student_solution: str,
+        format_output: bool = True,
+        format_style: str = "basic",
+        structured: bool = False,
+        step_feedback: bool = False,
+    ) -> Union[Dict, str]:
+        """Check a student's solution against a problem from an image.
+
+        If a reference answer is stored for the image and the student's final
+        answer clearly matches or contradicts it, the check is answered
+        locally without an API call.
+
+        Args:
+            image_path: Path to the image file
+            student_solution: The student's attempted solution
+            format_output: Whether to format the output (default: True)
+            format_style: Formatting style ('basic', 'pretty', or 'rich')
+            structured: Return a ``SolutionFeedback`` dict, with a score for
+                each step, parsed from a tool call instead of text;
+                formatting options are ignored. Always sent to the model.
+            step_feedback: Always ask the model for feedback on each step
+
+        Returns:
+            Formatted feedback if format_output=True, otherwise raw response
+        """
+        if structured:
+            return await self._check_solution(
+                image_path, student_solution, structured=True
+            )
+
+        response = None
+        if not step_feedback:
+            response = await self._run_blocking(
+                self._local_feedback, image_path, student_solution
+            )
+        if response is None:
+            response = await self._check_solution(image_path, student_solution)
+
+        if not format_output:
+            return response
+        return self._render(response, format_style, "Solution Feedback")
+
+    async def start_conversation(
+        self, image_path: Optional[str] = None, format_style: str = "rich"
+    ) -> str:
+        """Start a new conversation about a math problem.
+
+        Args:
+            image_path: Optional path to problem image
+            format_style: Output formatting style
+
+        Returns:
+            Initial response from assistant
+        """
+        self._reset_conversation()
+
+        if image_path:
+            return await self.ask_about_problem(
+                image_path, "Can you explain this problem?", format_style=format_style
+            )
+
+        response = "Conversation started. How can I help you with mathematics today?"
+        return self._render(response, format_style, "Conversation Start") or response
+
+    @timed("assistant.ask")
+    async def ask_about_problem(
+        self,
+        image_path: str,
+        question: str,
+        format_style: str = "rich",
+        stream: bool = False,
+    ) -> str:
+        """Ask a specific question about a problem.
+
+        Args:
+            image_path: Path to problem image
+            question: User's question
+            format_style: Output formatting style
+            stream: Render the answer as it is generated ('pretty' and 'rich' only)
+        """
+        try:
+            image_block = await self._image_block(image_path)
+            await self.compact_history()
+            self._add_question(question, image_block)
+            return await self._reply(format_style, stream)
+
+        except Exception as e:
+            raise APIError(f"Error: {str(e)}")
+
+    @timed("assistant.continue")
+    async def continue_conversation(
+        self, question: str, format_style: str = "rich", stream: bool = False
+    ) -> str:
+        """Continue the conversation with a follow-up question.
+
+        Args:
+            question: User's follow-up question
+            format_style: Output formatting style
+            stream: Render the answer as it is generated ('pretty' and 'rich' only)
+        """
+        try:
+            await self.compact_history()
+            self._add_question(question)
+            return await self._reply(format_style, stream)
+
+        except Exception as e:
+            raise APIError(f"Error: {str(e)}")
+
+    async def _reply(self, format_style: str, stream: bool) -> Any:
+        """Answer the latest question in the conversation."""
+        params = self._conversation_params()
+        if stream and format_style in ("pretty", "rich"):
+            message = await self._stream_to_console(
+                lambda on_text: self._create_message(on_text=on_text, **params),
+                format_style,
+                "Math Assistant Response",
+            )
+            return self._add_reply(message)
+
+        response = self._add_reply(await self._create_message(**params))
+        return self._render(response, format_style) or response
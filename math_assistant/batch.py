@@ -0,0 +1,294 @@
+"""Concurrent processing of whole directories of problem images."""
+
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    TypedDict,
+    Union,
+)
+from .config import Config
+from .formatters import ResponseFormatter
+from .packing import chunked
+
+if TYPE_CHECKING:
+    from .math_assistant import MathAssistant
+
+BatchTask = Literal["explain", "practice", "check"]
+TASKS: List[str] = ["explain", "practice", "check"]
+
+
+class BatchResult(TypedDict):
+    """Type definition for the outcome of one image in a batch."""
+
+    image: str
+    output: Optional[str]
+    status: Literal["ok", "error"]
+    error: Optional[str]
+    seconds: float
+    # Parsed result in structured mode; not repeated in summary.json
+    result: Optional[Dict[str, Any]]
+    # Near-duplicate image whose explanation was reused, if any
+    reused_from: Optional[str]
+
+
+def find_images(directory: Union[str, Path]) -> List[Path]:
+    """Return supported image files in a directory, sorted by name."""
+    return sorted(
+        path
+        for path in Path(directory).iterdir()
+        if path.is_file() and path.suffix.lower() in Config.SUPPORTED_FORMATS
+    )
+
+
+def solution_path(image: Path) -> Path:
+    """Return the student-solution file expected next to an image for `check`."""
+    return image.with_suffix(".txt")
+
+
+class BatchRunner:
+    """Runs one task over many images on a bounded worker pool.
+
+    All workers share a single MathAssistant, and therefore a single
+    HTTP connection pool and set of caches.
+    """
+
+    def __init__(
+        self,
+        assistant: "MathAssistant",
+        task: BatchTask,
+        output_dir: Union[str, Path],
+        concurrency: int = 4,
+        num_problems: int = 3,
+        preprocess_workers: int = 0,
+        pack_size: int = 1,
+        structured: bool = False,
+    ) -> None:
+        """Initialize the runner.
+
+        Args:
+            assistant: Shared assistant used by every worker
+            task: One of 'explain', 'practice' or 'check'
+            output_dir: Directory for per-image results and the summary
+            concurrency: Maximum number of requests in flight
+            num_problems: Number of problems per image for 'practice'
+            preprocess_workers: Processes that encode images ahead of the
+                requests. 0 encodes on the request threads instead.
+            pack_size: Images explained per API request ('explain' only)
+            structured: Request JSON results through tool schemas and write
+                them to .json files instead of Markdown
+        """
+        if task not in TASKS:
+            raise ValueError(f"Unknown task: {task}. Choose from {', '.join(TASKS)}")
+        if pack_size > 1 and task != "explain":
+            raise ValueError("Packing is only supported for the explain task")
+        if pack_size > 1 and structured:
+            raise ValueError("Packing is not supported with structured output")
+        self.assistant = assistant
+        self.task = task
+        self.output_dir = Path(output_dir)
+        self.concurrency = max(1, concurrency)
+        self.num_problems = num_problems
+        self.preprocess_workers = max(0, preprocess_workers)
+        self.pack_size = max(1, pack_size)
+        self.structured = structured
+        # Contents of summary.json from the last run
+        self.summary: Dict[str, Any] = {}
+
+    def run_one(self, image: Path) -> BatchResult:
+        """Process a single image and write its output file."""
+        start = time.perf_counter()
+        try:
+            text = self._run_task(image)
+            return self._write_output(image, text, time.perf_counter() - start)
+        except Exception as e:
+            return {
+                "image": str(image),
+                "output": None,
+                "status": "error",
+                "error": str(e),
+                "seconds": time.perf_counter() - start,
+                "result": None,
+                "reused_from": None,
+            }
+
+    def run_group(self, images: List[Path]) -> List[BatchResult]:
+        """Explain several images with packed requests and write their outputs.
+
+        Each result records the time the whole group took, which is the
+        latency every image in it saw. If the packed request fails, the
+        images are processed one by one so errors are reported per image.
+        """
+        if self.pack_size == 1:
+            return [self.run_one(image) for image in images]
+        start = time.perf_counter()
+        try:
+            texts = self.assistant.explain_problems(images, pack_size=self.pack_size)
+        except Exception:
+            return [self.run_one(image) for image in images]
+        elapsed = time.perf_counter() - start
+        return [
+            self._write_output(image, text, elapsed)
+            for image, text in zip(images, texts)
+        ]
+
+    def _write_output(
+        self, image: Path, text: Union[str, Dict[str, Any]], seconds: float
+    ) -> BatchResult:
+        reused = self.assistant.reused_from(image)
+        if isinstance(text, dict):
+            output = self.output_dir / f"{image.stem}.{self.task}.json"
+            output.write_text(json.dumps(text, indent=2), encoding="utf-8")
+        else:
+            output = self.output_dir / f"{image.stem}.{self.task}.md"
+            output.write_text(ResponseFormatter.to_markdown(text), encoding="utf-8")
+        return {
+            "image": str(image),
+            "output": str(output),
+            "status": "ok",
+            "error": None,
+            "seconds": seconds,
+            "result": text if isinstance(text, dict) else None,
+            "reused_from": reused["image"] if reused else None,
+        }
+
+    def run(
+        self,
+        images: List[Path],
+        on_complete: Optional[Callable[[BatchResult], None]] = None,
+    ) -> List[BatchResult]:
+        """Process images concurrently and write a summary.
+
+        Args:
+            images: Image files to process
+            on_complete: Called from the caller's thread as each image finishes
+
+        Returns:
+            Results in the same order as ``images``
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        requests_before = self.assistant.scheduler.stats()["requests"]
+        results: Dict[Path, BatchResult] = {}
+
+        pending: Dict[Future, List[Path]] = {}
+
+        def collect(timeout: Optional[float]) -> None:
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                for image, result in zip(pending.pop(future), future.result()):
+                    results[image] = result
+                    if on_complete:
+                        on_complete(result)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            # Submit each group as preprocessing hands it over, reporting
+            # whatever finished in the meantime
+            for group in chunked(self._preprocessed(images), self.pack_size):
+                pending[executor.submit(self.run_group, group)] = group
+                collect(timeout=0)
+            while pending:
+                collect(timeout=None)
+
+        ordered = [results[image] for image in images]
+        self.write_summary(
+            ordered,
+            time.perf_counter() - start,
+            self.assistant.scheduler.stats()["requests"] - requests_before,
+        )
+        return ordered
+
+    def _preprocessed(self, images: List[Path]) -> Iterator[Path]:
+        """Yield images in the order they become ready for a request.
+
+        With preprocess workers, images are encoded on a process pool into
+        the shared image cache and each one is handed to the request pool as
+        soon as it is ready, so uploads overlap with the remaining encodes.
+        """
+        from .image_processor import ImageProcessor
+
+        if not self.preprocess_workers or ImageProcessor.get_cache() is None:
+            yield from images
+            return
+        by_path = {image.resolve(): image for image in images}
+        done = set()
+        for result in ImageProcessor.process_many(images, self.preprocess_workers):
+            # Failures are re-raised and recorded by run_one
+            image = by_path.get(result["path"].resolve(), result["path"])
+            done.add(image)
+            yield image
+        yield from (image for image in images if image not in done)
+
+    def write_summary(
+        self, results: List[BatchResult], elapsed: float, api_requests: int = 0
+    ) -> Path:
+        """Write summary.json describing the whole run.
+
+        Args:
+            results: Per-image results
+            elapsed: Wall-clock seconds for the run
+            api_requests: Successful API requests made during the run
+        """
+        succeeded = sum(1 for r in results if r["status"] == "ok")
+        total = len(results)
+        summary = {
+            "task": self.task,
+            "concurrency": self.concurrency,
+            "preprocess_workers": self.preprocess_workers,
+            "pack_size": self.pack_size,
+            "total": total,
+            "succeeded": succeeded,
+            "failed": total - succeeded,
+            "elapsed_seconds": round(elapsed, 3),
+            "images_per_second": round(total / elapsed, 3) if elapsed else 0,
+            "api_requests": api_requests,
+            "requests_per_problem": round(api_requests / total, 3) if total else 0,
+            "seconds_per_problem": round(elapsed / total, 3) if total else 0,
+            "mean_latency_seconds": (
+                round(sum(r["seconds"] for r in results) / total, 3) if total else 0
+            ),
+            "results": [
+                {key: value for key, value in r.items() if key != "result"}
+                for r in results
+            ],
+        }
+        if self.assistant.dedup_index is not None:
+            summary["reused"] = sum(1 for r in results if r.get("reused_from"))
+        check_stats = self.assistant.get_check_stats()
+        if self.task == "check" and check_stats is not None:
+            summary["local_checks"] = check_stats
+        self.summary = summary
+        path = self.output_dir / "summary.json"
+        path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        return path
+
+    def _run_task(self, image: Path) -> Union[str, Dict[str, Any]]:
+        if self.task == "explain":
+            return self.assistant.explain_problem(
+                image, format_style="basic", structured=self.structured
+            )
+        if self.task == "practice":
+            return self.assistant.generate_similar_problems(
+                image,
+                num_problems=self.num_problems,
+                format_style="basic",
+                structured=self.structured,
+            )
+        solution = solution_path(image)
+        if not solution.exists():
+            raise FileNotFoundError(f"No student solution found at {solution}")
+        return self.assistant.check_solution(
+            image,
+            solution.read_text(encoding="utf-8"),
+            format_style="basic",
+            structured=self.structured,
+        )
@@ -0,0 +1,372 @@
+"""Record and replay of Messages API exchanges for offline runs.
+
+A cassette is a JSON-lines file (gzip-compressed when its name ends in
+``.gz``) with one recorded exchange per line: the request key from
+``request_key``, so image data is represented by its digest, the response,
+its rate-limit headers and the latency measured when it was recorded. In
+record mode requests go to the API and are appended to the cassette; in
+replay mode they are answered from it without any network access, after
+the recorded latency multiplied by a scale factor (1 replays the recorded
+timing, 0 answers at once).
+
+A request recorded several times (practice problems, for example, are
+sampled at a non-zero temperature) is replayed in recorded order, starting
+over once every recording has been used.
+"""
+
+import asyncio
+import gzip
+import json
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Literal, Optional, TypedDict, Union
+import anthropic
+from .exceptions import APIError, ConfigurationError
+from .response_cache import request_key
+
+CassetteMode = Literal["record", "replay"]
+MODES = ("record", "replay")
+
+# Response headers worth replaying: they steer the request scheduler
+_KEPT_HEADERS = ("anthropic-ratelimit-", "retry-after")
+
+
+class Interaction(TypedDict):
+    """Type definition for one recorded request and its response."""
+
+    key: str
+    model: str
+    latency: float
+    first_token: Optional[float]
+    chunks: Optional[int]
+    headers: Dict[str, str]
+    response: Dict[str, Any]
+
+
+class Cassette:
+    """Recorded exchanges, loaded into memory and appended to on disk."""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        """Load a cassette, or start a new one if the file does not exist.
+
+        Args:
+            path: JSON-lines file, gzip-compressed if it ends in ``.gz``
+        """
+        self.path = Path(path)
+        self._interactions: Dict[str, List[Interaction]] = {}
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with self._open("rt") as f:
+                for line in f:
+                    if line.strip():
+                        interaction: Interaction = json.loads(line)
+                        self._interactions.setdefault(interaction["key"], []).append(
+                            interaction
+                        )
+
+    def _open(self, mode: str) -> IO[str]:
+        if self.path.suffix == ".gz":
+            return gzip.open(self.path, mode, encoding="utf-8")  # type: ignore[return-value]
+        return open(self.path, mode, encoding="utf-8")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(recorded) for recorded in self._interactions.values())
+
+    def __iter__(self) -> Iterator[Interaction]:
+        with self._lock:
+            recorded = [
+                interaction
+                for group in self._interactions.values()
+                for interaction in group
+            ]
+        return iter(recorded)
+
+    def find(self, params: Dict[str, Any]) -> Interaction:
+        """Return the next recorded exchange for a request.
+
+        Raises:
+            APIError: If the request was never recorded
+        """
+        key = request_key(params)
+        with self._lock:
+            recorded = self._interactions.get(key)
+            if not recorded:
+                raise APIError(
+                    f"No recorded response for this request in {self.path} "
+                    f"(key {key[:12]}); record it first"
+                )
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            return recorded[cursor % len(recorded)]
+
+    def record(
+        self,
+        params: Dict[str, Any],
+        message: Any,
+        headers: Any,
+        latency: float,
+        first_token: Optional[float] = None,
+        chunks: Optional[int] = None,
+    ) -> None:
+        """Append an exchange to the cassette.
+
+        Args:
+            params: The request
+            message: The response message
+            headers: The response headers; only rate-limit headers are kept
+            latency: Seconds from sending the request to the full response
+            first_token: Seconds to the first streamed text, when streamed
+            chunks: Number of streamed text chunks, when streamed
+        """
+        interaction: Interaction = {
+            "key": request_key(params),
+            "model": str(params.get("model", "")),
+            "latency": latency,
+            "first_token": first_token,
+            "chunks": chunks,
+            "headers": {
+                name.lower(): str(value)
+                for name, value in dict(headers or {}).items()
+                if name.lower().startswith(_KEPT_HEADERS)
+            },
+            "response": message.model_dump(mode="json"),
+        }
+        line = json.dumps(interaction, separators=(",", ":"))
+        with self._lock:
+            self._interactions.setdefault(interaction["key"], []).append(interaction)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._open("at") as f:
+                f.write(line + "\n")
+
+
+class _RawResponse:
+    """Mimics the SDK's raw response wrapper."""
+
+    def __init__(self, message: Any, headers: Dict[str, str]) -> None:
+        self.message = message
+        self.headers = headers
+
+    def parse(self) -> Any:
+        return self.message
+
+
+class _AsyncRawResponse(_RawResponse):
+    async def parse(self) -> Any:  # type: ignore[override]
+        return self.message
+
+
+class _RawCreate:
+    """``messages.with_raw_response`` for a cassette transport."""
+
+    def __init__(self, create: Any) -> None:
+        self.create = create
+
+
+def _split(text: str, count: int) -> List[str]:
+    """Split text into ``count`` pieces of about the same length."""
+    count = max(1, min(count, len(text)))
+    size = -(-len(text) // count) if text else 1
+    return [text[i : i + size] for i in range(0, len(text), size)] or [""]
+
+
+class _ReplayStream:
+    """Replays a recorded exchange as a ``MessageStreamManager`` would."""
+
+    def __init__(self, interaction: Interaction, latency_scale: float) -> None:
+        self.interaction = interaction
+        self.latency_scale = latency_scale
+        self.message = anthropic.types.Message.model_validate(interaction["response"])
+        self.response = _RawResponse(self.message, interaction["headers"])
+        self.text_stream = self._text()
+
+    def _text(self) -> Iterator[str]:
+        text = "".join(
+            block.text for block in self.message.content if block.type == "text"
+        )
+        latency = self.interaction["latency"] * self.latency_scale
+        first = self.interaction["first_token"]
+        first = latency if first is None else first * self.latency_scale
+        chunks = _split(text, self.interaction["chunks"] or len(text.split()) or 1)
+        time.sleep(first)
+        gap = max(0.0, latency - first) / max(1, len(chunks) - 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(gap)
+            yield chunk
+
+    def __enter__(self) -> "_ReplayStream":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+    def get_final_message(self) -> Any:
+        return self.message
+
+
+class _RecordingStream:
+    """Wraps a live stream and records it once the final message is read."""
+
+    def __init__(
+        self, cassette: Cassette, params: Dict[str, Any], manager: Any
+    ) -> None:
+        self.cassette = cassette
+        self.params = params
+        self.manager = manager
+        self.first_token: Optional[float] = None
+        self.chunks = 0
+
+    def __enter__(self) -> "_RecordingStream":
+        self.start = time.perf_counter()
+        self.stream = self.manager.__enter__()
+        self.response = getattr(self.stream, "response", None)
+        self.text_stream = self._text()
+        return self
+
+    def _text(self) -> Iterator[str]:
+        for text in self.stream.text_stream:
+            if self.first_token is None:
+                self.first_token = time.perf_counter() - self.start
+            self.chunks += 1
+            yield text
+
+    def __exit__(self, *exc_info: Any) -> Any:
+        return self.manager.__exit__(*exc_info)
+
+    def get_final_message(self) -> Any:
+        message = self.stream.get_final_message()
+        self.cassette.record(
+            self.params,
+            message,
+            getattr(self.response, "headers", {}),
+            time.perf_counter() - self.start,
+            self.first_token,
+            self.chunks,
+        )
+        return message
+
+
+class CassetteMessages:
+    """Stand-in for ``client.messages`` that records or replays exchanges."""
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        mode: CassetteMode,
+        messages: Any = None,
+        latency_scale: float = 1.0,
+    ) -> None:
+        """Initialize the transport.
+
+        Args:
+            cassette: Where exchanges are recorded or replayed from
+            mode: 'record' or 'replay'
+            messages: The real ``client.messages`` (record mode only)
+            latency_scale: Replayed latency relative to the recorded one
+        """
+        if mode not in MODES:
+            raise ConfigurationError(f"Unknown cassette mode: {mode}")
+        if mode == "record" and messages is None:
+            raise ConfigurationError("Recording needs an API client")
+        self.cassette = cassette
+        self.mode = mode
+        self.messages = messages
+        self.latency_scale = max(0.0, latency_scale)
+
+    def _replay(self, params: Dict[str, Any]) -> _RawResponse:
+        interaction = self.cassette.find(params)
+        time.sleep(interaction["latency"] * self.latency_scale)
+        message = anthropic.types.Message.model_validate(interaction["response"])
+        return _RawResponse(message, interaction["headers"])
+
+    def _create_raw(self, **params: Any) -> _RawResponse:
+        if self.mode == "replay":
+            return self._replay(params)
+        start = time.perf_counter()
+        raw = self.messages.with_raw_response.create(**params)
+        message = raw.parse()
+        self.cassette.record(params, message, raw.headers, time.perf_counter() - start)
+        return _RawResponse(message, raw.headers)
+
+    def create(self, **params: Any) -> Any:
+        return self._create_raw(**params).parse()
+
+    @property
+    def with_raw_response(self) -> _RawCreate:
+        return _RawCreate(self._create_raw)
+
+    def stream(self, **params: Any) -> Any:
+        if self.mode == "replay":
+            return _ReplayStream(self.cassette.find(params), self.latency_scale)
+        return _RecordingStream(self.cassette, params, self.messages.stream(**params))
+
+
+class AsyncCassetteMessages(CassetteMessages):
+    """Async variant of CassetteMessages for ``anthropic.AsyncAnthropic``."""
+
+    async def _create_raw(self, **params: Any) -> _AsyncRawResponse:  # type: ignore[override]
+        if self.mode == "replay":
+            interaction = self.cassette.find(params)
+            await asyncio.sleep(interaction["latency"] * self.latency_scale)
+            message = anthropic.types.Message.model_validate(interaction["response"])
+            return _AsyncRawResponse(message, interaction["headers"])
+        start = time.perf_counter()
+        raw = await self.messages.with_raw_response.create(**params)
+        message = await raw.parse()
+        self.cassette.record(params, message, raw.headers, time.perf_counter() - start)
+        return _AsyncRawResponse(message, raw.headers)
+
+    async def create(self, **params: Any) -> Any:  # type: ignore[override]
+        return await (await self._create_raw(**params)).parse()
+
+    def stream(self, **params: Any) -> Any:
+        # Async streams are neither recorded nor replayed
+        raise ConfigurationError(
+            "Streaming through a cassette needs MathAssistant; "
+            "AsyncMathAssistant cassettes only support messages.create"
+        )
+
+
+class CassetteClient:
+    """Client whose ``messages`` go through a cassette."""
+
+    def __init__(self, messages: CassetteMessages, client: Any = None) -> None:
+        self.messages = messages
+        self._client = client
+
+    async def close(self) -> None:
+        """Close the wrapped async client, if there is one."""
+        if self._client is not None:
+            await self._client.close()
+
+
+def cassette_client(
+    path: Union[str, Path],
+    mode: CassetteMode,
+    client: Any = None,
+    latency_scale: float = 1.0,
+    asynchronous: bool = False,
+) -> CassetteClient:
+    """Wrap an API client (or, for replay, stand in for one) with a cassette.
+
+    Args:
+        path: Cassette file
+        mode: 'record' or 'replay'
+        client: ``anthropic.Anthropic`` or ``anthropic.AsyncAnthropic``;
+            not needed for replay
+        latency_scale: Replayed latency relative to the recorded one
+        asynchronous: Build the transport for ``AsyncMathAssistant``. Its
+            ``messages.stream`` raises ConfigurationError: only
+            ``messages.create`` is recorded and replayed asynchronously.
+    """
+    transport = AsyncCassetteMessages if asynchronous else CassetteMessages
+    messages = transport(
+        Cassette(path),
+        mode,
+        messages=client.messages if client is not None else None,
+        latency_scale=latency_scale,
+    )
+    return CassetteClient(messages, client)
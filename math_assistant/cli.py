@@ -1,21 +1,50 @@
-"""Command Line Interface for Math Assistant."""
+"""Command Line Interface for Math Assistant.
+
+Heavy dependencies (anthropic, Pillow, rich) are imported inside the
+commands that use them, so `--help`, usage errors and `explain --format
+basic` start quickly.
+"""
 
 import click
+import functools
+import json
 import sys
 import os
 import time
 from pathlib import Path
-from typing import Optional, List
+from typing import TYPE_CHECKING, Any, Callable, Optional, List
 from click.core import Context
-from rich.console import Console
-from rich.markdown import Markdown
-from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from .math_assistant import MathAssistant
+from .batch import TASKS
+from .config import Config
 from .exceptions import ConfigurationError, ImageProcessingError
 
-# Initialize rich console
-console = Console()
+if TYPE_CHECKING:
+    from rich.console import Console
+    from rich.progress import Progress
+    from .batch import BatchResult
+    from .dedup import Provenance
+    from .math_assistant import MathAssistant
+    from .mock_server import MockAPIServer
+    from .prefetch import Prefetcher
+
+
+@functools.lru_cache(maxsize=None)
+def get_console() -> "Console":
+    """Return the shared rich console, creating it on first use."""
+    from rich.console import Console
+
+    return Console()
+
+
+def spinner(console: Optional["Console"] = None) -> "Progress":
+    """Create an indeterminate progress spinner."""
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+
+    return Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        console=console,
+    )
 
 
 class CLIError(Exception):
@@ -24,6 +53,11 @@ class CLIError(Exception):
     pass
 
 
+# Commands that run without an API key. Of the daemon commands only
+# `daemon start` calls the API, and it checks the key itself.
+OFFLINE_COMMANDS = ("mock-server", "loadtest", "answer", "cache", "inspect", "daemon")
+
+
 def check_environment() -> None:
     """Verify environment setup."""
     api_key = os.getenv("ANTHROPIC_API_KEY")
@@ -43,8 +77,12 @@ Welcome! Here's how to use the assistant:
 ## Commands:
 - `image: path/to/image.jpg` - Load and analyze a math problem
 - `practice` - Get similar practice problems (after loading an image)
+- `explain` - Show a full step-by-step explanation (after loading an image)
 - `check` - Check a solution (after loading an image)
 - `save: filename.txt` - Save conversation
+- `usage` - Show token usage, including prompt-cache reads
+- `tokens` - Show the size of the conversation history
+- `stats` - Show per-stage latency percentiles, token counts and stop reasons
 - `help` - Show these instructions
 - `quit` - Exit the program
 
@@ -57,11 +95,25 @@ Welcome! Here's how to use the assistant:
 > save: my_session.txt
 ```
     """
-    console.print(Markdown(welcome_text))
+    from rich.markdown import Markdown
+
+    get_console().print(Markdown(welcome_text))
+
+
+def handle_error(error: Exception, plain: bool = False) -> None:
+    """Handle different types of errors with user-friendly messages.
+
+    Args:
+        error: The error to report
+        plain: Print a single line to stderr instead of a rich panel
+    """
+    if plain:
+        click.echo(f"Error: {error}", err=True)
+        return
 
+    from rich.panel import Panel
 
-def handle_error(error: Exception) -> None:
-    """Handle different types of errors with user-friendly messages."""
+    console = get_console()
     if isinstance(error, ConfigurationError):
         console.print(
             Panel(
@@ -99,13 +151,12 @@ Tips:
     elif "rate limit" in str(error).lower():
         console.print(
             Panel(
-                "[yellow]Rate limit reached. Waiting 5 seconds...[/yellow]",
+                "[yellow]Rate limit reached and retries were exhausted.[/yellow]\n"
+                "Try again in a minute, or lower --concurrency for batch runs.",
                 title="⏱️ Rate Limit",
                 border_style="yellow",
             )
         )
-        time.sleep(5)
-        return
 
     else:
         console.print(
@@ -115,8 +166,11 @@ Tips:
         )
 
 
-def handle_image_command(assistant: MathAssistant, image_path: str) -> bool:
+def handle_image_command(
+    assistant: "MathAssistant", image_path: str, stream: bool = False
+) -> bool:
     """Handle loading and processing an image."""
+    console = get_console()
     try:
         path = Path(image_path.strip())
         if not path.exists():
@@ -125,34 +179,100 @@ def handle_image_command(assistant: MathAssistant, image_path: str) -> bool:
         if path.suffix.lower() not in [".jpg", ".jpeg", ".png"]:
             raise ImageProcessingError("Unsupported format. Use JPG or PNG.")
 
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            console=console,
-        ) as progress:
+        if stream:
+            # The live panel replaces the spinner
+            assistant.ask_about_problem(
+                str(path), "Can you explain this problem?", stream=True
+            )
+            console.print("[green]✓ Image processed successfully[/green]")
+            return True
+
+        # Rate limits are retried by the assistant's scheduler
+        with spinner(console) as progress:
             progress.add_task(description="Analyzing image...", total=None)
-            try:
-                assistant.ask_about_problem(str(path), "Can you explain this problem?")
-                console.print("[green]✓ Image processed successfully[/green]")
-                return True
-            except Exception as e:
-                if "rate limit" in str(e).lower():
-                    handle_error(e)
-                    # Retry once after rate limit
-                    assistant.ask_about_problem(
-                        str(path), "Can you explain this problem?"
-                    )
-                    return True
-                raise
+            assistant.ask_about_problem(str(path), "Can you explain this problem?")
+        console.print("[green]✓ Image processed successfully[/green]")
+        return True
 
     except Exception as e:
         handle_error(e)
         return False
 
 
+def print_usage(
+    assistant: "MathAssistant", prefetcher: Optional["Prefetcher"] = None
+) -> None:
+    """Print token usage totals for the session."""
+    from rich.panel import Panel
+
+    usage = assistant.get_usage()
+    total_input = (
+        usage["input_tokens"]
+        + usage["cache_creation_input_tokens"]
+        + usage["cache_read_input_tokens"]
+    )
+    cached_share = usage["cache_read_input_tokens"] / total_input if total_input else 0
+    text = (
+        f"Input tokens: {usage['input_tokens']}\n"
+        f"Cache writes: {usage['cache_creation_input_tokens']}\n"
+        f"Cache reads: {usage['cache_read_input_tokens']} "
+        f"({cached_share:.0%} of input)\n"
+        f"Output tokens: {usage['output_tokens']}"
+    )
+    if prefetcher is not None:
+        stats = prefetcher.stats()
+        text += (
+            f"\nPrefetched: {stats['used']} used of {stats['started']} started, "
+            f"{stats['cancelled']} cancelled; {stats['spent_tokens']} of "
+            f"{stats['token_budget']} speculative tokens"
+        )
+    get_console().print(Panel(text, title="Token Usage", border_style="blue"))
+
+
+def print_stats() -> None:
+    """Print per-stage latency percentiles and response counters."""
+    from rich.table import Table
+    from .metrics import METRICS, STAGE_SECONDS
+
+    console = get_console()
+    table = Table(title="Latency by stage (ms)")
+    table.add_column("Stage")
+    for column in ("Calls", "p50", "p95", "p99"):
+        table.add_column(column, justify="right")
+    for summary in METRICS.histograms():
+        if summary["name"] != STAGE_SECONDS:
+            continue
+        stage = summary["labels"].get("stage", "")
+        extra = {k: v for k, v in summary["labels"].items() if k != "stage"}
+        if extra:
+            stage += " " + ",".join(f"{k}={v}" for k, v in extra.items())
+        table.add_row(
+            stage,
+            str(summary["count"]),
+            *(f"{summary[key] * 1000:.1f}" for key in ("p50", "p95", "p99")),
+        )
+    if not table.row_count:
+        console.print("[yellow]No requests measured yet[/yellow]")
+        return
+    console.print(table)
+
+    counters: dict = {}
+    for counter in METRICS.counters():
+        label = ",".join(counter["labels"].values())
+        counters.setdefault(counter["name"], []).append(f"{label}={counter['value']:g}")
+    for name, title in (
+        ("tokens_total", "Tokens"),
+        ("stop_reasons_total", "Stop reasons"),
+        ("responses_total", "Responses"),
+        ("stage_errors_total", "Errors"),
+    ):
+        if name in counters:
+            console.print(f"{title}: {', '.join(counters[name])}")
+
+
 def get_multiline_input(prompt: str) -> str:
     """Get multiline input from user."""
-    console.print(f"\n{prompt} (Press Ctrl+D or Ctrl+Z when finished):")
+    get_console().print(f"\n{prompt} (Press Ctrl+D or Ctrl+Z when finished):")
     lines: List[str] = []
     try:
         while True:
@@ -162,12 +282,232 @@ def get_multiline_input(prompt: str) -> str:
         return "\n".join(lines)
 
 
+def daemon_available(ctx: Context) -> bool:
+    """Return True if this invocation can be forwarded to a running daemon.
+
+    Invocations with --no-daemon, or with options the daemon's shared
+    assistant does not use (--cache/--no-cache, --refresh, --encoder,
+    --dedup/--no-dedup, --metrics, --record, --replay, --profile), run
+    in-process.
+    """
+    options = ctx.find_root().obj or {}
+    if not options.get("use_daemon"):
+        return False
+    from . import daemon
+
+    return daemon.is_running()
+
+
+def print_reuse(provenance: Optional["Provenance"], plain: bool = False) -> None:
+    """Say where a reused explanation came from."""
+    if not provenance:
+        return
+    from datetime import datetime
+
+    answered = datetime.fromtimestamp(provenance["answered_at"]).strftime(
+        "%Y-%m-%d %H:%M"
+    )
+    message = (
+        f"Reused the explanation of {provenance['image']} (answered {answered}, "
+        f"{provenance['distance']} bits apart)"
+    )
+    if plain:
+        click.echo(message, err=True)
+    else:
+        get_console().print(f"[dim]{message}[/dim]")
+
+
+def explain_via_daemon(image: str, format: str, stream: bool) -> None:
+    """Explain an image using the daemon's warm assistant."""
+    from . import daemon
+    from .formatters import ResponseFormatter
+
+    title = "Math Problem Explanation"
+    payload = {
+        "command": "explain",
+        "image": str(Path(image).resolve()),
+        "stream": stream and format != "basic",
+    }
+    if format == "basic":
+        response = daemon.request(payload)
+        # Same text as the in-process path, which returns clean_text output
+        click.echo(ResponseFormatter.clean_text(response["text"]))
+        print_reuse(response.get("reused_from"), plain=True)
+        return
+
+    if not stream:
+        with spinner() as progress:
+            progress.add_task(description="Analyzing problem...", total=None)
+            response = daemon.request(payload)
+        if format == "pretty":
+            ResponseFormatter.pretty_print(response["text"])
+        else:
+            ResponseFormatter.rich_print(response["text"], title=title)
+        print_reuse(response.get("reused_from"))
+        return
+
+    start = time.perf_counter()
+    first_token: List[float] = []
+
+    def timed(write: Callable[[str], None]) -> Callable[[str], None]:
+        def on_text(chunk: str) -> None:
+            if not first_token:
+                first_token.append(time.perf_counter() - start)
+            write(chunk)
+
+        return on_text
+
+    if format == "rich":
+        with ResponseFormatter.live_panel(title=title) as live:
+            response = daemon.request(payload, on_text=timed(live.append))
+    else:
+        response = daemon.request(
+            payload, on_text=timed(lambda chunk: print(chunk, end="", flush=True))
+        )
+        print()
+    print_reuse(response.get("reused_from"))
+    if first_token:
+        get_console().print(f"[dim]First token after {first_token[0]:.2f}s[/dim]")
+
+
+def create_assistant(ctx: Context) -> "MathAssistant":
+    """Create an assistant using the global cache options."""
+    from .math_assistant import MathAssistant
+
+    options = ctx.find_root().obj or {}
+    return MathAssistant(
+        use_cache=options.get("use_cache"),
+        refresh_cache=options.get("refresh_cache", False),
+        dedup=options.get("dedup"),
+        cassette=options.get("cassette"),
+        cassette_mode=options.get("cassette_mode"),
+        replay_latency=options.get("replay_latency"),
+    )
+
+
 @click.group(invoke_without_command=True)
+@click.option(
+    "--cache/--no-cache",
+    "use_cache",
+    default=None,
+    help="Cache deterministic responses on disk (default: MATH_ASSISTANT_RESPONSE_CACHE)",
+)
+@click.option(
+    "--refresh",
+    "refresh_cache",
+    is_flag=True,
+    help="Ignore cached responses and store fresh ones",
+)
+@click.option(
+    "--encoder",
+    type=click.Choice(["standard", "adaptive"]),
+    default=None,
+    help="Image encoder: fixed JPEG quality, or smallest output within a byte budget",
+)
+@click.option(
+    "--dedup/--no-dedup",
+    default=None,
+    help="Reuse explanations of images that look the same (default: MATH_ASSISTANT_DEDUP)",
+)
+@click.option(
+    "--no-daemon",
+    is_flag=True,
+    help="Run in this process even if a daemon is running",
+)
+@click.option(
+    "--metrics",
+    "metrics_file",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="On exit, write stage latencies and token counts to this file "
+    "(.jsonl for JSON lines, otherwise Prometheus text)",
+)
+@click.option(
+    "--record",
+    "record_file",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Record API exchanges to this cassette file",
+)
+@click.option(
+    "--replay",
+    "replay_file",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Answer API requests from this cassette file, without the network",
+)
+@click.option(
+    "--replay-latency",
+    type=click.FloatRange(min=0),
+    default=None,
+    help="Replayed latency relative to the recorded one (1: as recorded, 0: none)",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Run the command under cProfile and tracemalloc and write a pstats "
+    "file and flamegraph-ready collapsed stacks",
+)
+@click.option(
+    "--profile-dir",
+    type=click.Path(file_okay=False),
+    default=".",
+    help="Where --profile writes its files (default: current directory)",
+)
 @click.pass_context
-def main(ctx: Context) -> None:
+def main(
+    ctx: Context,
+    use_cache: Optional[bool],
+    refresh_cache: bool,
+    encoder: Optional[str],
+    dedup: Optional[bool],
+    no_daemon: bool,
+    metrics_file: Optional[str],
+    record_file: Optional[str],
+    replay_file: Optional[str],
+    replay_latency: Optional[float],
+    profile: bool,
+    profile_dir: str,
+) -> None:
     """Math Assistant CLI - Get help with math problems using AI."""
+    if record_file and replay_file:
+        raise click.UsageError("--record and --replay cannot be used together")
+    ctx.obj = {
+        "use_cache": use_cache,
+        "refresh_cache": refresh_cache,
+        "encoder": encoder,
+        "dedup": dedup,
+        "cassette": record_file or replay_file,
+        "cassette_mode": "record" if record_file else "replay",
+        "replay_latency": replay_latency,
+        "use_daemon": not no_daemon
+        and use_cache is None
+        and not refresh_cache
+        and encoder is None
+        and dedup is None
+        and metrics_file is None
+        and record_file is None
+        and replay_file is None
+        and not profile,
+    }
+    if encoder:
+        Config.IMAGE_ENCODER = encoder
+    if metrics_file:
+        from .metrics import METRICS
+
+        ctx.call_on_close(functools.partial(METRICS.export, metrics_file))
+    if profile:
+        from .profiling import Profiler, format_report
+
+        command = ctx.invoked_subcommand or "interactive"
+        profiler = Profiler(profile_dir, name=f"math-assist-{command}")
+        # Reported on stderr so piped output (e.g. --output ndjson) stays clean
+        ctx.call_on_close(lambda: click.echo(format_report(profiler.stop()), err=True))
+        profiler.start()
     try:
-        check_environment()
+        # Replays, the mock server and local-only commands need no API key
+        if not replay_file and ctx.invoked_subcommand not in OFFLINE_COMMANDS:
+            check_environment()
         if ctx.invoked_subcommand is None:
             ctx.invoke(interactive)
     except Exception as e:
@@ -176,10 +516,36 @@ def main(ctx: Context) -> None:
 
 
 @main.command()
-def interactive() -> None:
+@click.option(
+    "--stream/--no-stream",
+    default=True,
+    help="Show answers as they are generated",
+)
+@click.option(
+    "--prefetch/--no-prefetch",
+    default=True,
+    help="Prepare practice problems in the background after an image is loaded",
+)
+@click.option(
+    "--prefetch-explain",
+    is_flag=True,
+    help="Also prepare the full explanation in the background",
+)
+@click.pass_context
+def interactive(
+    ctx: Context, stream: bool, prefetch: bool, prefetch_explain: bool
+) -> None:
     """Start an interactive session."""
+    from .formatters import ResponseFormatter
+    from .prefetch import Prefetcher
+
+    console = get_console()
+    prefetcher: Optional[Prefetcher] = None
     try:
-        assistant = MathAssistant()
+        assistant = create_assistant(ctx)
+        if prefetch:
+            kinds = ["practice", "explain"] if prefetch_explain else ["practice"]
+            prefetcher = Prefetcher(assistant, kinds=kinds)
         current_image: Optional[str] = None
         print_welcome()
 
@@ -201,10 +567,28 @@ def interactive() -> None:
                 elif command.lower() == "help":
                     print_welcome()
 
+                elif command.lower() == "usage":
+                    print_usage(assistant, prefetcher)
+
+                elif command.lower() == "stats":
+                    print_stats()
+
+                elif command.lower() == "tokens":
+                    console.print(
+                        f"Conversation history: ~{assistant.history_tokens()} of "
+                        f"{assistant.history_token_budget} tokens "
+                        f"({len(assistant.conversation_history)} messages, "
+                        f"last {assistant.history_keep_turns} turns kept verbatim)"
+                    )
+
                 elif command.lower().startswith("image:"):
                     image_path = command.split(":", 1)[1].strip()
-                    if handle_image_command(assistant, image_path):
+                    if prefetcher:
+                        prefetcher.cancel()
+                    if handle_image_command(assistant, image_path, stream=stream):
                         current_image = image_path
+                        if prefetcher:
+                            prefetcher.start(current_image)
 
                 elif command.lower().startswith("save:"):
                     try:
@@ -216,17 +600,35 @@ def interactive() -> None:
                     except Exception as e:
                         console.print(f"[red]Error saving file:[/red] {str(e)}")
 
-                elif command.lower() == "practice":
+                elif command.lower() in ("practice", "explain"):
+                    kind = command.lower()
                     if current_image:
-                        with Progress(
-                            SpinnerColumn(),
-                            TextColumn("[progress.description]{task.description}"),
-                        ) as progress:
-                            progress.add_task(
-                                description="Generating practice problems...",
-                                total=None,
+                        title, description = {
+                            "practice": (
+                                "Similar Problems",
+                                "Generating practice problems...",
+                            ),
+                            "explain": (
+                                "Math Problem Explanation",
+                                "Explaining problem...",
+                            ),
+                        }[kind]
+                        with spinner() as progress:
+                            progress.add_task(description=description, total=None)
+                            response = (
+                                prefetcher.take(kind, current_image)
+                                if prefetcher
+                                else None
                             )
-                            assistant.generate_similar_problems(current_image)
+                            if response is None and kind == "practice":
+                                response = assistant.generate_similar_problems(
+                                    current_image, format_output=False
+                                )
+                            elif response is None:
+                                response = assistant.explain_problem(
+                                    current_image, format_output=False
+                                )
+                        ResponseFormatter.rich_print(response, title=title)
                     else:
                         console.print(
                             "[red]Please load an image first using 'image: path/to/image.jpg'[/red]"
@@ -235,10 +637,7 @@ def interactive() -> None:
                 elif command.lower() == "check":
                     if current_image:
                         solution = get_multiline_input("Enter your solution")
-                        with Progress(
-                            SpinnerColumn(),
-                            TextColumn("[progress.description]{task.description}"),
-                        ) as progress:
+                        with spinner() as progress:
                             progress.add_task(
                                 description="Checking solution...", total=None
                             )
@@ -250,7 +649,7 @@ def interactive() -> None:
 
                 else:
                     if current_image:
-                        assistant.continue_conversation(command)
+                        assistant.continue_conversation(command, stream=stream)
                     else:
                         console.print(
                             "[red]Please load an image first using 'image: path/to/image.jpg'[/red]"
@@ -264,6 +663,9 @@ def interactive() -> None:
     except Exception as e:
         handle_error(e)
         sys.exit(1)
+    finally:
+        if prefetcher:
+            prefetcher.close()
 
 
 @main.command()
@@ -275,15 +677,607 @@ def interactive() -> None:
     default="rich",
     help="Output format style",
 )
-def explain(image: str, format: str) -> None:
+@click.option("--stream", is_flag=True, help="Show the explanation as it is generated")
+@click.option(
+    "--output",
+    type=click.Choice(["text", "ndjson"]),
+    default="text",
+    help="ndjson: print the structured explanation as one JSON line",
+)
+@click.pass_context
+def explain(ctx: Context, image: str, format: str, stream: bool, output: str) -> None:
     """Explain a math problem from an image."""
     try:
-        assistant = MathAssistant()
-        with Progress(
-            SpinnerColumn(), TextColumn("[progress.description]{task.description}")
-        ) as progress:
+        if output == "ndjson":
+            if daemon_available(ctx):
+                from . import daemon
+
+                payload = {
+                    "command": "explain",
+                    "image": str(Path(image).resolve()),
+                    "structured": True,
+                }
+                result = daemon.request(payload)["result"]
+            else:
+                result = create_assistant(ctx).explain_problem(image, structured=True)
+            click.echo(json.dumps(result))
+            return
+        if daemon_available(ctx):
+            explain_via_daemon(image, format, stream)
+            return
+        assistant = create_assistant(ctx)
+        if format == "basic":
+            # Plain text for scripts and pipes: no spinner, no rich
+            click.echo(assistant.explain_problem(image, format_style="basic"))
+            print_reuse(assistant.reused_from(image), plain=True)
+            return
+        console = get_console()
+        if stream:
+            assistant.explain_problem(image, format_style=format, stream=True)
+            print_reuse(assistant.reused_from(image))
+            if assistant.last_time_to_first_token is not None:
+                console.print(
+                    f"[dim]First token after "
+                    f"{assistant.last_time_to_first_token:.2f}s[/dim]"
+                )
+            return
+        with spinner() as progress:
             progress.add_task(description="Analyzing problem...", total=None)
             assistant.explain_problem(image, format_style=format)
+        print_reuse(assistant.reused_from(image))
+    except Exception as e:
+        handle_error(e, plain=format == "basic" or output == "ndjson")
+        sys.exit(1)
+
+
+@main.command()
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option(
+    "--task",
+    "-t",
+    type=click.Choice(TASKS),
+    default="explain",
+    help="What to do with each image",
+)
+@click.option(
+    "--concurrency",
+    "-c",
+    type=click.IntRange(1, 64),
+    default=4,
+    help="Maximum number of images processed at once",
+)
+@click.option(
+    "--output-dir",
+    "-o",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Where to write results (default: DIRECTORY/math_assistant_output)",
+)
+@click.option(
+    "--num-problems",
+    "-n",
+    type=click.IntRange(1, 20),
+    default=3,
+    help="Practice problems per image (practice task only)",
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(0, 64),
+    default=0,
+    help="Processes that encode images ahead of the requests (0: encode in-line)",
+)
+@click.option(
+    "--pack",
+    "-k",
+    type=click.IntRange(1, 20),
+    default=1,
+    help="Problems explained per API request (explain task only)",
+)
+@click.option(
+    "--output",
+    type=click.Choice(["text", "ndjson"]),
+    default="text",
+    help="ndjson: structured results, one JSON object per image on stdout",
+)
+@click.pass_context
+def batch(
+    ctx: Context,
+    directory: str,
+    task: str,
+    concurrency: int,
+    output_dir: Optional[str],
+    num_problems: int,
+    workers: int,
+    pack: int,
+    output: str,
+) -> None:
+    """Process every image in a directory.
+
+    For the check task, each image needs a student solution in a text file
+    with the same name (e.g. problem1.jpg and problem1.txt).
+
+    With --pack K, up to K problems are explained in one request and the
+    answer is split back into one result per image.
+
+    With --output ndjson, results are requested as JSON through tool schemas
+    and each image's result is printed as one line as soon as it finishes.
+    """
+    from rich.progress import (
+        BarColumn,
+        MofNCompleteColumn,
+        Progress,
+        SpinnerColumn,
+        TextColumn,
+        TimeElapsedColumn,
+    )
+    from .batch import BatchRunner, find_images
+
+    console = get_console()
+    try:
+        images = find_images(directory)
+        if not images:
+            raise CLIError(f"No supported images found in {directory}")
+
+        runner = BatchRunner(
+            create_assistant(ctx),
+            task,
+            output_dir or Path(directory) / "math_assistant_output",
+            concurrency=concurrency,
+            num_problems=num_problems,
+            preprocess_workers=workers,
+            pack_size=pack,
+            structured=output == "ndjson",
+        )
+
+        if output == "ndjson":
+            # Machine-readable stream for pipelines: no progress display
+            results = runner.run(
+                images, on_complete=lambda result: click.echo(json.dumps(result))
+            )
+            if any(r["status"] == "error" for r in results):
+                sys.exit(1)
+            return
+
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeElapsedColumn(),
+            console=console,
+        ) as progress:
+            progress_task = progress.add_task(
+                description=f"Running {task}...", total=len(images)
+            )
+
+            def on_complete(result: "BatchResult") -> None:
+                if result["status"] == "error":
+                    progress.console.print(
+                        f"[red]✗ {Path(result['image']).name}:[/red] {result['error']}"
+                    )
+                progress.advance(progress_task)
+
+            results = runner.run(images, on_complete=on_complete)
+
+        failed = sum(1 for r in results if r["status"] == "error")
+        console.print(
+            f"[green]✓ {len(results) - failed} of {len(results)} images processed[/green]"
+            f" — results in {runner.output_dir}"
+        )
+        summary = runner.summary
+        console.print(
+            f"[dim]{summary['api_requests']} API requests "
+            f"({summary['requests_per_problem']:.2f} per problem), "
+            f"{summary['mean_latency_seconds']:.2f}s mean latency, "
+            f"{summary['seconds_per_problem']:.2f}s per problem overall[/dim]"
+        )
+        if "local_checks" in summary:
+            local = summary["local_checks"]
+            console.print(
+                f"[dim]{local['resolved_locally']} of {local['checks']} checks "
+                f"({local['local_fraction']:.0%}) answered locally[/dim]"
+            )
+        if failed:
+            sys.exit(1)
+    except Exception as e:
+        handle_error(e, plain=output == "ndjson")
+        sys.exit(1)
+
+
+@main.command()
+@click.argument("image", type=click.Path(exists=True, dir_okay=False))
+@click.argument("value", required=False)
+def answer(image: str, value: Optional[str]) -> None:
+    """Show or set the reference answer for a problem image.
+
+    Solution checks for the image are then answered locally when the
+    student's final answer clearly matches or contradicts VALUE.
+    """
+    from .local_check import ReferenceAnswers
+
+    try:
+        answers = ReferenceAnswers(Config.CACHE_DIR / "answers.sqlite3")
+        if value is not None:
+            answers.put(image, value)
+            click.echo(f"Reference answer for {image}: {value}")
+            return
+        stored = answers.get(image)
+        click.echo(stored if stored is not None else "No reference answer stored")
+    except Exception as e:
+        handle_error(e, plain=True)
+        sys.exit(1)
+
+
+@main.command()
+@click.option("--clear", is_flag=True, help="Delete all cached responses")
+def cache(clear: bool) -> None:
+    """Show or clear the response cache."""
+    from rich.panel import Panel
+    from .response_cache import ResponseCache
+
+    console = get_console()
+    try:
+        response_cache = ResponseCache(
+            Config.CACHE_DIR / "responses.sqlite3",
+            ttl_seconds=Config.RESPONSE_CACHE_TTL,
+            max_bytes=Config.RESPONSE_CACHE_MAX_BYTES,
+        )
+        if clear:
+            response_cache.clear()
+            console.print("[green]✓ Response cache cleared[/green]")
+            return
+        stats = response_cache.stats()
+        console.print(
+            Panel(
+                f"Location: {response_cache.db_path}\n"
+                f"Entries: {stats['entries']}\n"
+                f"Hits served: {stats['lifetime_hits']}\n"
+                f"Size: {stats['total_bytes'] / 1024:.1f} KiB",
+                title="Response Cache",
+                border_style="blue",
+            )
+        )
     except Exception as e:
         handle_error(e)
         sys.exit(1)
+
+
+@main.command()
+@click.argument("image", type=click.Path(exists=True))
+@click.pass_context
+def inspect(ctx: Context, image: str) -> None:
+    """Show image properties and what each encoder would upload."""
+    from rich.panel import Panel
+
+    try:
+        if daemon_available(ctx):
+            from . import daemon
+
+            result = daemon.request(
+                {"command": "inspect", "image": str(Path(image).resolve())}
+            )
+            info, report = result["info"], result["report"]
+        else:
+            from .image_processor import ImageProcessor
+
+            info = ImageProcessor.check_image(image)
+            report = ImageProcessor.encoding_report(image)
+        lines = [
+            f"Dimensions: {info['dimensions'][0]}x{info['dimensions'][1]}",
+            f"Format: {info['format']} ({info['mode']})",
+            f"File size: {info['estimated_size'] / 1024:.1f} KiB",
+            "",
+            f"Standard encoder: {report['standard_bytes'] / 1024:.1f} KiB JPEG at "
+            f"{report['standard_size'][0]}x{report['standard_size'][1]}",
+            f"Adaptive encoder: {report['adaptive_bytes'] / 1024:.1f} KiB "
+            f"{report['adaptive_media_type'].split('/')[1].upper()} at "
+            f"{report['adaptive_size'][0]}x{report['adaptive_size'][1]}",
+            f"Saved: {report['saved_bytes'] / 1024:.1f} KiB "
+            f"({report['saved_percent']:.0f}%)",
+        ]
+        lines += [f"• {issue}" for issue in info["issues"]]
+        get_console().print(Panel("\n".join(lines), title=image, border_style="blue"))
+    except Exception as e:
+        handle_error(e)
+        sys.exit(1)
+
+
+@main.group()
+def daemon() -> None:
+    """Run a background assistant that other commands forward to.
+
+    While it runs, `explain` and `inspect` reuse its API connection and warm
+    caches instead of starting from scratch on every invocation.
+    """
+
+
+@daemon.command("start")
+@click.option(
+    "--foreground",
+    "-F",
+    is_flag=True,
+    help="Serve in this process instead of starting a background one",
+)
+@click.option(
+    "--idle-timeout",
+    type=click.FloatRange(min=0),
+    default=None,
+    help="Exit after this many idle seconds, 0 to never exit (default: 3600)",
+)
+@click.pass_context
+def daemon_start(ctx: Context, foreground: bool, idle_timeout: Optional[float]) -> None:
+    """Start the daemon."""
+    from . import daemon as daemon_module
+
+    console = get_console()
+    try:
+        if not foreground:
+            if daemon_module.is_running():
+                console.print("[yellow]Daemon is already running[/yellow]")
+                return
+            # Fail here rather than in the detached server process
+            check_environment()
+            options = ctx.find_root().obj or {}
+            args: List[str] = []
+            if options.get("use_cache") is not None:
+                args.append("--cache" if options["use_cache"] else "--no-cache")
+            if options.get("encoder"):
+                args += ["--encoder", options["encoder"]]
+            args += ["daemon", "start", "--foreground"]
+            if idle_timeout is not None:
+                args += ["--idle-timeout", str(idle_timeout)]
+            pid = daemon_module.start_background(args)
+            console.print(
+                f"[green]✓ Daemon started (pid {pid}) on "
+                f"{daemon_module.socket_path()}[/green]"
+            )
+            return
+
+        import signal
+
+        server = daemon_module.DaemonServer(
+            create_assistant(ctx), idle_timeout=idle_timeout
+        )
+        signal.signal(signal.SIGTERM, lambda *_: server.stop())
+        console.print(f"Listening on {server.path} (pid {os.getpid()})")
+        try:
+            server.serve()
+        except KeyboardInterrupt:
+            pass
+    except Exception as e:
+        handle_error(e)
+        sys.exit(1)
+
+
+@daemon.command("stop")
+def daemon_stop() -> None:
+    """Stop the daemon."""
+    from . import daemon as daemon_module
+
+    try:
+        daemon_module.request({"command": "shutdown"}, timeout=5)
+        get_console().print("[green]✓ Daemon stopped[/green]")
+    except daemon_module.DaemonUnavailable:
+        get_console().print("[yellow]Daemon is not running[/yellow]")
+
+
+@daemon.command("status")
+def daemon_status() -> None:
+    """Show whether the daemon is running, with cache and usage totals."""
+    from rich.panel import Panel
+    from . import daemon as daemon_module
+
+    try:
+        status = daemon_module.request({"command": "status"}, timeout=5)
+    except daemon_module.DaemonUnavailable:
+        get_console().print("[yellow]Daemon is not running[/yellow]")
+        sys.exit(1)
+
+    lines = [
+        f"PID: {status['pid']}",
+        f"Socket: {status['socket']}",
+        f"Uptime: {status['uptime'] / 60:.1f} min",
+        f"Requests served: {status['requests']} "
+        f"({status['coalesced']} shared an identical in-flight call)",
+        f"Encoder: {status['encoder']}",
+    ]
+    image_cache = status["image_cache"]
+    if image_cache:
+        lines.append(
+            f"Image cache: {image_cache['hits'] + image_cache['disk_hits']} hits, "
+            f"{image_cache['misses']} misses"
+        )
+    response_cache = status["response_cache"]
+    if response_cache:
+        lines.append(
+            f"Response cache: {response_cache['hits']} hits, "
+            f"{response_cache['misses']} misses"
+        )
+    usage = status["usage"]
+    lines.append(
+        f"Tokens: {usage['input_tokens']} in, {usage['output_tokens']} out, "
+        f"{usage['cache_read_input_tokens']} cache reads"
+    )
+    get_console().print(Panel("\n".join(lines), title="Daemon", border_style="blue"))
+
+
+def mock_server_options(func: Callable) -> Callable:
+    """Options shaping the mock API server's behaviour."""
+    options = [
+        click.option(
+            "--latency",
+            type=click.FloatRange(min=0),
+            default=0.5,
+            help="Mean seconds to the first token (default: 0.5)",
+        ),
+        click.option(
+            "--latency-distribution",
+            type=click.Choice(
+                ["fixed", "uniform", "normal", "lognormal", "exponential"]
+            ),
+            default="lognormal",
+            help="Distribution of the time to the first token",
+        ),
+        click.option(
+            "--latency-spread",
+            type=click.FloatRange(min=0),
+            default=0.5,
+            help="Standard deviation relative to the mean latency",
+        ),
+        click.option(
+            "--tokens-per-second",
+            type=click.FloatRange(min=0),
+            default=100.0,
+            help="Output rate after the first token (0: instant)",
+        ),
+        click.option(
+            "--output-tokens",
+            type=click.IntRange(min=1),
+            default=200,
+            help="Mean answer length in tokens",
+        ),
+        click.option(
+            "--rate-limit-rate",
+            type=click.FloatRange(0, 1),
+            default=0.0,
+            help="Fraction of requests answered with 429 rate_limit_error",
+        ),
+        click.option(
+            "--overload-rate",
+            type=click.FloatRange(0, 1),
+            default=0.0,
+            help="Fraction of requests answered with 529 overloaded_error",
+        ),
+        click.option(
+            "--rpm",
+            type=click.FloatRange(min=1),
+            default=4000,
+            help="Requests admitted per minute before 429s",
+        ),
+        click.option("--seed", type=int, default=None, help="Random seed"),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def start_mock_server(host: str, port: int, options: dict) -> "MockAPIServer":
+    """Start a mock API server in the background from command options."""
+    from .mock_server import LatencyModel, MockAPIServer
+
+    return MockAPIServer(
+        host,
+        port,
+        latency=LatencyModel(
+            options["latency_distribution"],
+            options["latency"],
+            options["latency_spread"],
+        ),
+        tokens_per_second=options["tokens_per_second"],
+        output_tokens=options["output_tokens"],
+        rate_limit_rate=options["rate_limit_rate"],
+        overload_rate=options["overload_rate"],
+        requests_per_minute=options["rpm"],
+        seed=options["seed"],
+    ).start()
+
+
+@main.command("mock-server")
+@click.option("--host", default="127.0.0.1", help="Interface to listen on")
+@click.option("--port", type=click.IntRange(0, 65535), default=8080, help="Port")
+@mock_server_options
+def mock_server(host: str, port: int, **options: Any) -> None:
+    """Serve a local stand-in for the Messages API.
+
+    Answers are filler text with realistic timing, so load tests and demos
+    need no API key or credits. Point clients at it with
+    ANTHROPIC_BASE_URL=http://HOST:PORT.
+    """
+    server = start_mock_server(host, port, options)
+    get_console().print(f"Mock Messages API listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        stats = server.stats()
+        click.echo(
+            f"{stats['requests']} requests ({stats['streamed']} streamed), "
+            f"{stats['rate_limited']} rate limited, {stats['overloaded']} overloaded"
+        )
+
+
+@main.command()
+@click.argument("image", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--workload",
+    type=click.Choice(["explain", "stream", "conversation", "practice"]),
+    default="explain",
+    help="What each operation does; conversation is three turns",
+)
+@click.option(
+    "--concurrency",
+    "-c",
+    type=click.IntRange(1, 512),
+    default=4,
+    help="Concurrent sessions",
+)
+@click.option(
+    "--operations",
+    "-n",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Total operations (default: 10 per session)",
+)
+@click.option(
+    "--duration",
+    type=click.FloatRange(min=0),
+    default=None,
+    help="Stop starting operations after this many seconds",
+)
+@click.option(
+    "--base-url",
+    default=None,
+    help="Server to test (default: a mock server started for the run)",
+)
+@mock_server_options
+def loadtest(
+    image: str,
+    workload: str,
+    concurrency: int,
+    operations: Optional[int],
+    duration: Optional[float],
+    base_url: Optional[str],
+    **options: Any,
+) -> None:
+    """Measure throughput and latency of concurrent sessions.
+
+    Without --base-url, a mock API server with the given latency and error
+    options is started for the run, so no API key is needed.
+    """
+    from .loadtest import format_report, run_load_test
+
+    server = None
+    try:
+        if base_url is None:
+            server = start_mock_server("127.0.0.1", 0, options)
+            base_url = server.url
+        report = run_load_test(
+            image,
+            workload=workload,
+            concurrency=concurrency,
+            operations=operations,
+            duration=duration,
+            base_url=base_url,
+            api_key=os.getenv("ANTHROPIC_API_KEY") or "mock-key",
+        )
+        click.echo(format_report(report))
+    except Exception as e:
+        handle_error(e, plain=True)
+        sys.exit(1)
+    finally:
+        if server is not None:
+            server.close()
@@ -1,6 +1,7 @@
 """Configuration settings for the Math Assistant."""
 
 import os
+from pathlib import Path
 from typing import List
 
 
@@ -9,18 +10,100 @@ class Config:
 
     # API settings
     ANTHROPIC_API_KEY: str | None = os.getenv("ANTHROPIC_API_KEY")
+    # Send requests here instead of the public API, e.g. to the mock server
+    API_BASE_URL: str | None = os.getenv("ANTHROPIC_BASE_URL")
 
     # Image settings
     MAX_IMAGE_SIZE: int = 2048
     SUPPORTED_FORMATS: List[str] = [".jpg", ".jpeg", ".png"]
+    # 'standard' (JPEG, quality 95) or 'adaptive' (fit a byte/pixel budget)
+    IMAGE_ENCODER: str = os.getenv("MATH_ASSISTANT_IMAGE_ENCODER", "standard")
+    # Images larger than this are downscaled by the model anyway
+    ADAPTIVE_MAX_EDGE: int = 1568
+    ADAPTIVE_MAX_PIXELS: int = 1_150_000
+    ADAPTIVE_MAX_BYTES: int = 400 * 1024
+    # Processes for bulk preprocessing; None means one per CPU
+    PREPROCESS_WORKERS: int | None = None
 
     # Model settings
     DEFAULT_MODEL: str = "claude-3-5-sonnet-20241022"
     DEFAULT_MAX_TOKENS: int = 1500
 
+    # Conversation settings
+    HISTORY_TOKEN_BUDGET: int = 8000
+    HISTORY_KEEP_TURNS: int = 4
+    HISTORY_SUMMARY_MAX_TOKENS: int = 600
+
+    # Rate limiting; limits reported by the API take precedence
+    RATE_LIMIT_RPM: float = float(os.getenv("MATH_ASSISTANT_RPM", "50"))
+    RATE_LIMIT_INPUT_TPM: float = float(os.getenv("MATH_ASSISTANT_INPUT_TPM", "40000"))
+    RATE_LIMIT_OUTPUT_TPM: float = float(os.getenv("MATH_ASSISTANT_OUTPUT_TPM", "8000"))
+    MAX_CONCURRENCY: int = 16
+    MAX_RETRIES: int = 6
+    RETRY_BASE_DELAY: float = 1.0
+    RETRY_MAX_DELAY: float = 60.0
+
+    # Problems explained per request in packed batch mode
+    PACK_SIZE: int = 4
+    # Output limit for a packed request
+    PACK_MAX_TOKENS: int = 8192
+
+    # Practice requests for more problems than this are split into parallel
+    # sub-requests, each generating a slice at its own difficulty
+    PRACTICE_FANOUT_THRESHOLD: int = 4
+    # Problems generated per practice sub-request
+    PRACTICE_SLICE_SIZE: int = 3
+
+    # Speculative requests in interactive mode, in tokens per session
+    PREFETCH_TOKEN_BUDGET: int = 20000
+
     # Output settings
     DEFAULT_FORMAT_STYLE: str = "rich"
 
+    # Cache settings
+    CACHE_DIR: Path = Path(
+        os.getenv("MATH_ASSISTANT_CACHE_DIR", Path.home() / ".cache" / "math_assistant")
+    )
+    IMAGE_CACHE_ENABLED: bool = os.getenv("MATH_ASSISTANT_IMAGE_CACHE", "1") != "0"
+    IMAGE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    IMAGE_CACHE_DISK_MAX_BYTES: int = 512 * 1024 * 1024
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("MATH_ASSISTANT_RESPONSE_CACHE") == "1"
+    RESPONSE_CACHE_TTL: float = 30 * 24 * 3600
+    RESPONSE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Answer solution checks locally when a reference answer is known
+    LOCAL_CHECK_ENABLED: bool = os.getenv("MATH_ASSISTANT_LOCAL_CHECK", "1") != "0"
+
+    # Reuse explanations of images that look the same (perceptual hash)
+    DEDUP_ENABLED: bool = os.getenv("MATH_ASSISTANT_DEDUP") == "1"
+    # Largest Hamming distance between 64-bit hashes treated as the same image
+    DEDUP_MAX_DISTANCE: int = int(os.getenv("MATH_ASSISTANT_DEDUP_DISTANCE", "6"))
+
+    # Per-stage latency and token metrics (see metrics.py)
+    METRICS_ENABLED: bool = os.getenv("MATH_ASSISTANT_METRICS", "1") != "0"
+    # Samples kept per latency series for percentiles
+    METRICS_MAX_SAMPLES: int = 10000
+
+    # Record or replay API exchanges (see cassette.py)
+    CASSETTE_PATH: Path | None = (
+        Path(os.environ["MATH_ASSISTANT_CASSETTE"])
+        if os.getenv("MATH_ASSISTANT_CASSETTE")
+        else None
+    )
+    # 'record' or 'replay'
+    CASSETTE_MODE: str = os.getenv("MATH_ASSISTANT_CASSETTE_MODE", "replay")
+    # Replayed latency relative to the recorded one: 1 as recorded, 0 none
+    REPLAY_LATENCY_SCALE: float = float(os.getenv("MATH_ASSISTANT_REPLAY_LATENCY", "1"))
+
+    # Daemon settings
+    DAEMON_SOCKET: Path | None = (
+        Path(os.environ["MATH_ASSISTANT_DAEMON_SOCKET"])
+        if os.getenv("MATH_ASSISTANT_DAEMON_SOCKET")
+        else None
+    )
+    # Seconds without a request before the daemon exits; 0 keeps it running
+    DAEMON_IDLE_TIMEOUT: float = 3600
+
     @classmethod
     def initialize(cls) -> None:
         """Initialize configuration."""
@@ -0,0 +1,296 @@
+"""Long-lived background assistant served over a Unix domain socket.
+
+The daemon keeps one MathAssistant, and with it one HTTP connection pool
+and warm image and response caches, so repeated CLI invocations only pay
+for the API call. The protocol is one JSON request line per connection,
+answered by JSON lines: zero or more ``{"event": "text"}`` chunks when
+streaming, then a final ``{"event": "result"}`` or ``{"event": "error"}``.
+
+This module only imports the standard library at load time; the client
+side runs inside every CLI invocation.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+from .config import Config
+from .exceptions import (
+    APIError,
+    ConfigurationError,
+    ImageProcessingError,
+    MathAssistantError,
+)
+
+if TYPE_CHECKING:
+    from .math_assistant import MathAssistant
+
+Message = Dict[str, Any]
+
+# Error kinds the client re-raises as the matching exception
+ERROR_TYPES: Dict[str, type] = {
+    "ImageProcessingError": ImageProcessingError,
+    "APIError": APIError,
+    "ConfigurationError": ConfigurationError,
+}
+
+
+class DaemonUnavailable(MathAssistantError):
+    """Raised when no daemon is listening on the socket."""
+
+    pass
+
+
+def socket_path() -> Path:
+    """Return the daemon's socket path."""
+    return Config.DAEMON_SOCKET or Config.CACHE_DIR / "daemon.sock"
+
+
+def request(
+    payload: Message,
+    on_text: Optional[Callable[[str], None]] = None,
+    timeout: Optional[float] = None,
+    path: Optional[Path] = None,
+) -> Message:
+    """Send one request to the daemon and return its final message.
+
+    Args:
+        payload: Request with a ``command`` key
+        on_text: Called with each streamed text chunk
+        timeout: Socket timeout in seconds (None waits indefinitely)
+        path: Socket path (default: socket_path())
+
+    Raises:
+        DaemonUnavailable: If no daemon is listening
+        MathAssistantError: If the daemon reports an error
+    """
+    path = path or socket_path()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(path))
+    except OSError as e:
+        sock.close()
+        raise DaemonUnavailable(f"No daemon listening on {path}: {str(e)}")
+
+    with sock, sock.makefile("rwb") as stream:
+        stream.write(json.dumps(payload).encode("utf-8") + b"\n")
+        stream.flush()
+        for line in stream:
+            message = json.loads(line)
+            if message["event"] == "text":
+                if on_text:
+                    on_text(message["text"])
+            elif message["event"] == "error":
+                error_type = ERROR_TYPES.get(message["kind"], MathAssistantError)
+                raise error_type(message["error"])
+            else:
+                return message
+    raise DaemonUnavailable("Daemon closed the connection without a result")
+
+
+def is_running(path: Optional[Path] = None) -> bool:
+    """Return True if a daemon answers on the socket."""
+    try:
+        request({"command": "ping"}, timeout=2, path=path)
+        return True
+    except (DaemonUnavailable, OSError, ValueError):
+        return False
+
+
+def start_background(args: List[str], wait: float = 10.0) -> int:
+    """Start a daemon in a new session and wait until it answers.
+
+    Args:
+        args: Command line for ``python -m math_assistant`` that runs the
+            daemon in the foreground
+        wait: Seconds to wait for the socket to come up
+
+    Returns:
+        The daemon's process id
+    """
+    path = socket_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    log = open(path.with_suffix(".log"), "ab")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "math_assistant", *args],
+        stdin=subprocess.DEVNULL,
+        stdout=log,
+        stderr=log,
+        start_new_session=True,
+    )
+    log.close()
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise MathAssistantError(
+                f"Daemon exited with status {process.returncode}; "
+                f"see {path.with_suffix('.log')}"
+            )
+        if is_running(path):
+            return process.pid
+        time.sleep(0.1)
+    process.terminate()
+    raise MathAssistantError(f"Daemon did not start within {wait:.0f}s")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "DaemonServer"
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            return
+        self.server.touch()
+        try:
+            payload = json.loads(line)
+            result = self.server.dispatch(payload, self._send_text)
+            self._send({"event": "result", **result})
+        except Exception as e:
+            self._send({"event": "error", "kind": type(e).__name__, "error": str(e)})
+        finally:
+            self.server.touch()
+
+    def _send_text(self, text: str) -> None:
+        self._send({"event": "text", "text": text})
+
+    def _send(self, message: Message) -> None:
+        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded socket server around one shared MathAssistant."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        assistant: "MathAssistant",
+        path: Optional[Path] = None,
+        idle_timeout: Optional[float] = None,
+    ) -> None:
+        """Bind the socket.
+
+        Args:
+            assistant: Assistant shared by all requests
+            path: Socket path (default: socket_path())
+            idle_timeout: Exit after this many seconds without a request
+                (default: Config.DAEMON_IDLE_TIMEOUT; 0 never exits)
+        """
+        self.assistant = assistant
+        self.path = Path(path or socket_path())
+        self.idle_timeout = (
+            Config.DAEMON_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        )
+        self.started = time.time()
+        self.requests = 0
+        self._last_activity = time.monotonic()
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            if is_running(self.path):
+                raise MathAssistantError(f"A daemon is already running on {self.path}")
+            self.path.unlink()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(str(self.path), _Handler)
+        os.chmod(self.path, 0o600)
+
+    def touch(self) -> None:
+        with self._lock:
+            self._last_activity = time.monotonic()
+
+    def serve(self) -> None:
+        """Serve until stopped or idle for longer than the idle timeout."""
+        if self.idle_timeout:
+            threading.Thread(target=self._watch_idle, daemon=True).start()
+        try:
+            self.serve_forever(poll_interval=0.5)
+        finally:
+            self.server_close()
+            self.path.unlink(missing_ok=True)
+
+    def stop(self) -> None:
+        """Stop serving; safe to call from a request thread."""
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def _watch_idle(self) -> None:
+        while True:
+            time.sleep(min(self.idle_timeout, 5))
+            with self._lock:
+                idle = time.monotonic() - self._last_activity
+            if idle >= self.idle_timeout:
+                self.shutdown()
+                return
+
+    def dispatch(self, payload: Message, send_text: Callable[[str], None]) -> Message:
+        """Run one request and return the fields of its result message."""
+        command = payload.get("command")
+        if command == "ping":
+            return {}
+        if command == "status":
+            return self.status()
+        if command == "shutdown":
+            self.stop()
+            return {}
+
+        with self._lock:
+            self.requests += 1
+        if command == "explain":
+            return self._explain(payload, send_text)
+        if command == "inspect":
+            return self._inspect(payload)
+        raise ValueError(f"Unknown command: {command}")
+
+    def status(self) -> Message:
+        """Describe the daemon, its caches and token usage."""
+        from .image_processor import ImageProcessor
+
+        image_cache = ImageProcessor.get_cache()
+        response_cache = self.assistant.response_cache
+        return {
+            "pid": os.getpid(),
+            "socket": str(self.path),
+            "uptime": time.time() - self.started,
+            "requests": self.requests,
+            "encoder": Config.IMAGE_ENCODER,
+            "image_cache": image_cache.stats() if image_cache else None,
+            "response_cache": response_cache.stats() if response_cache else None,
+            "usage": self.assistant.get_usage(),
+            "coalesced": self.assistant.single_flight.coalesced,
+        }
+
+    def _explain(self, payload: Message, send_text: Callable[[str], None]) -> Message:
+        from .history import content_text
+
+        start = time.perf_counter()
+        if payload.get("structured"):
+            result = self.assistant.explain_problem(
+                payload["image"], payload.get("additional_text", ""), structured=True
+            )
+            return {"result": result, "seconds": time.perf_counter() - start}
+        content = self.assistant._get_explanation(
+            payload["image"],
+            payload.get("additional_text", ""),
+            on_text=send_text if payload.get("stream") else None,
+        )
+        return {
+            "text": content_text(content),
+            "seconds": time.perf_counter() - start,
+            "reused_from": self.assistant.reused_from(payload["image"]),
+        }
+
+    def _inspect(self, payload: Message) -> Message:
+        from .image_processor import ImageProcessor
+
+        return {
+            "info": ImageProcessor.check_image(payload["image"]),
+            "report": ImageProcessor.encoding_report(payload["image"]),
+        }
@@ -0,0 +1,210 @@
+"""Near-duplicate lookup of answered problem images by perceptual hash."""
+
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TypedDict, Union
+from .image_cache import ImageCache
+
+HASH_BITS = 64
+# The hash is split into this many chunks, each stored in an indexed column
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+_CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+class Provenance(TypedDict):
+    """Type definition for where a reused answer came from."""
+
+    image: str
+    digest: str
+    distance: int
+    answered_at: float
+
+
+class DedupMatch(Provenance):
+    """Type definition for a stored answer found by ``DedupIndex.lookup``."""
+
+    response: Dict[str, Any]
+
+
+class DedupStats(TypedDict):
+    """Type definition for dedup index statistics."""
+
+    entries: int
+    lookups: int
+    reused: int
+
+
+def hamming(a: int, b: int) -> int:
+    """Return the number of bits that differ between two hashes."""
+    return (a ^ b).bit_count()
+
+
+def _chunks(image_hash: int) -> List[int]:
+    return [(image_hash >> (CHUNK_BITS * i)) & _CHUNK_MASK for i in range(CHUNKS)]
+
+
+def _neighbours(value: int, radius: int) -> List[int]:
+    """Return every chunk value within ``radius`` bits of ``value``."""
+    values = [value]
+    for distance in range(1, radius + 1):
+        for positions in itertools.combinations(range(CHUNK_BITS), distance):
+            flipped = value
+            for position in positions:
+                flipped ^= 1 << position
+            values.append(flipped)
+    return values
+
+
+def _to_sqlite(image_hash: int) -> int:
+    # SQLite integers are signed 64-bit
+    return image_hash - (1 << HASH_BITS) if image_hash >= 1 << 63 else image_hash
+
+
+def _from_sqlite(value: int) -> int:
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+class DedupIndex:
+    """SQLite index of answered images, searchable by Hamming distance.
+
+    Uses multi-index hashing: each 64-bit hash is split into four 16-bit
+    chunks stored in indexed columns. Two hashes within distance ``d`` have
+    at least one chunk within ``d // 4`` bits of each other, so a lookup only
+    reads rows whose chunks match one of a few dozen values and compares the
+    full hashes of those. Lookups stay in the low milliseconds with hundreds
+    of thousands of stored images, and nothing is loaded into memory.
+    """
+
+    def __init__(self, db_path: Union[str, Path], max_distance: int = 6) -> None:
+        """Initialize the index.
+
+        Args:
+            db_path: SQLite database file (created if missing)
+            max_distance: Largest Hamming distance treated as the same image
+        """
+        self.db_path = Path(db_path)
+        self.max_distance = max_distance
+        self.lookups = 0
+        self.reused = 0
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        chunk_columns = ", ".join(f"c{i} INTEGER NOT NULL" for i in range(CHUNKS))
+        self._conn.execute(f"""CREATE TABLE IF NOT EXISTS images (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                hash INTEGER NOT NULL,
+                {chunk_columns},
+                image TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+        for i in range(CHUNKS):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_c{i} ON images (c{i})")
+        self._conn.commit()
+
+    def lookup(self, image_hash: int, kind: str) -> Optional[DedupMatch]:
+        """Find the closest stored answer within ``max_distance`` of a hash.
+
+        Args:
+            image_hash: Perceptual hash of the new image
+            kind: Which kind of answer to look for, e.g. 'explain'
+
+        Returns:
+            The closest match (most recent on ties), or None
+        """
+        radius = self.max_distance // CHUNKS
+        best: Optional[tuple] = None
+        with self._lock:
+            self.lookups += 1
+            seen = set()
+            for i, chunk in enumerate(_chunks(image_hash)):
+                values = _neighbours(chunk, radius)
+                placeholders = ", ".join("?" * len(values))
+                rows = self._conn.execute(
+                    f"SELECT id, hash, image, digest, created_at FROM images "
+                    f"WHERE c{i} IN ({placeholders}) AND kind = ?",
+                    (*values, kind),
+                ).fetchall()
+                for row_id, stored, image, digest, created_at in rows:
+                    if row_id in seen:
+                        continue
+                    seen.add(row_id)
+                    distance = hamming(image_hash, _from_sqlite(stored))
+                    if distance > self.max_distance:
+                        continue
+                    candidate = (distance, -created_at, row_id, image, digest)
+                    if best is None or candidate < best:
+                        best = candidate
+            if best is None:
+                return None
+            distance, negative_time, row_id, image, digest = best
+            response = self._conn.execute(
+                "SELECT response FROM images WHERE id = ?", (row_id,)
+            ).fetchone()[0]
+            self.reused += 1
+        return {
+            "image": image,
+            "digest": digest,
+            "distance": distance,
+            "answered_at": -negative_time,
+            "response": json.loads(response),
+        }
+
+    def add(
+        self,
+        image_hash: int,
+        kind: str,
+        image_path: Union[str, Path],
+        response: Dict[str, Any],
+    ) -> None:
+        """Store the answer for an image.
+
+        Args:
+            image_hash: Perceptual hash of the image
+            kind: Which kind of answer this is, e.g. 'explain'
+            image_path: The image, recorded as the answer's provenance
+            response: The API response, as JSON-compatible data
+        """
+        digest = ImageCache.file_digest(Path(image_path))
+        chunk_names = ", ".join(f"c{i}" for i in range(CHUNKS))
+        placeholders = ", ".join("?" * (CHUNKS + 6))
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO images (kind, hash, {chunk_names}, image, digest, "
+                f"response, created_at) VALUES ({placeholders})",
+                (
+                    kind,
+                    _to_sqlite(image_hash),
+                    *_chunks(image_hash),
+                    str(Path(image_path).resolve()),
+                    digest,
+                    json.dumps(response),
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+
+    def stats(self) -> DedupStats:
+        """Return the number of stored images and lookup counters."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+            return {"entries": entries, "lookups": self.lookups, "reused": self.reused}
+
+    def clear(self) -> None:
+        """Delete every stored image."""
+        with self._lock:
+            self._conn.execute("DELETE FROM images")
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,136 @@
+"""Splitting of large practice requests into parallel sub-requests.
+
+A request for many practice problems is planned as several slices, each
+generated by its own request with a difficulty target, so the slices run in
+parallel and the problems range from easier to harder. ``ProblemMerger``
+merges the slices as they complete, drops problems generated twice and
+numbers the rest in the order they arrived.
+"""
+
+import re
+import threading
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Literal,
+    Tuple,
+    TypeVar,
+)
+from .packing import HEADER_PATTERN, PACK_HEADER
+
+T = TypeVar("T")
+Difficulty = Literal["easier", "similar", "harder"]
+DIFFICULTIES: Tuple[Difficulty, ...] = ("easier", "similar", "harder")
+
+# A line on its own introducing the solution, e.g. '2. Complete solution'
+_SOLUTION_HEADING = re.compile(
+    r"^[\s#*_>\d.)]*(?:complete\s+|worked\s+)?solution\b[\s:*_]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def plan_slices(num_problems: int, slice_size: int) -> List[Tuple[int, Difficulty]]:
+    """Split a request into slices of at most ``slice_size`` problems.
+
+    Slices are as even as possible and their difficulty targets go from
+    easier to harder across the request.
+
+    Returns:
+        (number of problems, difficulty) for each slice
+    """
+    if num_problems < 1:
+        return []
+    count = -(-num_problems // max(1, slice_size))
+    base, extra = divmod(num_problems, count)
+    slices: List[Tuple[int, Difficulty]] = []
+    for i in range(count):
+        if count == 1:
+            difficulty: Difficulty = "similar"
+        else:
+            difficulty = DIFFICULTIES[round(i * (len(DIFFICULTIES) - 1) / (count - 1))]
+        slices.append((base + (1 if i < extra else 0), difficulty))
+    return slices
+
+
+def split_problems(text: str) -> List[str]:
+    """Split practice problems text into one entry per problem.
+
+    Problems are expected to start with a ``PACK_HEADER`` line; text with no
+    headers is returned as a single problem.
+    """
+    headers = list(HEADER_PATTERN.finditer(text))
+    if not headers:
+        text = text.strip()
+        return [text] if text else []
+    problems = []
+    for position, match in enumerate(headers):
+        end = headers[position + 1].start() if position + 1 < len(headers) else None
+        problem = text[match.end() : end].strip()
+        if problem:
+            problems.append(problem)
+    return problems
+
+
+def join_problems(problems: Iterable[str]) -> str:
+    """Join problems back into one text, numbered from 1."""
+    return "\n\n".join(
+        f"{PACK_HEADER.format(number)}\n{problem}"
+        for number, problem in enumerate(problems, 1)
+    )
+
+
+def problem_key(problem: str) -> str:
+    """Normalise a problem's statement so copies of it compare equal.
+
+    Only the text before the solution heading is used, ignoring case,
+    whitespace and Markdown emphasis.
+    """
+    statement = _SOLUTION_HEADING.split(problem, 1)[0]
+    return re.sub(r"[\s*_#`$]+", "", statement.lower())
+
+
+def statement_key(problem: Dict[str, Any]) -> str:
+    """``problem_key`` for a structured ``PracticeProblem``."""
+    return problem_key(problem.get("statement", ""))
+
+
+class ProblemMerger(Generic[T]):
+    """Merges problems from sub-requests, numbering them in arrival order.
+
+    Thread-safe, so sub-requests can add their problems as they complete.
+    """
+
+    def __init__(self, key: Callable[[T], str]) -> None:
+        """Initialize the merger.
+
+        Args:
+            key: Returns the text problems are compared by; problems with
+                an empty key are never treated as duplicates
+        """
+        self.key = key
+        self.problems: List[T] = []
+        self.duplicates = 0
+        self._seen: set = set()
+        self._lock = threading.Lock()
+
+    def add(self, problems: Iterable[T]) -> List[Tuple[int, T]]:
+        """Add a slice's problems, skipping ones that were already added.
+
+        Returns:
+            (number, problem) for each problem that was added
+        """
+        added = []
+        with self._lock:
+            for problem in problems:
+                key = self.key(problem)
+                if key and key in self._seen:
+                    self.duplicates += 1
+                    continue
+                self._seen.add(key)
+                self.problems.append(problem)
+                added.append((len(self.problems), problem))
+        return added
@@ -1,12 +1,21 @@
-"""Formatting utilities for Math Assistant responses."""
+"""Formatting utilities for Math Assistant responses.
 
-from typing import Union, Dict, List, Any, Optional, ClassVar
-from rich.console import Console
-from rich.panel import Panel
-from rich.markdown import Markdown
-from rich.theme import Theme
+``rich`` is imported only by the methods that draw with it, so the plain
+text paths (``clean_text``, ``format_steps``, ``to_markdown``) stay cheap to
+import.
+"""
+
+from typing import TYPE_CHECKING, Union, Dict, List, Any, Optional, ClassVar
 import re
+import time
 from datetime import datetime
+from .history import content_text
+from .metrics import timed
+
+if TYPE_CHECKING:
+    from rich.console import Console
+    from rich.live import Live
+    from rich.panel import Panel
 
 ResponseType = Union[str, Dict[str, Any], List[Any]]
 
@@ -19,6 +28,9 @@ class ResponseFormatter:
 
     def __init__(self) -> None:
         """Initialize formatter with custom theme."""
+        from rich.console import Console
+        from rich.theme import Theme
+
         self.theme: Theme = Theme(
             {
                 "info": "cyan",
@@ -28,9 +40,10 @@ class ResponseFormatter:
                 "header": "blue bold",
             }
         )
-        self.console: Console = Console(theme=self.theme)
+        self.console: "Console" = Console(theme=self.theme)
 
     @staticmethod
+    @timed("format.clean_text")
     def clean_text(response: ResponseType) -> str:
         """Extract and clean text from response."""
         if isinstance(response, str):
@@ -43,11 +56,14 @@ class ResponseFormatter:
                     text = response
             else:
                 text = response
+            text = text.replace("\\n", "\n")
+        elif isinstance(response, list):
+            # Message content: join the text blocks rather than using their repr
+            text = content_text(response)
         else:
-            text = str(response)
+            text = str(response).replace("\\n", "\n")
 
         # Clean up the text
-        text = text.replace("\\n", "\n")
         text = re.sub(r"\n\s+", "\n", text)  # Remove excess whitespace
 
         # Remove TextBlock wrapper if present
@@ -100,7 +116,22 @@ class ResponseFormatter:
 
         return text.strip()
 
+    @staticmethod
+    def _panel(text: str, title: str, style: str) -> "Panel":
+        """Wrap markdown text in a styled panel."""
+        from rich.markdown import Markdown
+        from rich.panel import Panel
+
+        return Panel(
+            Markdown(text),
+            title=title,
+            border_style=style,
+            padding=(1, 2),
+            title_align="left",
+        )
+
     @classmethod
+    @timed("format.rich")
     def rich_print(
         cls,
         response: ResponseType,
@@ -108,23 +139,16 @@ class ResponseFormatter:
         style: str = "blue",
     ) -> None:
         """Print response using rich formatting with colors and boxes."""
+        from rich.console import Console
+
         console: Console = Console()
 
         # Clean and format the text
         text = cls.clean_text(response)
         text = cls.format_steps(text)
 
-        # Convert to markdown
-        md: Markdown = Markdown(text)
-
         # Create panel with proper styling
-        panel: Panel = Panel(
-            md,
-            title=title,
-            border_style=style,
-            padding=(1, 2),
-            title_align="left",
-        )
+        panel = cls._panel(text, title, style)
 
         # Print with proper spacing
         console.print()
@@ -132,6 +156,14 @@ class ResponseFormatter:
         console.print()
 
     @classmethod
+    def live_panel(
+        cls, title: str = "Math Assistant Response", style: str = "blue"
+    ) -> "LivePanel":
+        """Create a panel that renders streamed text as it arrives."""
+        return LivePanel(title=title, style=style)
+
+    @classmethod
+    @timed("format.pretty")
     def pretty_print(cls, response: ResponseType, show_sections: bool = True) -> None:
         """Format and print response with sections and formatting."""
         text: str = cls.clean_text(response)
@@ -145,6 +177,7 @@ class ResponseFormatter:
         print(formatted_text)
 
     @classmethod
+    @timed("format.markdown")
     def to_markdown(
         cls, response: ResponseType, include_frontmatter: bool = False
     ) -> str:
@@ -178,3 +211,61 @@ date: {datetime.now().strftime('%Y-%m-%d')}
     def print_warning(self, message: str) -> None:
         """Print warning message in yellow."""
         self.console.print(f"[warning]Warning: {message}[/warning]")
+
+
+class LivePanel:
+    """Incrementally renders streamed text in a rich panel.
+
+    Use as a context manager and pass ``append`` as the text callback.
+    Redraws are throttled; the final text gets the same step formatting
+    as ``ResponseFormatter.rich_print`` when the context exits.
+    """
+
+    MIN_REDRAW_INTERVAL: ClassVar[float] = 0.05
+
+    def __init__(
+        self, title: str = "Math Assistant Response", style: str = "blue"
+    ) -> None:
+        from rich.console import Console
+
+        self.title = title
+        self.style = style
+        self.text = ""
+        self.console: "Console" = Console()
+        self._live: Optional["Live"] = None
+        self._last_redraw = 0.0
+
+    def __enter__(self) -> "LivePanel":
+        from rich.live import Live
+
+        self.console.print()
+        self._live = Live(
+            ResponseFormatter._panel("", self.title, self.style),
+            console=self.console,
+            auto_refresh=False,
+            vertical_overflow="visible",
+        )
+        self._live.__enter__()
+        return self
+
+    def append(self, chunk: str) -> None:
+        """Add a chunk of streamed text and redraw if due."""
+        self.text += chunk
+        now = time.perf_counter()
+        if self._live and now - self._last_redraw >= self.MIN_REDRAW_INTERVAL:
+            self._live.update(
+                ResponseFormatter._panel(self.text, self.title, self.style),
+                refresh=True,
+            )
+            self._last_redraw = now
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self._live is None:
+            return
+        text = ResponseFormatter.format_steps(ResponseFormatter.clean_text(self.text))
+        self._live.update(
+            ResponseFormatter._panel(text, self.title, self.style), refresh=True
+        )
+        self._live.__exit__(*exc_info)
+        self._live = None
+        self.console.print()
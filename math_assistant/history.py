@@ -0,0 +1,67 @@
+"""Token accounting and compaction helpers for conversation history."""
+
+from typing import Any, Dict, List, Tuple
+
+# Rough characters-per-token ratio for English text and LaTeX-ish math
+CHARS_PER_TOKEN = 4
+# Fixed per-message overhead for role markers and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of our conversation so far:"
+SUMMARY_ACKNOWLEDGEMENT = "Understood. Let's continue from there."
+
+
+def content_text(content: Any) -> str:
+    """Extract plain text from message content (a string or a list of blocks)."""
+    if isinstance(content, str):
+        return content
+    parts: List[str] = []
+    for block in content or []:
+        if isinstance(block, dict):
+            if block.get("type") == "text":
+                parts.append(block.get("text", ""))
+        elif getattr(block, "type", None) == "text":
+            parts.append(block.text)
+    return "\n".join(parts)
+
+
+def estimate_tokens(content: Any) -> int:
+    """Estimate the token count of message content without an API call."""
+    return (len(content_text(content)) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def history_tokens(history: List[Dict[str, Any]]) -> int:
+    """Estimate the token count of a conversation history (text only)."""
+    return sum(
+        estimate_tokens(turn["content"]) + MESSAGE_OVERHEAD_TOKENS for turn in history
+    )
+
+
+def split_history(
+    history: List[Dict[str, Any]], keep_turns: int
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split history into older messages and the most recent turns.
+
+    A turn is a user message plus the assistant reply. The recent part
+    always starts with a user message so the compacted history keeps
+    alternating roles.
+    """
+    start = max(0, len(history) - 2 * keep_turns)
+    while start < len(history) and history[start]["role"] != "user":
+        start += 1
+    return history[:start], history[start:]
+
+
+def transcript(history: List[Dict[str, Any]]) -> str:
+    """Render history as a plain-text transcript for summarization."""
+    return "\n\n".join(
+        f"{turn['role'].upper()}: {content_text(turn['content'])}" for turn in history
+    )
+
+
+def summary_turns(summary: str) -> List[Dict[str, Any]]:
+    """Build the user/assistant pair that replaces compacted history."""
+    return [
+        {"role": "user", "content": f"{SUMMARY_PREFIX}\n{summary}"},
+        {"role": "assistant", "content": SUMMARY_ACKNOWLEDGEMENT},
+    ]
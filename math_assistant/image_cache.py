@@ -0,0 +1,247 @@
+"""Content-addressed cache for encoded images."""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, TypedDict, Union
+
+# Mirrors the aliases in image_processor; redefined here to avoid a cycle.
+EncodedImage = str
+ImageSize = Tuple[int, int]
+MediaType = str
+CachedImage = Tuple[EncodedImage, ImageSize, MediaType]
+
+
+class CacheStats(TypedDict):
+    """Type definition for cache statistics."""
+
+    hits: int
+    disk_hits: int
+    misses: int
+    entries: int
+    memory_bytes: int
+
+
+class ImageCache:
+    """Two-tier cache: an in-memory LRU backed by an on-disk store.
+
+    Entries are keyed by the SHA-256 of the file contents plus the
+    processing parameters, so editing or replacing a file never returns a
+    stale encoding.
+    """
+
+    CHUNK_SIZE: int = 1024 * 1024
+
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            cache_dir: Directory for the on-disk tier. Memory only if None.
+            max_memory_bytes: Size cap for the in-memory tier
+            max_disk_bytes: Size cap for the on-disk tier; the least recently
+                used files (by mtime) are deleted when a write exceeds it
+        """
+        self.cache_dir: Optional[Path] = Path(cache_dir) if cache_dir else None
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[str, CachedImage]" = OrderedDict()
+        self._memory_bytes = 0
+        # Bytes in the on-disk tier; None until the directory is first scanned.
+        # Other processes may share the directory, so pruning rescans it.
+        self._disk_bytes: Optional[int] = None
+        # (resolved path) -> (mtime_ns, size, digest), so unchanged files
+        # are not re-hashed on every lookup.
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def file_digest(cls, path: Path) -> str:
+        """Return the SHA-256 hex digest of a file's contents."""
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(cls.CHUNK_SIZE), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def digest(self, path: Path) -> str:
+        """Return the content digest of a file, re-hashing only when it changed."""
+        resolved = str(Path(path).resolve())
+        stat = os.stat(resolved)
+        with self._lock:
+            known = self._digests.get(resolved)
+            if known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+                return known[2]
+
+        digest = self.file_digest(Path(resolved))
+
+        with self._lock:
+            if known and known[2] != digest:
+                # The file changed; drop encodings of its previous contents.
+                self._evict_prefix(known[2])
+            self._digests[resolved] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    @staticmethod
+    def key(digest: str, *params: Union[str, int]) -> str:
+        """Build a cache key from a content digest and processing parameters."""
+        return "-".join([digest, *(str(param) for param in params)])
+
+    def get(self, key: str) -> Optional[CachedImage]:
+        """Look up an encoded image, checking memory first, then disk."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, entry)
+            return entry
+
+    def put(
+        self,
+        key: str,
+        encoded: EncodedImage,
+        size: ImageSize,
+        media_type: MediaType = "image/jpeg",
+    ) -> None:
+        """Store an encoded image in both tiers."""
+        entry: CachedImage = (encoded, (int(size[0]), int(size[1])), media_type)
+        with self._lock:
+            self._store(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self) -> CacheStats:
+        """Return hit/miss counters and current memory usage."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "memory_bytes": self._memory_bytes,
+            }
+
+    def clear(self, disk: bool = False) -> None:
+        """Empty the in-memory tier, and optionally the on-disk tier."""
+        with self._lock:
+            self._entries.clear()
+            self._digests.clear()
+            self._memory_bytes = 0
+        if disk and self.cache_dir and self.cache_dir.exists():
+            for entry_file in self.cache_dir.glob("*.json"):
+                entry_file.unlink(missing_ok=True)
+            with self._lock:
+                self._disk_bytes = 0
+
+    def _store(self, key: str, entry: CachedImage) -> None:
+        """Insert into the LRU and evict until under the byte cap."""
+        if key in self._entries:
+            self._memory_bytes -= len(self._entries.pop(key)[0])
+        entry_bytes = len(entry[0])
+        if entry_bytes > self.max_memory_bytes:
+            return
+        self._entries[key] = entry
+        self._memory_bytes += entry_bytes
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_bytes -= len(evicted[0])
+
+    def _evict_prefix(self, digest: str) -> None:
+        """Drop in-memory entries for a content digest."""
+        for key in [k for k in self._entries if k.startswith(digest)]:
+            self._memory_bytes -= len(self._entries.pop(key)[0])
+
+    def _disk_path(self, key: str) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[CachedImage]:
+        path = self._disk_path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # Keep recently used entries at the young end of the mtime order
+            os.utime(path)
+            return (
+                data["data"],
+                (int(data["size"][0]), int(data["size"][1])),
+                data.get("media_type", "image/jpeg"),
+            )
+        except (OSError, ValueError, KeyError, IndexError, TypeError):
+            # Treat unreadable or partial entries as misses.
+            return None
+
+    def _write_disk(self, key: str, entry: CachedImage) -> None:
+        path = self._disk_path(key)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"data": entry[0], "size": list(entry[1]), "media_type": entry[2]},
+                    f,
+                )
+            written = tmp.stat().st_size
+            replaced = path.stat().st_size if path.exists() else 0
+            os.replace(tmp, path)
+        except OSError:
+            # The disk tier is best effort; the memory tier still works.
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk()[1]
+            else:
+                self._disk_bytes += written - replaced
+            if self._disk_bytes > self.max_disk_bytes:
+                self._prune_disk()
+
+    def _scan_disk(self) -> Tuple[List[Tuple[float, int, Path]], int]:
+        """Return the on-disk entries as (mtime, size, path), and their total size."""
+        files = []
+        if self.cache_dir is not None:
+            for entry_file in self.cache_dir.glob("*.json"):
+                try:
+                    stat = entry_file.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry_file))
+        return files, sum(size for _, size, _ in files)
+
+    def _prune_disk(self) -> None:
+        """Delete the oldest on-disk entries until the tier fits its cap."""
+        files, total = self._scan_disk()
+        for _, size, entry_file in sorted(files, key=lambda item: item[0]):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                entry_file.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            total -= size
+        self._disk_bytes = total
@@ -1,12 +1,28 @@
 """Image processing utilities for Math Assistant."""
 
-from PIL import Image
+from PIL import Image, ImageOps
 import io
+import os
 import base64
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Union, Tuple, Optional, List, ClassVar, TypedDict, Literal
+from typing import (
+    Union,
+    Tuple,
+    Optional,
+    List,
+    ClassVar,
+    TypedDict,
+    Literal,
+    Iterable,
+    Iterator,
+    Dict,
+)
 from .exceptions import ImageProcessingError
 from .config import Config
+from .image_cache import ImageCache
+from .metrics import METRICS, timed
 
 # Type aliases
 ImagePath = Union[str, Path]
@@ -15,6 +31,37 @@ ImageMode = Literal["RGB", "RGBA"]
 EncodedImage = str
 
 
+class AdaptiveEncoding(TypedDict):
+    """Type definition for the result of budget-driven encoding."""
+
+    data: EncodedImage
+    media_type: str
+    size: ImageSize
+    bytes: int
+
+
+class EncodingReport(TypedDict):
+    """Type definition for comparing the standard and adaptive encoders."""
+
+    standard_bytes: int
+    standard_size: ImageSize
+    adaptive_bytes: int
+    adaptive_size: ImageSize
+    adaptive_media_type: str
+    saved_bytes: int
+    saved_percent: float
+
+
+class PreprocessedImage(TypedDict):
+    """Type definition for one result of bulk preprocessing."""
+
+    path: Path
+    data: Optional[EncodedImage]
+    media_type: Optional[str]
+    size: Optional[ImageSize]
+    error: Optional[str]
+
+
 class ImageInfo(TypedDict):
     """Type definition for image information dictionary."""
 
@@ -31,6 +78,38 @@ class ImageProcessor:
     # Class variables with explicit types
     VALID_MODES: ClassVar[List[ImageMode]] = ["RGB", "RGBA"]
     DEFAULT_QUALITY: ClassVar[int] = 95
+    # Images at least this many times the target size are shrunk with
+    # Image.reduce() before the LANCZOS pass; 3 is visually lossless
+    REDUCING_GAP: ClassVar[float] = 3.0
+    # Longest edge of the proxy used by estimate_file_size
+    PROXY_EDGE: ClassVar[int] = 512
+    MIN_ADAPTIVE_QUALITY: ClassVar[int] = 50
+    MIN_ADAPTIVE_EDGE: ClassVar[int] = 512
+    # Share of near-black/near-white pixels above which an image is line art
+    LINE_ART_THRESHOLD: ClassVar[float] = 0.9
+    # Rows (and columns + 1) of the thumbnail behind the perceptual hash
+    HASH_SIZE: ClassVar[int] = 8
+
+    # Shared encoded-image cache, created on first use
+    _cache: ClassVar[Optional[ImageCache]] = None
+
+    @classmethod
+    def get_cache(cls) -> Optional[ImageCache]:
+        """Return the shared image cache, or None if caching is disabled."""
+        if not Config.IMAGE_CACHE_ENABLED:
+            return None
+        if cls._cache is None:
+            cls._cache = ImageCache(
+                cache_dir=Config.CACHE_DIR / "images",
+                max_memory_bytes=Config.IMAGE_CACHE_MAX_BYTES,
+                max_disk_bytes=Config.IMAGE_CACHE_DISK_MAX_BYTES,
+            )
+        return cls._cache
+
+    @classmethod
+    def set_cache(cls, cache: Optional[ImageCache]) -> None:
+        """Replace the shared image cache (None resets to the default)."""
+        cls._cache = cache
 
     @staticmethod
     def validate_image(image_path: ImagePath) -> Path:
@@ -49,6 +128,7 @@ class ImageProcessor:
             raise ImageProcessingError(f"Error validating image: {str(e)}")
 
     @staticmethod
+    @timed("image.process")
     def process_image(
         image_path: ImagePath,
         max_size: Optional[int] = None,
@@ -63,24 +143,153 @@ class ImageProcessor:
             max_size = max_size or Config.MAX_IMAGE_SIZE
             quality = quality or ImageProcessor.DEFAULT_QUALITY
 
-            with Image.open(path) as img:
-                # Convert to RGB if necessary
-                if img.mode not in ImageProcessor.VALID_MODES:
-                    img = img.convert("RGB")
+            cache = ImageProcessor.get_cache()
+            key: Optional[str] = None
+            if cache is not None:
+                key = ImageProcessor._standard_key(cache, path, max_size, quality)
+                cached = cache.get(key)
+                if cached is not None:
+                    return cached[0], cached[1]
 
-                # Get original size
-                width: int
-                height: int
-                width, height = img.size
+            encoded, size = ImageProcessor._encode(path, max_size, quality)
 
-                # Resize if needed, maintaining aspect ratio
-                if width > max_size or height > max_size:
-                    ratio: float = min(max_size / width, max_size / height)
-                    new_size: ImageSize = (int(width * ratio), int(height * ratio))
-                    img = img.resize(new_size, Image.Resampling.LANCZOS)
+            if cache is not None and key is not None:
+                cache.put(key, encoded, size)
 
-                # Convert to JPEG format for consistency
-                buffer: io.BytesIO = io.BytesIO()
+            return encoded, size
+
+        except Exception as e:
+            raise ImageProcessingError(f"Error processing image {image_path}: {str(e)}")
+
+    @staticmethod
+    def _standard_key(
+        cache: ImageCache, path: Path, max_size: int, quality: int
+    ) -> str:
+        return cache.key(cache.digest(path), max_size, f"q{quality}")
+
+    @staticmethod
+    def _adaptive_key(
+        cache: ImageCache, path: Path, max_pixels: int, max_bytes: int
+    ) -> str:
+        return cache.key(cache.digest(path), "adaptive", max_pixels, max_bytes)
+
+    @staticmethod
+    def process_many(
+        image_paths: Iterable[ImagePath], workers: Optional[int] = None
+    ) -> Iterator[PreprocessedImage]:
+        """Encode many images on a process pool, yielding each as it completes.
+
+        Resizing and JPEG encoding hold the GIL, so threads cannot spread them
+        over cores. Results are stored in the shared cache, so a later
+        ``encode_for_api`` call for the same file in this process is a cache
+        hit. Cached images are yielded first without touching the pool.
+
+        Args:
+            image_paths: Images to encode with the configured encoder
+            workers: Worker processes (default: Config.PREPROCESS_WORKERS,
+                or one per CPU)
+        """
+        encoder = Config.IMAGE_ENCODER
+        options = {
+            "max_size": Config.MAX_IMAGE_SIZE,
+            "quality": ImageProcessor.DEFAULT_QUALITY,
+            "max_bytes": Config.ADAPTIVE_MAX_BYTES,
+            "max_pixels": Config.ADAPTIVE_MAX_PIXELS,
+        }
+        cache = ImageProcessor.get_cache()
+
+        pending: Dict[Path, Optional[str]] = {}
+        for image_path in image_paths:
+            try:
+                path = ImageProcessor.validate_image(image_path)
+                key: Optional[str] = None
+                if cache is not None:
+                    if encoder == "adaptive":
+                        key = ImageProcessor._adaptive_key(
+                            cache, path, options["max_pixels"], options["max_bytes"]
+                        )
+                    else:
+                        key = ImageProcessor._standard_key(
+                            cache, path, options["max_size"], options["quality"]
+                        )
+                    cached = cache.get(key)
+                    if cached is not None:
+                        yield {
+                            "path": path,
+                            "data": cached[0],
+                            "size": cached[1],
+                            "media_type": cached[2],
+                            "error": None,
+                        }
+                        continue
+                pending[path] = key
+            except Exception as e:
+                yield {
+                    "path": Path(image_path),
+                    "data": None,
+                    "size": None,
+                    "media_type": None,
+                    "error": str(e),
+                }
+
+        if not pending:
+            return
+
+        max_workers = workers or Config.PREPROCESS_WORKERS or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+            futures = {
+                pool.submit(_encode_worker, str(path), encoder, **options): path
+                for path in pending
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    data, size, media_type = future.result()
+                except Exception as e:
+                    yield {
+                        "path": path,
+                        "data": None,
+                        "size": None,
+                        "media_type": None,
+                        "error": f"Error processing image {path}: {str(e)}",
+                    }
+                    continue
+
+                key = pending[path]
+                if cache is not None and key is not None:
+                    cache.put(key, data, size, media_type)
+                yield {
+                    "path": path,
+                    "data": data,
+                    "size": size,
+                    "media_type": media_type,
+                    "error": None,
+                }
+
+    @staticmethod
+    def _encode(
+        path: Path, max_size: int, quality: int
+    ) -> Tuple[EncodedImage, ImageSize]:
+        """Resize and JPEG/base64-encode an image, bypassing the cache."""
+        with Image.open(path) as img:
+            # Target size, maintaining aspect ratio
+            new_size: ImageSize = ImageProcessor._fit_size(img.size, max_size)
+
+            # Decode at reduced resolution where the format allows it
+            with METRICS.span("image.decode"):
+                img = ImageProcessor._load_reduced(img, new_size)
+
+            with METRICS.span("image.resize"):
+                # JPEG has no alpha channel
+                img = ImageProcessor._flatten(img)
+
+                # Resize if needed
+                if img.size != new_size:
+                    img = ImageProcessor._resize(img, new_size)
+
+            # Convert to JPEG format for consistency
+            buffer: io.BytesIO = io.BytesIO()
+            with METRICS.span("image.jpeg_encode"):
                 img.save(
                     buffer,
                     format="JPEG",
@@ -88,33 +297,304 @@ class ImageProcessor:
                     optimize=True,
                 )
 
-                # Encode to base64
+            # Encode to base64
+            with METRICS.span("image.base64"):
                 encoded: EncodedImage = base64.b64encode(buffer.getvalue()).decode(
                     "utf-8"
                 )
 
-                return encoded, img.size
+            return encoded, img.size
+
+    @staticmethod
+    def encode_for_api(image_path: ImagePath) -> Tuple[EncodedImage, str]:
+        """Encode an image with the configured encoder.
+
+        Returns:
+            Base64 data and its media type
+        """
+        if Config.IMAGE_ENCODER == "adaptive":
+            result = ImageProcessor.process_image_adaptive(image_path)
+            return result["data"], result["media_type"]
+        encoded, _ = ImageProcessor.process_image(image_path)
+        return encoded, "image/jpeg"
+
+    @staticmethod
+    @timed("image.process")
+    def process_image_adaptive(
+        image_path: ImagePath,
+        max_bytes: Optional[int] = None,
+        max_pixels: Optional[int] = None,
+    ) -> AdaptiveEncoding:
+        """Encode an image as small as possible within a byte and pixel budget.
+
+        The image is downscaled to the model's effective resolution, then JPEG
+        quality is binary-searched to fit ``max_bytes``. Line-art scans are
+        also tried as palette PNG, and the smaller result that fits wins.
+        """
+        try:
+            path: Path = ImageProcessor.validate_image(image_path)
+            max_bytes = max_bytes or Config.ADAPTIVE_MAX_BYTES
+            max_pixels = max_pixels or Config.ADAPTIVE_MAX_PIXELS
+
+            cache = ImageProcessor.get_cache()
+            key: Optional[str] = None
+            if cache is not None:
+                key = ImageProcessor._adaptive_key(cache, path, max_pixels, max_bytes)
+                cached = cache.get(key)
+                if cached is not None:
+                    return {
+                        "data": cached[0],
+                        "size": cached[1],
+                        "media_type": cached[2],
+                        "bytes": len(base64.b64decode(cached[0])),
+                    }
+
+            data, media_type, size = ImageProcessor._encode_adaptive(
+                path, max_bytes, max_pixels
+            )
+            with METRICS.span("image.base64"):
+                encoded: EncodedImage = base64.b64encode(data).decode("utf-8")
+
+            if cache is not None and key is not None:
+                cache.put(key, encoded, size, media_type)
+
+            return {
+                "data": encoded,
+                "media_type": media_type,
+                "size": size,
+                "bytes": len(data),
+            }
 
         except Exception as e:
             raise ImageProcessingError(f"Error processing image {image_path}: {str(e)}")
 
+    @staticmethod
+    def _encode_adaptive(
+        path: Path, max_bytes: int, max_pixels: int
+    ) -> Tuple[bytes, str, ImageSize]:
+        """Find the smallest encoding within budget, bypassing the cache."""
+        with Image.open(path) as img:
+            # Downscale to what the model actually looks at
+            width, height = img.size
+            scale = min(
+                1.0,
+                Config.ADAPTIVE_MAX_EDGE / max(width, height),
+                math.sqrt(max_pixels / (width * height)),
+            )
+            new_size: ImageSize = (
+                max(1, int(width * scale)),
+                max(1, int(height * scale)),
+            )
+            with METRICS.span("image.decode"):
+                img = ImageProcessor._load_reduced(img, new_size)
+            with METRICS.span("image.resize"):
+                img = ImageProcessor._flatten(img)
+                if img.size != new_size:
+                    img = ImageProcessor._resize(img, new_size)
+
+            line_art = ImageProcessor._is_line_art(img)
+            while True:
+                candidates: List[Tuple[bytes, str]] = []
+
+                with METRICS.span("image.jpeg_encode"):
+                    jpeg = ImageProcessor._fit_jpeg_quality(img, max_bytes)
+                if jpeg is not None:
+                    candidates.append((jpeg, "image/jpeg"))
+
+                if line_art:
+                    with METRICS.span("image.png_encode"):
+                        png = ImageProcessor._encode_png(img)
+                    if len(png) <= max_bytes:
+                        candidates.append((png, "image/png"))
+
+                if candidates:
+                    data, media_type = min(candidates, key=lambda c: len(c[0]))
+                    return data, media_type, img.size
+
+                if max(img.size) <= ImageProcessor.MIN_ADAPTIVE_EDGE:
+                    # Budget unreachable without hurting legibility
+                    data = ImageProcessor._encode_jpeg(
+                        img, ImageProcessor.MIN_ADAPTIVE_QUALITY
+                    )
+                    return data, "image/jpeg", img.size
+
+                img = ImageProcessor._resize(
+                    img,
+                    (max(1, int(img.width * 0.75)), max(1, int(img.height * 0.75))),
+                )
+
+    @staticmethod
+    def _fit_size(size: ImageSize, max_size: int) -> ImageSize:
+        """Scale a size down so neither side exceeds max_size."""
+        width, height = size
+        if width <= max_size and height <= max_size:
+            return size
+        ratio: float = min(max_size / width, max_size / height)
+        return (max(1, int(width * ratio)), max(1, int(height * ratio)))
+
+    @staticmethod
+    def _load_reduced(img: Image.Image, target: ImageSize) -> Image.Image:
+        """Decode an image at the smallest scale that still covers target.
+
+        For JPEG, ``draft`` makes libjpeg decode at 1/2, 1/4 or 1/8 scale, so
+        a 48 MP photo never exists in memory at full resolution. Other formats
+        are decoded normally; ``_resize`` then uses ``reduce`` before LANCZOS.
+        """
+        if img.format == "JPEG" and target != img.size:
+            img.draft(img.mode, target)
+        img.load()
+        return img
+
+    @staticmethod
+    def _resize(img: Image.Image, size: ImageSize) -> Image.Image:
+        """Resize with LANCZOS, shrinking by integer factors first when large."""
+        return img.resize(
+            size,
+            Image.Resampling.LANCZOS,
+            reducing_gap=ImageProcessor.REDUCING_GAP,
+        )
+
+    @staticmethod
+    def _flatten(img: Image.Image) -> Image.Image:
+        """Convert to RGB, compositing any transparency onto white."""
+        if img.mode in ("RGBA", "LA") or (
+            img.mode == "P" and "transparency" in img.info
+        ):
+            rgba = img.convert("RGBA")
+            background = Image.new("RGB", rgba.size, "white")
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            return background
+        if img.mode != "RGB":
+            return img.convert("RGB")
+        return img
+
+    @staticmethod
+    def _is_line_art(img: Image.Image) -> bool:
+        """Guess whether an image is a high-contrast scan of text or drawings."""
+        histogram = img.convert("L").histogram()
+        extremes = sum(histogram[:64]) + sum(histogram[192:])
+        return extremes / max(1, sum(histogram)) >= ImageProcessor.LINE_ART_THRESHOLD
+
+    @staticmethod
+    def _encode_jpeg(img: Image.Image, quality: int) -> bytes:
+        buffer: io.BytesIO = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _encode_png(img: Image.Image) -> bytes:
+        buffer: io.BytesIO = io.BytesIO()
+        img.convert("L").quantize(colors=16).save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _fit_jpeg_quality(img: Image.Image, max_bytes: int) -> Optional[bytes]:
+        """Binary-search the highest JPEG quality that fits in max_bytes."""
+        best = ImageProcessor._encode_jpeg(img, ImageProcessor.DEFAULT_QUALITY)
+        if len(best) <= max_bytes:
+            return best
+
+        low, high = (
+            ImageProcessor.MIN_ADAPTIVE_QUALITY,
+            ImageProcessor.DEFAULT_QUALITY - 1,
+        )
+        found: Optional[bytes] = None
+        while low <= high:
+            quality = (low + high) // 2
+            data = ImageProcessor._encode_jpeg(img, quality)
+            if len(data) <= max_bytes:
+                found = data
+                low = quality + 1
+            else:
+                high = quality - 1
+        return found
+
+    @staticmethod
+    def encoding_report(image_path: ImagePath) -> EncodingReport:
+        """Compare the standard encoder with the adaptive one for an image."""
+        try:
+            path: Path = ImageProcessor.validate_image(image_path)
+            standard, standard_size = ImageProcessor._encode(
+                path, Config.MAX_IMAGE_SIZE, ImageProcessor.DEFAULT_QUALITY
+            )
+            standard_bytes = len(base64.b64decode(standard))
+            adaptive = ImageProcessor.process_image_adaptive(path)
+            saved = standard_bytes - adaptive["bytes"]
+            return {
+                "standard_bytes": standard_bytes,
+                "standard_size": standard_size,
+                "adaptive_bytes": adaptive["bytes"],
+                "adaptive_size": adaptive["size"],
+                "adaptive_media_type": adaptive["media_type"],
+                "saved_bytes": saved,
+                "saved_percent": (
+                    100.0 * saved / standard_bytes if standard_bytes else 0
+                ),
+            }
+        except Exception as e:
+            raise ImageProcessingError(f"Error comparing encoders: {str(e)}")
+
     @staticmethod
     def estimate_file_size(image_path: ImagePath) -> int:
-        """Estimate file size after processing."""
+        """Estimate file size after processing.
+
+        Encodes a small proxy of the image and scales its bytes-per-pixel up
+        to the processed resolution, instead of encoding the full image.
+        """
         try:
             path: Path = ImageProcessor.validate_image(image_path)
             with Image.open(path) as img:
+                processed = ImageProcessor._fit_size(img.size, Config.MAX_IMAGE_SIZE)
+                proxy_size = ImageProcessor._fit_size(
+                    img.size, ImageProcessor.PROXY_EDGE
+                )
+                proxy = ImageProcessor._load_reduced(img, proxy_size)
+                proxy = ImageProcessor._flatten(proxy)
+                if proxy.size != proxy_size:
+                    proxy = ImageProcessor._resize(proxy, proxy_size)
+
                 buffer: io.BytesIO = io.BytesIO()
-                img.save(buffer, format="JPEG", quality=ImageProcessor.DEFAULT_QUALITY)
-                return len(buffer.getvalue())
+                proxy.save(
+                    buffer, format="JPEG", quality=ImageProcessor.DEFAULT_QUALITY
+                )
+                bytes_per_pixel = len(buffer.getvalue()) / (proxy.width * proxy.height)
+                return int(bytes_per_pixel * processed[0] * processed[1])
         except Exception as e:
             raise ImageProcessingError(f"Error estimating file size: {str(e)}")
 
+    @staticmethod
+    def perceptual_hash(image_path: ImagePath) -> int:
+        """Compute a 64-bit difference hash (dHash) of an image.
+
+        The image is shrunk to a 9x8 grayscale thumbnail with stretched
+        contrast, and each bit records whether a pixel is brighter than its
+        right-hand neighbour. Photos of the same page taken at slightly
+        different angles or in different light differ in only a few bits.
+        """
+        try:
+            path: Path = ImageProcessor.validate_image(image_path)
+            size = ImageProcessor.HASH_SIZE
+            with Image.open(path) as img:
+                img = ImageProcessor._load_reduced(img, (size * 8, size * 8))
+                gray = ImageOps.autocontrast(ImageProcessor._flatten(img).convert("L"))
+                thumbnail = gray.resize((size + 1, size), Image.Resampling.BOX)
+            pixels = thumbnail.tobytes()
+            bits = 0
+            for row in range(size):
+                for col in range(size):
+                    left = pixels[row * (size + 1) + col]
+                    right = pixels[row * (size + 1) + col + 1]
+                    bits = (bits << 1) | (left > right)
+            return bits
+        except Exception as e:
+            raise ImageProcessingError(f"Error hashing image: {str(e)}")
+
     @staticmethod
     def check_image(image_path: ImagePath) -> ImageInfo:
         """Check image properties and potential issues."""
         try:
             path: Path = ImageProcessor.validate_image(image_path)
+            # Image.open only parses the header; nothing below decodes pixels
             with Image.open(path) as img:
                 info: ImageInfo = {
                     "dimensions": img.size,
@@ -133,8 +613,30 @@ class ImageProcessor:
                     info["issues"].append(
                         f"Image will be converted to RGB (current mode: {img.mode})"
                     )
+                elif img.mode == "RGBA":
+                    info["issues"].append(
+                        "Transparent areas will be flattened onto white"
+                    )
 
                 return info
 
         except Exception as e:
             raise ImageProcessingError(f"Error checking image: {str(e)}")
+
+
+def _encode_worker(
+    path: str,
+    encoder: str,
+    max_size: int,
+    quality: int,
+    max_bytes: int,
+    max_pixels: int,
+) -> Tuple[EncodedImage, ImageSize, str]:
+    """Encode one image in a worker process (see ImageProcessor.process_many)."""
+    if encoder == "adaptive":
+        data, media_type, size = ImageProcessor._encode_adaptive(
+            Path(path), max_bytes, max_pixels
+        )
+        return base64.b64encode(data).decode("utf-8"), size, media_type
+    encoded, size = ImageProcessor._encode(Path(path), max_size, quality)
+    return encoded, size, "image/jpeg"
@@ -0,0 +1,179 @@
+"""Load-test driver: run assistant workloads concurrently and measure them.
+
+Each worker thread is one session with its own MathAssistant (and so its
+own connection pool and request scheduler), as separate CLI users would be.
+Workers repeat one workload until the operation count or the time limit is
+reached. Response caching, dedup and local checks are turned off so every
+operation reaches the server. Run it against ``mock_server`` to find the
+throughput a deployment can sustain without spending API credits.
+"""
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, TypedDict, Union
+from .metrics import QUANTILES, Histogram
+
+if TYPE_CHECKING:
+    from .math_assistant import MathAssistant
+
+WORKLOADS = ("explain", "stream", "conversation", "practice")
+
+
+class LoadTestReport(TypedDict):
+    """Type definition for the result of a load test."""
+
+    workload: str
+    concurrency: int
+    operations: int
+    errors: int
+    error_rate: float
+    errors_by_type: Dict[str, int]
+    seconds: float
+    throughput: float
+    latency: Dict[str, float]
+    api_requests: int
+    retries: int
+    rate_limited: int
+
+
+def _operation(
+    assistant: "MathAssistant", workload: str, image_path: Union[str, Path]
+) -> None:
+    """Run one unit of a workload."""
+    if workload == "explain":
+        assistant.explain_problem(image_path, format_output=False)
+    elif workload == "stream":
+        assistant._get_explanation(image_path, "", on_text=lambda chunk: None)
+    elif workload == "conversation":
+        assistant.start_conversation(str(image_path), format_style="basic")
+        assistant.continue_conversation("Why is that step valid?", format_style="basic")
+        assistant.continue_conversation("What if the 3 were a 5?", format_style="basic")
+    elif workload == "practice":
+        assistant.generate_similar_problems(image_path, format_output=False)
+    else:
+        raise ValueError(f"Unknown workload: {workload}")
+
+
+def run_load_test(
+    image_path: Union[str, Path],
+    workload: str = "explain",
+    concurrency: int = 4,
+    operations: Optional[int] = None,
+    duration: Optional[float] = None,
+    base_url: Optional[str] = None,
+    api_key: str = "mock-key",
+    create_assistant: Optional[Callable[[], "MathAssistant"]] = None,
+) -> LoadTestReport:
+    """Run a workload from concurrent sessions.
+
+    Args:
+        image_path: Problem image every operation uses
+        workload: One of WORKLOADS; 'conversation' is three turns
+        concurrency: Number of concurrent sessions
+        operations: Stop after this many operations in total
+        duration: Stop starting operations after this many seconds
+            (default: 10 operations per session when neither is given)
+        base_url: Server to send requests to, e.g. ``MockAPIServer.url``
+        api_key: API key sent with each request
+        create_assistant: Builds each session's assistant, overriding
+            ``base_url`` and ``api_key``
+
+    Returns:
+        Throughput, latency percentiles in seconds and error counts
+    """
+    from .math_assistant import MathAssistant
+
+    if workload not in WORKLOADS:
+        raise ValueError(f"Unknown workload: {workload}")
+    concurrency = max(1, concurrency)
+    if operations is None and duration is None:
+        operations = 10 * concurrency
+
+    def default_assistant() -> "MathAssistant":
+        return MathAssistant(
+            api_key=api_key,
+            base_url=base_url,
+            use_cache=False,
+            local_check=False,
+            dedup=False,
+        )
+
+    factory = create_assistant or default_assistant
+    latencies = Histogram(max_samples=1_000_000)
+    errors: Counter = Counter()
+    assistants: List["MathAssistant"] = []
+    lock = threading.Lock()
+    started = [0]
+    start = time.perf_counter()
+    deadline = None if duration is None else start + duration
+
+    def claim() -> bool:
+        with lock:
+            if operations is not None and started[0] >= operations:
+                return False
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+            started[0] += 1
+            return True
+
+    def session() -> None:
+        assistant = factory()
+        with lock:
+            assistants.append(assistant)
+        while claim():
+            began = time.perf_counter()
+            try:
+                _operation(assistant, workload, image_path)
+            except Exception as e:
+                with lock:
+                    errors[type(e).__name__] += 1
+                continue
+            with lock:
+                latencies.observe(time.perf_counter() - began)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(session) for _ in range(concurrency)]:
+            future.result()
+    seconds = time.perf_counter() - start
+
+    total = latencies.count + sum(errors.values())
+    scheduler_stats = [assistant.scheduler.stats() for assistant in assistants]
+    latency = {name: latencies.quantile(q) for name, q in QUANTILES.items()}
+    latency["mean"] = latencies.sum / latencies.count if latencies.count else 0.0
+    return {
+        "workload": workload,
+        "concurrency": concurrency,
+        "operations": total,
+        "errors": sum(errors.values()),
+        "error_rate": sum(errors.values()) / total if total else 0.0,
+        "errors_by_type": dict(errors),
+        "seconds": seconds,
+        "throughput": latencies.count / seconds if seconds > 0 else 0.0,
+        "latency": latency,
+        "api_requests": sum(stats["requests"] for stats in scheduler_stats),
+        "retries": sum(stats["retries"] for stats in scheduler_stats),
+        "rate_limited": sum(stats["rate_limited"] for stats in scheduler_stats),
+    }
+
+
+def format_report(report: LoadTestReport) -> str:
+    """Render a load-test report as plain text."""
+    latency = report["latency"]
+    lines = [
+        f"Workload: {report['workload']} x {report['concurrency']} sessions",
+        f"Operations: {report['operations']} in {report['seconds']:.1f}s "
+        f"({report['throughput']:.2f} successful/s)",
+        f"Latency: p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  "
+        f"p99 {latency['p99']:.3f}s  mean {latency['mean']:.3f}s",
+        f"Errors: {report['errors']} ({report['error_rate']:.1%})",
+    ]
+    for name, count in sorted(report["errors_by_type"].items()):
+        lines.append(f"  {name}: {count}")
+    lines.append(
+        f"API requests: {report['api_requests']} "
+        f"({report['retries']} retries, {report['rate_limited']} rate limited)"
+    )
+    return "\n".join(lines)
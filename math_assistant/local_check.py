@@ -0,0 +1,386 @@
+"""Local verification of a student's final answer against a reference answer.
+
+Reference answers are stored per problem image, keyed by the image contents.
+When one is known, the student's final answer is compared with it locally
+and only answers that cannot be decided go to the model. Symbolic comparison
+uses SymPy when it is installed (``pip install math-assistant-cli[cas]``);
+without it, plain numbers and fractions are still compared.
+"""
+
+import functools
+import re
+import sqlite3
+import threading
+import time
+from fractions import Fraction
+from pathlib import Path
+from typing import Any, List, Literal, Optional, Tuple, TypedDict, Union
+from .image_cache import ImageCache
+
+Verdict = Literal["match", "mismatch"]
+# A variable and its value; the variable is None for a bare value
+Binding = Tuple[Optional[str], Any]
+
+# Numeric answers closer than this (relative) are equal
+EXACT_TOLERANCE = 1e-9
+# Decimal answers this close may be rounded versions of the reference
+ROUNDING_TOLERANCE = 1e-2
+
+# Bounds on numbers in an answer; larger ones ('9^9^9', '1e999999999') would
+# take unbounded time to evaluate, so such answers are left to the model
+MAX_EXPONENT = 100
+MAX_DIGITS = 1000
+
+# Words allowed in an answer; anything else is prose and is left to the model
+FUNCTION_NAMES = {"sqrt", "pi", "sin", "cos", "tan", "log", "ln", "exp", "abs"}
+
+_ANSWER_PREFIX = re.compile(
+    r"^(?:final answer|answer|therefore|thus|so|hence)\b\s*[:,]?\s*", re.IGNORECASE
+)
+_BOXED = re.compile(r"\\boxed\{(.*)\}")
+# A last line that states a value: 'x = 4', 'x = 2 or x = -2', 'y_1 = 3/4'
+_BINDING_LINE = re.compile(r"^\$*\s*[A-Za-z]\w*\s*=(?!=)")
+# Inequalities and 'not equal' are not values; they go to the model
+_RELATIONS = re.compile(r"[<>≤≥≠]|!=")
+# Thousands separators: '1,000' is one number, '2, -2' is two
+_DIGIT_GROUP = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+_ALTERNATIVES = re.compile(r"\s+or\s+|\s+and\s+|[,;]")
+_VARIABLE = re.compile(r"^[A-Za-z]\w*$")
+_LITERAL = re.compile(r"(\d+)(?:\.(\d*))?(?:[eE][+-]?(\d+))?")
+_REPLACEMENTS = {"−": "-", "×": "*", "·": "*", "÷": "/", "√": "sqrt", "π": "pi"}
+
+
+class LocalCheckStats(TypedDict):
+    """Type definition for local answer-check statistics."""
+
+    checks: int
+    resolved_locally: int
+    matches: int
+    mismatches: int
+    local_fraction: float
+
+
+class ReferenceAnswers:
+    """SQLite store of reference answers keyed by problem image contents."""
+
+    def __init__(self, db_path: Union[str, Path]) -> None:
+        """Initialize the store.
+
+        Args:
+            db_path: SQLite database file (created if missing)
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS answers (
+                digest TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                source TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+        self._conn.commit()
+
+    def get(self, image_path: Union[str, Path]) -> Optional[str]:
+        """Return the reference answer for a problem image, if known."""
+        digest = ImageCache.file_digest(Path(image_path))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM answers WHERE digest = ?", (digest,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(
+        self, image_path: Union[str, Path], answer: str, source: str = "user"
+    ) -> None:
+        """Store the reference answer for a problem image.
+
+        Answers entered by a user are never replaced by ones taken from a
+        model explanation.
+
+        Args:
+            image_path: Problem image
+            answer: Final answer, e.g. ``x = 4`` or ``3/4``
+            source: Where the answer came from ('user' or 'explanation')
+        """
+        digest = ImageCache.file_digest(Path(image_path))
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO answers (digest, answer, source, created_at)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT (digest) DO UPDATE SET
+                       answer = excluded.answer,
+                       source = excluded.source,
+                       created_at = excluded.created_at
+                   WHERE answers.source != 'user' OR excluded.source = 'user'""",
+                (digest, answer, source, time.time()),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _sympy() -> Any:
+    """Import SymPy on first use; None if it is not installed."""
+    try:
+        import sympy
+        from sympy.parsing import sympy_parser
+    except ImportError:
+        return None
+    return sympy, sympy_parser
+
+
+def final_answer(text: str) -> Optional[str]:
+    """Return the final answer of a worked solution, from its last line.
+
+    The last non-empty line counts only if it reads as an answer: it starts
+    with 'Answer:', 'Therefore' and the like, has a ``\\boxed{}`` value or
+    binds a variable ('x = 4'). A line of working such as ``2(4) + 3 = 11``
+    gives None.
+    """
+    lines = [line.strip() for line in text.strip().splitlines() if line.strip()]
+    if not lines:
+        return None
+    line = lines[-1]
+    boxed = _BOXED.search(line)
+    prefix = _ANSWER_PREFIX.match(line)
+    if boxed:
+        answer = boxed.group(1)
+    elif prefix:
+        answer = line[prefix.end() :]
+    elif _BINDING_LINE.match(line):
+        answer = line
+    else:
+        return None
+    answer = answer.strip().rstrip(".").strip("$ ")
+    return answer or None
+
+
+def _parse_value(text: str) -> Any:
+    """Parse one value, or return None if it is not a plain expression."""
+    text = re.sub(r"√(\d+|[A-Za-z])", r"sqrt(\1)", text)
+    for old, new in _REPLACEMENTS.items():
+        text = text.replace(old, new)
+    text = text.strip()
+    if not text:
+        return None
+    words = set(re.findall(r"[A-Za-z]{2,}", text))
+    if words - FUNCTION_NAMES:
+        return None
+    if not _literals_are_small(text):
+        return None
+
+    cas = _sympy()
+    if cas is None:
+        try:
+            return Fraction(text.replace(" ", ""))
+        except (ValueError, ZeroDivisionError):
+            return None
+
+    sympy, parser = cas
+    transformations = parser.standard_transformations + (
+        parser.implicit_multiplication_application,
+        parser.convert_xor,
+    )
+    try:
+        # Unevaluated, so powers are bounded before anything computes them
+        value = parser.parse_expr(
+            text,
+            transformations=transformations,
+            local_dict={"ln": sympy.log},
+            evaluate=False,
+        )
+        return value if _powers_are_small(value) else None
+    except Exception:
+        # SymPy raises many exception types for malformed input
+        return None
+
+
+def _literals_are_small(text: str) -> bool:
+    """Whether every number literal in an answer is within the size bounds."""
+    for whole, fraction, exponent in _LITERAL.findall(text):
+        if len(whole) + len(fraction) > MAX_DIGITS:
+            return False
+        if exponent and int(exponent[:4]) > MAX_EXPONENT:
+            return False
+    return True
+
+
+def _powers_are_small(value: Any) -> bool:
+    """Whether a parsed value's powers can be evaluated in bounded time.
+
+    Constant exponents may not exceed MAX_EXPONENT and constant powers may
+    not exceed MAX_DIGITS digits. Inner powers are checked first, so the
+    numeric estimates never evaluate a power tower.
+    """
+    sympy, _ = _sympy()
+    for node in sympy.postorder_traversal(value):
+        if not isinstance(node, sympy.Pow):
+            continue
+        if not node.exp.free_symbols:
+            if abs(complex(node.exp.evalf())) > MAX_EXPONENT:
+                return False
+        if not node.free_symbols:
+            if abs(node.evalf(3)) > 10**MAX_DIGITS:
+                return False
+    return True
+
+
+def parse_answer(text: str) -> Optional[List[Binding]]:
+    """Parse an answer into its values ('x = 2 or x = -2' gives two).
+
+    Returns:
+        (variable or None, value) pairs, or None if any part is not a plain
+        expression or a plain variable binding, or the answer is a relation
+        other than equality
+    """
+    if _RELATIONS.search(text):
+        return None
+    values: List[Binding] = []
+    for part in _ALTERNATIVES.split(_DIGIT_GROUP.sub("", text)):
+        if not part.strip():
+            continue
+        name: Optional[str] = None
+        if "=" in part:
+            sides = part.split("=")
+            if len(sides) != 2 or not _VARIABLE.match(sides[0].strip()):
+                # '2(4) + 3 = 11' or 'x = y = 4': not an answer
+                return None
+            name, part = sides[0].strip(), sides[1]
+        value = _parse_value(part)
+        if value is None:
+            return None
+        values.append((name, value))
+    return values or None
+
+
+def _compare_values(a: Any, b: Any) -> Optional[bool]:
+    """Compare two parsed values; None when equality cannot be decided."""
+    if isinstance(a, Fraction) and isinstance(b, Fraction):
+        return a == b
+
+    sympy, _ = _sympy()
+    try:
+        difference = sympy.simplify(sympy.sympify(a) - sympy.sympify(b))
+    except Exception:
+        return None
+    if difference == 0:
+        return True
+    if difference.free_symbols:
+        # Different-looking expressions in a variable: leave it to the model
+        return None
+    try:
+        gap = abs(complex(difference))
+        scale = max(1.0, abs(complex(sympy.sympify(b))))
+    except (TypeError, ValueError):
+        return None
+    if gap <= EXACT_TOLERANCE * scale:
+        return True
+    has_decimals = any(
+        isinstance(value, sympy.Basic) and value.has(sympy.Float) for value in (a, b)
+    )
+    if has_decimals and gap <= ROUNDING_TOLERANCE * scale:
+        return None
+    return False
+
+
+def compare_answers(student: str, reference: str) -> Optional[Verdict]:
+    """Compare a student's final answer with a reference answer.
+
+    Returns:
+        'match' or 'mismatch' when the answers can be compared with
+        certainty, otherwise None
+    """
+    student_values = parse_answer(student)
+    reference_values = parse_answer(reference)
+    if student_values is None or reference_values is None:
+        return None
+    student_names = {name for name, _ in student_values if name}
+    reference_names = {name for name, _ in reference_values if name}
+    if student_names and reference_names and student_names != reference_names:
+        # Different variables, e.g. 'y = 4' for 'x = 4': leave it to the model
+        return None
+
+    unmatched = list(reference_values)
+    for name, value in student_values:
+        # A value is compared with the reference value for the same variable
+        candidates = [
+            index
+            for index, (other, _) in enumerate(unmatched)
+            if name is None or other is None or name == other
+        ]
+        results = [_compare_values(value, unmatched[index][1]) for index in candidates]
+        if True in results:
+            unmatched.pop(candidates[results.index(True)])
+            continue
+        return None if None in results else "mismatch"
+    # Solutions left over are missing from the student's answer
+    return "mismatch" if unmatched else "match"
+
+
+class LocalChecker:
+    """Answers solution checks locally when the final answer is clear-cut."""
+
+    def __init__(self, answers: ReferenceAnswers) -> None:
+        """Initialize the checker.
+
+        Args:
+            answers: Store of reference answers
+        """
+        self.answers = answers
+        self.checks = 0
+        self.matches = 0
+        self.mismatches = 0
+        self._lock = threading.Lock()
+
+    def check(
+        self, image_path: Union[str, Path], student_solution: str
+    ) -> Optional[str]:
+        """Check a solution's final answer against the reference answer.
+
+        Returns:
+            Feedback for a clear match or mismatch, or None if the check has
+            to go to the model
+        """
+        with self._lock:
+            self.checks += 1
+        reference = self.answers.get(image_path)
+        student = final_answer(student_solution)
+        if reference is None or student is None:
+            return None
+
+        verdict = compare_answers(student, reference)
+        if verdict is None:
+            return None
+        with self._lock:
+            if verdict == "match":
+                self.matches += 1
+            else:
+                self.mismatches += 1
+
+        if verdict == "match":
+            return (
+                f"Correct. Your final answer, {student}, matches the expected "
+                f"answer ({reference})."
+            )
+        return (
+            f"Not quite. Your final answer, {student}, does not match the "
+            f"expected answer. Go back through your steps, or ask for "
+            f"step-by-step feedback to find the mistake."
+        )
+
+    def stats(self) -> LocalCheckStats:
+        """Return how many checks were answered without the model."""
+        with self._lock:
+            resolved = self.matches + self.mismatches
+            return {
+                "checks": self.checks,
+                "resolved_locally": resolved,
+                "matches": self.matches,
+                "mismatches": self.mismatches,
+                "local_fraction": resolved / self.checks if self.checks else 0.0,
+            }
@@ -1,169 +1,284 @@
 """Main Math Assistant implementation."""
 
 import anthropic
-from typing import Optional, Dict, List, Union, Any
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Dict, List, Union, Any, Callable, Mapping, Tuple
 from pathlib import Path
+from .assistant_base import BaseAssistant, TextCallback
 from .config import Config
-from .exceptions import APIError, ConfigurationError
+from .exceptions import APIError
+from .fanout import plan_slices
 from .image_processor import ImageProcessor
+from .metrics import METRICS, STAGE_SECONDS, timed
 from .formatters import ResponseFormatter
+from .history import content_text, split_history, transcript
+from .packing import chunked
+from .prompts import image_content, packed_explanation_request, summary_request
+from .response_cache import request_key
+from .singleflight import SingleFlight
 
 
-class MathAssistant:
+class MathAssistant(BaseAssistant):
     """A class to help with mathematics problems using Claude API."""
 
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the Math Assistant.
+    _single_flight_class = SingleFlight
+
+    def _make_client(self, base_url: Optional[str]) -> Any:
+        return anthropic.Anthropic(
+            api_key=self.api_key, base_url=base_url, max_retries=0
+        )
+
+    def _image_block(self, image_path: Union[str, Path]) -> Dict[str, Any]:
+        """Build an image content block for the Messages API."""
+        encoded_image, media_type = ImageProcessor.encode_for_api(image_path)
+        return image_content(encoded_image, media_type)
+
+    def _create_message(
+        self,
+        cacheable: bool = False,
+        on_text: Optional[TextCallback] = None,
+        coalesce: bool = True,
+        **params: Any,
+    ) -> Any:
+        """Send a request to the Messages API.
 
         Args:
-            api_key: Optional API key. If not provided, will use environment variable.
+            cacheable: Allow the response cache for this request. Only
+                honoured for deterministic (temperature=0) requests.
+            on_text: Stream the response, calling this with each text delta.
+                A cached response is delivered as a single chunk.
+            coalesce: Share the call with concurrent identical requests.
+                Requests that may be cancelled mid-stream pass False, so
+                no other caller ever waits on them.
+            **params: Arguments for ``client.messages.create``
+
+        The request goes through ``self.scheduler``, which applies rate
+        limits and retries. Concurrent identical deterministic requests are
+        coalesced into one call by ``self.single_flight``.
         """
-        self.api_key = api_key or Config.ANTHROPIC_API_KEY
-        if not self.api_key:
-            raise ConfigurationError("No API key provided")
+        use_cache = self._use_cache(cacheable, params)
+        key = request_key(params) if use_cache else None
+
+        if use_cache and not self.refresh_cache:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                message = self._cached_message(cached)
+                if on_text:
+                    on_text(
+                        "".join(b.text for b in message.content if b.type == "text")
+                    )
+                return message
+
+        def send() -> Any:
+            with METRICS.span("api.request", model=params.get("model")):
+                if on_text:
+                    message = self.scheduler.call(
+                        lambda: self._stream_message(on_text, **params), params
+                    )
+                else:
+                    message = self.scheduler.call(
+                        lambda: self._send_message(params), params
+                    )
+            METRICS.increment("responses_total", source="api")
+            self._record_usage(message)
+            if use_cache:
+                self.response_cache.put(key, message.model_dump(mode="json"))
+            return message
+
+        if params.get("temperature") != 0 or not coalesce:
+            return send()
+
+        message, shared = self.single_flight.do(key or request_key(params), send)
+        if shared:
+            METRICS.increment("responses_total", source="coalesced")
+        if shared and on_text:
+            on_text("".join(b.text for b in message.content if b.type == "text"))
+        return message
+
+    def _send_message(self, params: Dict[str, Any]) -> Tuple[Any, Mapping[str, str]]:
+        """Send one request; return the message and the response headers."""
+        raw = self.client.messages.with_raw_response.create(**params)
+        return raw.parse(), raw.headers
+
+    def _stream_message(
+        self, on_text: TextCallback, **params: Any
+    ) -> Tuple[Any, Mapping[str, str]]:
+        """Stream a response and record the time to first token.
+
+        Returns:
+            The final message and the response headers
+        """
+        start = time.perf_counter()
+        self.last_time_to_first_token = None
+        with self.client.messages.stream(**params) as stream:
+            try:
+                for text in stream.text_stream:
+                    if self.last_time_to_first_token is None:
+                        self.last_time_to_first_token = time.perf_counter() - start
+                        METRICS.observe(
+                            STAGE_SECONDS,
+                            self.last_time_to_first_token,
+                            stage="api.first_token",
+                        )
+                    on_text(text)
+            except anthropic.APIError as e:
+                if self.last_time_to_first_token is None:
+                    raise
+                # Text was already shown; a retry would repeat it
+                raise APIError(f"Stream interrupted: {str(e)}")
+            headers = getattr(getattr(stream, "response", None), "headers", {})
+            return stream.get_final_message(), headers
+
+    @staticmethod
+    def _stream_to_console(
+        request: Callable[[TextCallback], Any], format_style: str, title: str
+    ) -> Any:
+        """Run a streaming request, rendering text as it arrives."""
+        if format_style == "rich":
+            with ResponseFormatter.live_panel(title=title) as live:
+                return request(live.append)
+        response = request(lambda chunk: print(chunk, end="", flush=True))
+        print()
+        return response
+
+    def compact_history(self, force: bool = False) -> bool:
+        """Summarize older turns once the history exceeds its token budget.
 
-        self.client = anthropic.Anthropic(api_key=self.api_key)
-        self.conversation_history: List[Dict[str, Any]] = []
-        Config.initialize()
+        The most recent ``history_keep_turns`` turns stay verbatim; everything
+        before them is replaced by a model-generated summary.
+
+        Args:
+            force: Compact even if the history is within budget
+
+        Returns:
+            True if the history was compacted
+        """
+        if not self._needs_compaction(force):
+            return False
+
+        older, recent = split_history(
+            self.conversation_history, self.history_keep_turns
+        )
+        if not older:
+            return False
+
+        message = self._create_message(**summary_request(transcript(older)))
+        self._replace_older_turns(older, recent, message)
+        return True
 
     def _get_explanation(
-        self, image_path: Union[str, Path], additional_text: str
-    ) -> dict:
-        """Internal method to get explanation from API."""
-        try:
-            encoded_image, _ = ImageProcessor.process_image(image_path)
-
-            message = self.client.messages.create(
-                model=Config.DEFAULT_MODEL,
-                max_tokens=Config.DEFAULT_MAX_TOKENS,
-                temperature=0,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/jpeg",
-                                    "data": encoded_image,
-                                },
-                            },
-                            {
-                                "type": "text",
-                                "text": f"""Please help me with this math problem. {additional_text}
-
-                                Provide:
-                                1. Concepts being tested
-                                2. Step-by-step solution
-                                3. Key points to remember
-                                4. Common mistakes to avoid""",
-                            },
-                        ],
-                    }
-                ],
-            )
+        self,
+        image_path: Union[str, Path],
+        additional_text: str,
+        on_text: Optional[TextCallback] = None,
+        structured: bool = False,
+    ) -> Any:
+        """Internal method to get explanation from API.
+
+        With the dedup index enabled, a plain request for an image that looks
+        like an already answered one reuses that answer.
 
-            return message.content
+        Returns:
+            The response content, or the parsed ``Explanation`` if structured
+        """
+        try:
+            self.reused_answers.pop(str(image_path), None)
+            kind = self._dedup_kind(structured)
+            image_hash: Optional[int] = None
+            if self.dedup_index is not None and not additional_text:
+                image_hash = ImageProcessor.perceptual_hash(image_path)
+                match = self.dedup_index.lookup(image_hash, kind)
+                if match is not None:
+                    message = self._reuse(image_path, match)
+                    if on_text and not structured:
+                        on_text(content_text(message.content))
+                    return self._result(message, "explain", structured)
+
+            image_block = self._image_block(image_path)
+            params = self._explanation_params(image_block, additional_text, structured)
+            message = self._create_message(cacheable=True, on_text=on_text, **params)
+
+            if image_hash is not None:
+                self.dedup_index.add(
+                    image_hash, kind, image_path, message.model_dump(mode="json")
+                )
+            return self._result(message, "explain", structured)
 
         except anthropic.APIError as e:
             raise APIError(f"API error: {str(e)}")
 
+    def _get_packed_explanations(
+        self, image_paths: List[Union[str, Path]], additional_text: str
+    ) -> List[str]:
+        """Internal method to explain several problems with one request.
+
+        Problems whose answer cannot be split out of the packed response
+        are explained with a single-image request instead.
+        """
+        sections: Dict[int, str] = {}
+        if len(image_paths) > 1:
+            try:
+                image_blocks = [self._image_block(path) for path in image_paths]
+                message = self._create_message(
+                    cacheable=True,
+                    **packed_explanation_request(image_blocks, additional_text),
+                )
+            except anthropic.APIError as e:
+                raise APIError(f"API error: {str(e)}")
+            sections = self._packed_sections(message, len(image_paths))
+
+        for index, image_path in enumerate(image_paths):
+            if index not in sections:
+                response = self._get_explanation(image_path, additional_text)
+                sections[index] = content_text(response)
+                self._count_single_request()
+        return [sections[index] for index in range(len(image_paths))]
+
     def _generate_problems(
-        self, image_path: Union[str, Path], num_problems: int
-    ) -> dict:
+        self,
+        image_path: Union[str, Path],
+        num_problems: int,
+        structured: bool = False,
+        difficulty: Optional[str] = None,
+    ) -> Any:
         """Internal method to generate similar problems."""
         try:
-            encoded_image, _ = ImageProcessor.process_image(image_path)
-
-            message = self.client.messages.create(
-                model=Config.DEFAULT_MODEL,
-                max_tokens=Config.DEFAULT_MAX_TOKENS * 2,
-                temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/jpeg",
-                                    "data": encoded_image,
-                                },
-                            },
-                            {
-                                "type": "text",
-                                "text": f"""Generate {num_problems} similar practice problems that test
-                                the same concepts. For each problem, provide:
-                                1. Problem statement
-                                2. Complete solution
-                                3. Difficulty level compared to original
-                                4. Key concepts being tested""",
-                            },
-                        ],
-                    }
-                ],
+            image_block = self._image_block(image_path)
+            params = self._practice_params(
+                image_block, num_problems, structured, difficulty
             )
-
-            return message.content
+            message = self._create_message(**params)
+            return self._result(message, "practice", structured)
 
         except anthropic.APIError as e:
             raise APIError(f"API error: {str(e)}")
 
     def _check_solution(
-        self, image_path: Union[str, Path], student_solution: str
-    ) -> dict:
+        self,
+        image_path: Union[str, Path],
+        student_solution: str,
+        structured: bool = False,
+    ) -> Any:
         """Internal method to check solution."""
         try:
-            encoded_image, _ = ImageProcessor.process_image(image_path)
-
-            message = self.client.messages.create(
-                model=Config.DEFAULT_MODEL,
-                max_tokens=Config.DEFAULT_MAX_TOKENS,
-                temperature=0,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/jpeg",
-                                    "data": encoded_image,
-                                },
-                            },
-                            {
-                                "type": "text",
-                                "text": f"""Review this solution:
-
-                                Student solution:
-                                {student_solution}
-
-                                Please provide:
-                                1. Correctness assessment
-                                2. Detailed feedback on each step
-                                3. Suggestions for improvement
-                                4. Alternative solution methods
-                                5. Conceptual understanding assessment""",
-                            },
-                        ],
-                    }
-                ],
-            )
-
-            return message.content
+            image_block = self._image_block(image_path)
+            params = self._check_params(image_block, student_solution, structured)
+            message = self._create_message(cacheable=True, **params)
+            return self._result(message, "check", structured)
 
         except anthropic.APIError as e:
             raise APIError(f"API error: {str(e)}")
 
+    @timed("assistant.explain")
     def explain_problem(
         self,
         image_path: Union[str, Path],
         additional_text: str = "",
         format_output: bool = True,
         format_style: str = "basic",
+        stream: bool = False,
+        structured: bool = False,
     ) -> Union[Dict, str]:
         """Get explanation for a math problem from an image.
 
@@ -172,28 +287,71 @@ class MathAssistant:
             additional_text: Optional additional context or questions
             format_output: Whether to format the output (default: True)
             format_style: Formatting style ('basic', 'pretty', or 'rich')
+            stream: Render the explanation as it is generated ('pretty' and
+                'rich' only)
+            structured: Return an ``Explanation`` dict parsed from a tool
+                call instead of text; formatting options are ignored
 
         Returns:
             Formatted explanation if format_output=True, otherwise raw response
         """
+        if structured:
+            explanation = self._get_explanation(
+                image_path, additional_text, structured=True
+            )
+            self._remember_answer(image_path, explanation)
+            return explanation
+
+        if stream and format_output and format_style in ("pretty", "rich"):
+            self._stream_to_console(
+                lambda on_text: self._get_explanation(
+                    image_path, additional_text, on_text=on_text
+                ),
+                format_style,
+                "Math Problem Explanation",
+            )
+            return None
+
         response = self._get_explanation(image_path, additional_text)
 
         if not format_output:
             return response
+        return self._render(response, format_style, "Math Problem Explanation")
 
-        if format_style == "pretty":
-            ResponseFormatter.pretty_print(response)
-        elif format_style == "rich":
-            ResponseFormatter.rich_print(response, title="Math Problem Explanation")
-        else:
-            return ResponseFormatter.clean_text(response)
+    @timed("assistant.explain_packed")
+    def explain_problems(
+        self,
+        image_paths: List[Union[str, Path]],
+        additional_text: str = "",
+        pack_size: Optional[int] = None,
+    ) -> List[str]:
+        """Get explanations for several problems, packing images into requests.
 
+        Up to ``pack_size`` images are sent in one request and the response
+        is split back into one explanation per image.
+
+        Args:
+            image_paths: Paths to the image files
+            additional_text: Optional additional context or questions
+            pack_size: Images per request (default: Config.PACK_SIZE)
+
+        Returns:
+            Plain-text explanations in the same order as ``image_paths``
+        """
+        pack_size = max(1, pack_size or Config.PACK_SIZE)
+        explanations: List[str] = []
+        for group in chunked(image_paths, pack_size):
+            explanations.extend(self._get_packed_explanations(group, additional_text))
+        return explanations
+
+    @timed("assistant.practice")
     def generate_similar_problems(
         self,
         image_path: Union[str, Path],
         num_problems: int = 3,
         format_output: bool = True,
         format_style: str = "basic",
+        structured: bool = False,
     ) -> Union[List[Dict], str]:
         """Generate similar practice problems based on an image.
 
@@ -202,51 +360,100 @@ class MathAssistant:
             num_problems: Number of similar problems to generate
             format_output: Whether to format the output (default: True)
             format_style: Formatting style ('basic', 'pretty', or 'rich')
+            structured: Return a ``PracticeSet`` dict parsed from a tool call
+                instead of text; formatting options are ignored
+
+        Requests for more than ``Config.PRACTICE_FANOUT_THRESHOLD`` problems
+        are split into parallel sub-requests; see ``_fan_out_problems``.
 
         Returns:
             Formatted problems if format_output=True, otherwise raw response
         """
-        response = self._generate_problems(image_path, num_problems)
+        if num_problems > Config.PRACTICE_FANOUT_THRESHOLD:
+            return self._fan_out_problems(
+                image_path, num_problems, format_output, format_style, structured
+            )
 
-        if not format_output:
-            return response
+        response = self._generate_problems(image_path, num_problems, structured)
 
-        if format_style == "pretty":
-            ResponseFormatter.pretty_print(response)
-        elif format_style == "rich":
-            ResponseFormatter.rich_print(response, title="Similar Problems")
-        else:
-            return ResponseFormatter.clean_text(response)
+        if structured or not format_output:
+            return response
+        return self._render(response, format_style, "Similar Problems")
 
+    def _fan_out_problems(
+        self,
+        image_path: Union[str, Path],
+        num_problems: int,
+        format_output: bool,
+        format_style: str,
+        structured: bool,
+    ) -> Any:
+        """Generate problems in parallel slices of ``Config.PRACTICE_SLICE_SIZE``.
+
+        Each slice has its own difficulty target, from easier to harder.
+        Problems are merged as each sub-request completes, dropping any that
+        another slice already produced, and numbered in arrival order. With
+        the 'pretty' and 'rich' styles they are printed as they arrive.
+        """
+        slices = plan_slices(num_problems, Config.PRACTICE_SLICE_SIZE)
+        merger = self._problem_merger(structured)
+        show = format_output and not structured and format_style in ("pretty", "rich")
+
+        with ThreadPoolExecutor(max_workers=len(slices)) as executor:
+            futures = [
+                executor.submit(
+                    self._generate_problems, image_path, count, structured, difficulty
+                )
+                for count, difficulty in slices
+            ]
+            for future in as_completed(futures):
+                self._merge_problems(
+                    merger, future.result(), structured, show, format_style
+                )
+
+        return self._merged_problems(merger, structured, format_output, show)
+
+    @timed("assistant.check")
     def check_solution(
         self,
         image_path: Union[str, Path],
         student_solution: str,
         format_output: bool = True,
         format_style: str = "basic",
+        structured: bool = False,
+        step_feedback: bool = False,
     ) -> Union[Dict, str]:
         """Check a student's solution against a problem from an image.
 
+        If a reference answer is stored for the image and the student's final
+        answer clearly matches or contradicts it, the check is answered
+        locally without an API call.
+
         Args:
             image_path: Path to the image file
             student_solution: The student's attempted solution
             format_output: Whether to format the output (default: True)
             format_style: Formatting style ('basic', 'pretty', or 'rich')
+            structured: Return a ``SolutionFeedback`` dict, with a score for
+                each step, parsed from a tool call instead of text;
+                formatting options are ignored. Always sent to the model.
+            step_feedback: Always ask the model for feedback on each step
 
         Returns:
             Formatted feedback if format_output=True, otherwise raw response
         """
-        response = self._check_solution(image_path, student_solution)
+        if structured:
+            return self._check_solution(image_path, student_solution, structured=True)
+
+        response = None
+        if not step_feedback:
+            response = self._local_feedback(image_path, student_solution)
+        if response is None:
+            response = self._check_solution(image_path, student_solution)
 
         if not format_output:
             return response
-
-        if format_style == "pretty":
-            ResponseFormatter.pretty_print(response)
-        elif format_style == "rich":
-            ResponseFormatter.rich_print(response, title="Solution Feedback")
-        else:
-            return ResponseFormatter.clean_text(response)
+        return self._render(response, format_style, "Solution Feedback")
 
     def start_conversation(
         self, image_path: Optional[str] = None, format_style: str = "rich"
@@ -260,7 +467,7 @@ class MathAssistant:
         Returns:
             Initial response from assistant
         """
-        self.conversation_history = []
+        self._reset_conversation()
 
         if image_path:
             return self.ask_about_problem(
@@ -268,16 +475,15 @@ class MathAssistant:
             )
 
         response = "Conversation started. How can I help you with mathematics today?"
-        if format_style == "rich":
-            ResponseFormatter.rich_print(response, title="Conversation Start")
-        elif format_style == "pretty":
-            ResponseFormatter.pretty_print(response)
-        else:
-            return ResponseFormatter.clean_text(response)
-        return response
+        return self._render(response, format_style, "Conversation Start") or response
 
+    @timed("assistant.ask")
     def ask_about_problem(
-        self, image_path: str, question: str, format_style: str = "rich"
+        self,
+        image_path: str,
+        question: str,
+        format_style: str = "rich",
+        stream: bool = False,
     ) -> str:
         """Ask a specific question about a problem.
 
@@ -285,103 +491,46 @@ class MathAssistant:
             image_path: Path to problem image
             question: User's question
             format_style: Output formatting style
+            stream: Render the answer as it is generated ('pretty' and 'rich' only)
         """
         try:
-            encoded_image, _ = ImageProcessor.process_image(image_path)
-
-            # Add to conversation history
-            self.conversation_history.append({"role": "user", "content": question})
-
-            message = self.client.messages.create(
-                model=Config.DEFAULT_MODEL,
-                max_tokens=Config.DEFAULT_MAX_TOKENS,
-                temperature=0,
-                messages=[
-                    *self.conversation_history,
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/jpeg",
-                                    "data": encoded_image,
-                                },
-                            },
-                            {"type": "text", "text": question},
-                        ],
-                    },
-                ],
-            )
-
-            response = message.content
-            self.conversation_history.append({"role": "assistant", "content": response})
-
-            if format_style == "pretty":
-                ResponseFormatter.pretty_print(response)
-            elif format_style == "rich":
-                ResponseFormatter.rich_print(response)
-            else:
-                return ResponseFormatter.clean_text(response)
-
-            return response
+            image_block = self._image_block(image_path)
+            self.compact_history()
+            self._add_question(question, image_block)
+            return self._reply(format_style, stream)
 
         except Exception as e:
             raise APIError(f"Error: {str(e)}")
 
-    def continue_conversation(self, question: str, format_style: str = "rich") -> str:
+    @timed("assistant.continue")
+    def continue_conversation(
+        self, question: str, format_style: str = "rich", stream: bool = False
+    ) -> str:
         """Continue the conversation with a follow-up question.
 
         Args:
             question: User's follow-up question
             format_style: Output formatting style
+            stream: Render the answer as it is generated ('pretty' and 'rich' only)
         """
         try:
-            self.conversation_history.append({"role": "user", "content": question})
-
-            message = self.client.messages.create(
-                model=Config.DEFAULT_MODEL,
-                max_tokens=Config.DEFAULT_MAX_TOKENS,
-                temperature=0,
-                messages=[*self.conversation_history],
-            )
-
-            response = message.content
-            self.conversation_history.append({"role": "assistant", "content": response})
-
-            if format_style == "pretty":
-                ResponseFormatter.pretty_print(response)
-            elif format_style == "rich":
-                ResponseFormatter.rich_print(response)
-            else:
-                return ResponseFormatter.clean_text(response)
-
-            return response
+            self.compact_history()
+            self._add_question(question)
+            return self._reply(format_style, stream)
 
         except Exception as e:
             raise APIError(f"Error: {str(e)}")
 
-    def save_conversation(self, filename: str) -> None:
-        """Save the current conversation to a file.
-
-        Args:
-            filename: Path where to save the conversation
-        """
-        with open(filename, "w") as f:
-            for message in self.conversation_history:
-                role = message["role"].upper()
-                if isinstance(message["content"], str):
-                    content = message["content"]
-                else:
-                    # Handle cases where content might be a list of message parts
-                    content = str(message["content"])
-                f.write(f"{role}: {content}\n\n")
-
-    def get_conversation_history(self) -> List[Dict[str, Any]]:
-        """Get the current conversation history.
+    def _reply(self, format_style: str, stream: bool) -> Any:
+        """Answer the latest question in the conversation."""
+        params = self._conversation_params()
+        if stream and format_style in ("pretty", "rich"):
+            message = self._stream_to_console(
+                lambda on_text: self._create_message(on_text=on_text, **params),
+                format_style,
+                "Math Assistant Response",
+            )
+            return self._add_reply(message)
 
-        Returns:
-            List of conversation messages
-        """
-        return self.conversation_history
+        response = self._add_reply(self._create_message(**params))
+        return self._render(response, format_style) or response
@@ -0,0 +1,316 @@
+"""In-process metrics: per-stage latency histograms and response counters.
+
+Stages of a request (image decode, resize and encode, the API call,
+rendering) are timed with ``METRICS.span`` or the ``timed`` decorator. Spans
+are inclusive, so ``assistant.explain`` contains the image and API stages
+inside it. Token usage and stop reasons are counted from every response.
+The registry can be summarised with percentiles, or exported as a
+Prometheus text file or as JSON lines.
+
+Only this process is measured: images encoded on the ``process_many`` pool
+are timed in the worker processes and not recorded here.
+"""
+
+import functools
+import inspect
+import json
+import math
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypedDict,
+    TypeVar,
+    Union,
+)
+from .config import Config
+
+F = TypeVar("F", bound=Callable[..., Any])
+Labels = Tuple[Tuple[str, str], ...]
+
+PREFIX = "math_assistant_"
+STAGE_SECONDS = "stage_seconds"
+QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+)
+
+
+class HistogramSummary(TypedDict):
+    """Type definition for the summary of one histogram series."""
+
+    name: str
+    labels: Dict[str, str]
+    count: int
+    sum: float
+    p50: float
+    p95: float
+    p99: float
+
+
+class CounterValue(TypedDict):
+    """Type definition for the value of one counter series."""
+
+    name: str
+    labels: Dict[str, str]
+    value: float
+
+
+class Histogram:
+    """Samples of one series.
+
+    Count and sum cover every observation; percentiles are computed over
+    the most recent ``max_samples`` so memory stays bounded.
+    """
+
+    def __init__(self, max_samples: int) -> None:
+        self.count = 0
+        self.sum = 0.0
+        self._samples: Deque[float] = deque(maxlen=max_samples)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self._samples.append(value)
+
+    def quantile(self, q: float) -> float:
+        """Return the q-quantile (nearest rank) of the kept samples."""
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        return ordered[max(1, math.ceil(len(ordered) * q)) - 1]
+
+
+class _Span:
+    """Times a block and records it when the block exits."""
+
+    __slots__ = ("registry", "stage", "labels", "start")
+
+    def __init__(self, registry: "MetricsRegistry", stage: str, labels: Labels):
+        self.registry = registry
+        self.stage = stage
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        labels = (("stage", self.stage),) + self.labels
+        self.registry._observe(STAGE_SECONDS, time.perf_counter() - self.start, labels)
+        if exc_type is not None:
+            self.registry._increment("stage_errors_total", 1, labels)
+
+
+class MetricsRegistry:
+    """Thread-safe store of histogram and counter series."""
+
+    def __init__(self, enabled: bool = True, max_samples: int = 10000) -> None:
+        """Initialize the registry.
+
+        Args:
+            enabled: Record observations; when False every call is a no-op
+            max_samples: Samples kept per histogram series for percentiles
+        """
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def _observe(self, name: str, value: float, labels: Labels) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = Histogram(self.max_samples)
+                self._histograms[(name, labels)] = histogram
+            histogram.observe(value)
+
+    def _increment(self, name: str, value: float, labels: Labels) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[(name, labels)] = (
+                self._counters.get((name, labels), 0) + value
+            )
+
+    def span(self, stage: str, **labels: Any) -> _Span:
+        """Time a block as a stage: ``with METRICS.span("image.decode"): ...``."""
+        return _Span(self, stage, self._labels(labels))
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Add a sample to a histogram series."""
+        self._observe(name, value, self._labels(labels))
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Add to a counter series."""
+        self._increment(name, value, self._labels(labels))
+
+    def record_message(self, message: Any) -> None:
+        """Count a response's token usage and stop reason."""
+        usage = getattr(message, "usage", None)
+        if usage is not None:
+            for field in USAGE_FIELDS:
+                value = getattr(usage, field, None) or 0
+                self.increment("tokens_total", value, type=field)
+            self.observe("output_tokens", getattr(usage, "output_tokens", None) or 0)
+        stop_reason = getattr(message, "stop_reason", None)
+        if stop_reason:
+            self.increment("stop_reasons_total", reason=stop_reason)
+
+    def histograms(self) -> List[HistogramSummary]:
+        """Return count, sum and percentiles of every histogram series."""
+        with self._lock:
+            series = sorted(self._histograms.items())
+            summaries: List[HistogramSummary] = []
+            for (name, labels), histogram in series:
+                p50, p95, p99 = (histogram.quantile(q) for q in QUANTILES.values())
+                summaries.append(
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "p50": p50,
+                        "p95": p95,
+                        "p99": p99,
+                    }
+                )
+        return summaries
+
+    def counters(self) -> List[CounterValue]:
+        """Return the value of every counter series."""
+        with self._lock:
+            return [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+
+    def stage(self, stage: str) -> Optional[HistogramSummary]:
+        """Return the summary of a stage's latency, if it was recorded."""
+        for summary in self.histograms():
+            if summary["name"] == STAGE_SECONDS and summary["labels"] == {
+                "stage": stage
+            }:
+                return summary
+        return None
+
+    def to_prometheus(self) -> str:
+        """Render every series in the Prometheus text exposition format.
+
+        Histograms are exported as summaries with 0.5, 0.95 and 0.99
+        quantiles.
+        """
+        lines: List[str] = []
+        typed = set()
+        for summary in self.histograms():
+            name = PREFIX + summary["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} summary")
+                typed.add(name)
+            for key, q in QUANTILES.items():
+                labels = {**summary["labels"], "quantile": str(q)}
+                value = summary[key]  # type: ignore[literal-required]
+                lines.append(f"{name}{_format_labels(labels)} {value!r}")
+            labels_text = _format_labels(summary["labels"])
+            lines.append(f"{name}_sum{labels_text} {summary['sum']!r}")
+            lines.append(f"{name}_count{labels_text} {summary['count']}")
+        for counter in self.counters():
+            name = PREFIX + counter["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(
+                f"{name}{_format_labels(counter['labels'])} {counter['value']!r}"
+            )
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def to_jsonl(self) -> str:
+        """Render every series as one JSON object per line."""
+        records: List[Dict[str, Any]] = [
+            {"type": "histogram", **summary} for summary in self.histograms()
+        ]
+        records.extend({"type": "counter", **counter} for counter in self.counters())
+        return "".join(json.dumps(record) + "\n" for record in records)
+
+    def export(self, path: Union[str, Path]) -> None:
+        """Write the metrics to a file.
+
+        Args:
+            path: ``.jsonl`` or ``.json`` files get JSON lines; anything else
+                gets Prometheus text (e.g. ``metrics.prom`` for the node
+                exporter's textfile collector)
+        """
+        path = Path(path)
+        if path.suffix in (".jsonl", ".json"):
+            text = self.to_jsonl()
+        else:
+            text = self.to_prometheus()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so a scraper never reads a partial file
+        partial = path.with_name(path.name + ".tmp")
+        partial.write_text(text, encoding="utf-8")
+        partial.replace(path)
+
+    def reset(self) -> None:
+        """Drop every series."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def timed(stage: str) -> Callable[[F], F]:
+    """Decorator recording every call of a function or coroutine as a stage."""
+
+    def decorate(func: F) -> F:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with METRICS.span(stage):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with METRICS.span(stage):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+# Registry shared by the whole process
+METRICS = MetricsRegistry(
+    enabled=Config.METRICS_ENABLED, max_samples=Config.METRICS_MAX_SAMPLES
+)
@@ -0,0 +1,422 @@
+"""Local stand-in for the Messages API, for load tests and offline demos.
+
+``MockAPIServer`` answers ``POST /v1/messages`` the way the API does for the
+requests this project sends: plain and streamed (server-sent events)
+responses, text and forced tool calls, usage and ``anthropic-ratelimit-*``
+headers. It does not call a model; answers are filler text of a sampled
+length. Timing is configurable: the time to the first token follows a
+latency distribution and output tokens then arrive at a fixed rate. Rate
+limit (429) and overload (529) errors can be injected at random, and a
+per-minute request limit is enforced like the real one.
+
+Point an assistant at it with ``MathAssistant(base_url=server.url)`` or
+``ANTHROPIC_BASE_URL``; any API key is accepted.
+"""
+
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple, TypedDict
+from .scheduler import LIMIT_HEADERS, TokenBucket, estimate_request
+
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+# Words the filler answers are made of; one word counts as one token
+_WORDS = (
+    "first subtract three from both sides then divide by two so x equals "
+    "four check by substituting back into the original equation"
+).split()
+
+# Output tokens sent per streamed text delta
+_TOKENS_PER_DELTA = 4
+
+
+class MockServerStats(TypedDict):
+    """Type definition for mock server statistics."""
+
+    requests: int
+    streamed: int
+    rate_limited: int
+    overloaded: int
+    invalid: int
+    output_tokens: int
+
+
+class LatencyModel:
+    """Distribution of the time to the first token, in seconds."""
+
+    def __init__(
+        self, distribution: str = "lognormal", mean: float = 0.5, spread: float = 0.5
+    ) -> None:
+        """Initialize the model.
+
+        Args:
+            distribution: One of DISTRIBUTIONS
+            mean: Mean latency in seconds
+            spread: Standard deviation relative to the mean ('normal' and
+                'lognormal'), or half-width relative to the mean ('uniform').
+                Ignored by 'fixed' and 'exponential'.
+        """
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.distribution = distribution
+        self.mean = max(0.0, mean)
+        self.spread = max(0.0, spread)
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one latency."""
+        if self.mean == 0 or self.distribution == "fixed":
+            return self.mean
+        if self.distribution == "uniform":
+            width = self.mean * min(1.0, self.spread)
+            return rng.uniform(self.mean - width, self.mean + width)
+        if self.distribution == "normal":
+            return max(0.0, rng.gauss(self.mean, self.mean * self.spread))
+        if self.distribution == "exponential":
+            return rng.expovariate(1 / self.mean)
+        # Lognormal with the requested mean: long-tailed, like real latencies
+        sigma = math.sqrt(math.log(1 + self.spread**2))
+        return rng.lognormvariate(math.log(self.mean) - sigma**2 / 2, sigma)
+
+
+def example_input(schema: Dict[str, Any]) -> Any:
+    """Build a value that satisfies a (simple) JSON schema."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if kind == "object":
+        return {
+            name: example_input(prop)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [example_input(schema.get("items", {}))] * max(
+            1, schema.get("minItems", 1)
+        )
+    if kind in ("integer", "number"):
+        return schema.get("minimum", 1)
+    if kind == "boolean":
+        return True
+    return "x = 4"
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    """HTTP server imitating the Messages API."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: Optional[LatencyModel] = None,
+        tokens_per_second: float = 100.0,
+        output_tokens: int = 200,
+        rate_limit_rate: float = 0.0,
+        overload_rate: float = 0.0,
+        retry_after: float = 1.0,
+        requests_per_minute: float = 4000,
+        seed: Optional[int] = None,
+    ) -> None:
+        """Initialize the server; ``port`` 0 picks a free port.
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on
+            latency: Time to the first token (default: lognormal, mean 0.5s)
+            tokens_per_second: Output rate after the first token; 0 for instant
+            output_tokens: Mean answer length, capped by the request's max_tokens
+            rate_limit_rate: Fraction of requests answered with a 429
+            overload_rate: Fraction of requests answered with a 529
+            retry_after: Seconds sent in the retry-after header of injected 429s
+            requests_per_minute: Requests admitted per minute before 429s
+            seed: Seed for latencies, answer lengths and injected errors
+        """
+        super().__init__((host, port), _Handler)
+        self.latency = latency or LatencyModel()
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.rate_limit_rate = rate_limit_rate
+        self.overload_rate = overload_rate
+        self.retry_after = retry_after
+        self.requests_bucket = TokenBucket(requests_per_minute)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stats: MockServerStats = {
+            "requests": 0,
+            "streamed": 0,
+            "rate_limited": 0,
+            "overloaded": 0,
+            "invalid": 0,
+            "output_tokens": 0,
+        }
+
+    @property
+    def url(self) -> str:
+        """Base URL to pass to the client."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockAPIServer":
+        """Serve from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """Stop serving and release the port."""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self) -> "MockAPIServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def stats(self) -> MockServerStats:
+        """Return request and error counts so far."""
+        with self._lock:
+            return dict(self._stats)  # type: ignore[return-value]
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount  # type: ignore[literal-required]
+
+    def admit(self) -> Tuple[Optional[int], float, Dict[str, str]]:
+        """Decide the fate of a request.
+
+        Returns:
+            (error status or None, time to first token, rate-limit headers)
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._stats["requests"] += 1
+            draw = self._rng.random()
+            ttft = self.latency.sample(self._rng)
+            wait = self.requests_bucket.wait_time(1, now)
+            if wait > 0:
+                status: Optional[int] = 429
+                retry_after = wait
+            elif draw < self.rate_limit_rate:
+                status, retry_after = 429, self.retry_after
+            elif draw < self.rate_limit_rate + self.overload_rate:
+                status, retry_after = 529, 0.0
+            else:
+                status, retry_after = None, 0.0
+                self.requests_bucket.take(1, now)
+            if status == 429:
+                self._stats["rate_limited"] += 1
+            elif status == 529:
+                self._stats["overloaded"] += 1
+            prefix = LIMIT_HEADERS["requests"]
+            headers = {
+                f"{prefix}-limit": str(int(self.requests_bucket.capacity)),
+                f"{prefix}-remaining": str(max(0, int(self.requests_bucket.tokens))),
+            }
+        if status == 429:
+            headers["retry-after"] = str(max(0, math.ceil(retry_after)))
+        return status, ttft, headers
+
+    def answer_length(self, max_tokens: int) -> int:
+        with self._lock:
+            sampled = self._rng.expovariate(1 / max(1, self.output_tokens))
+        return max(1, min(max_tokens, round(sampled)))
+
+
+def _filler(tokens: int) -> str:
+    return " ".join(_WORDS[i % len(_WORDS)] for i in range(tokens))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Handles one connection; keeps it alive between requests."""
+
+    protocol_version = "HTTP/1.1"
+    server: MockAPIServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(
+        self, status: int, body: Dict[str, Any], headers: Dict[str, str]
+    ) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.send_header("request-id", f"req_mock_{uuid.uuid4().hex[:12]}")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(
+        self, status: int, kind: str, message: str, headers: Dict[str, str]
+    ) -> None:
+        body = {"type": "error", "error": {"type": kind, "message": message}}
+        self._send_json(status, body, headers)
+
+    def _event(self, name: str, data: Dict[str, Any]) -> None:
+        """Write one server-sent event as an HTTP chunk."""
+        payload = f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("content-length") or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            params = None
+        if self.path.split("?")[0] != "/v1/messages":
+            self._send_error(404, "not_found_error", "Not found", {})
+            return
+        if not isinstance(params, dict) or not all(
+            key in params for key in ("model", "max_tokens", "messages")
+        ):
+            self.server.count("invalid")
+            self._send_error(
+                400,
+                "invalid_request_error",
+                "model, max_tokens and messages are required",
+                {},
+            )
+            return
+
+        status, ttft, headers = self.server.admit()
+        if status == 429:
+            self._send_error(429, "rate_limit_error", "Rate limited (mock)", headers)
+            return
+        if status == 529:
+            self._send_error(529, "overloaded_error", "Overloaded (mock)", headers)
+            return
+
+        message = self._message(params)
+        if params.get("stream"):
+            self.server.count("streamed")
+            self._stream(message, ttft, headers)
+        else:
+            tokens = message["usage"]["output_tokens"]
+            time.sleep(ttft + self._generation_time(tokens))
+            self._send_json(200, message, headers)
+        self.server.count("output_tokens", message["usage"]["output_tokens"])
+
+    def _generation_time(self, tokens: int) -> float:
+        rate = self.server.tokens_per_second
+        return tokens / rate if rate > 0 else 0.0
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the complete response for a request."""
+        tokens = self.server.answer_length(int(params["max_tokens"]))
+        content: List[Dict[str, Any]] = []
+        stop_reason = "max_tokens" if tokens >= params["max_tokens"] else "end_turn"
+        choice = params.get("tool_choice") or {}
+        tool = next(
+            (
+                tool
+                for tool in params.get("tools", [])
+                if tool.get("name") == choice.get("name")
+            ),
+            None,
+        )
+        if choice.get("type") == "tool" and tool is not None:
+            content.append(
+                {
+                    "type": "tool_use",
+                    "id": f"toolu_mock_{uuid.uuid4().hex[:12]}",
+                    "name": tool["name"],
+                    "input": example_input(tool.get("input_schema", {})),
+                }
+            )
+            stop_reason = "tool_use"
+        else:
+            content.append({"type": "text", "text": _filler(tokens)})
+        return {
+            "id": f"msg_mock_{uuid.uuid4().hex[:12]}",
+            "type": "message",
+            "role": "assistant",
+            "model": params["model"],
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": estimate_request(params)[0],
+                "output_tokens": tokens,
+                "cache_creation_input_tokens": 0,
+                "cache_read_input_tokens": 0,
+            },
+        }
+
+    def _stream(
+        self, message: Dict[str, Any], ttft: float, headers: Dict[str, str]
+    ) -> None:
+        """Send a response as server-sent events, paced at the token rate."""
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("cache-control", "no-cache")
+        self.send_header("transfer-encoding", "chunked")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        time.sleep(ttft)
+        start = dict(message, content=[], stop_reason=None)
+        start["usage"] = dict(message["usage"], output_tokens=1)
+        self._event("message_start", {"type": "message_start", "message": start})
+        for index, block in enumerate(message["content"]):
+            if block["type"] == "text":
+                opening = dict(block, text="")
+                words = block["text"].split(" ")
+                deltas = [
+                    {"type": "text_delta", "text": (" " if i else "") + " ".join(chunk)}
+                    for i, chunk in enumerate(
+                        words[j : j + _TOKENS_PER_DELTA]
+                        for j in range(0, len(words), _TOKENS_PER_DELTA)
+                    )
+                ]
+            else:
+                opening = dict(block, input={})
+                deltas = [
+                    {
+                        "type": "input_json_delta",
+                        "partial_json": json.dumps(block["input"]),
+                    }
+                ]
+            self._event(
+                "content_block_start",
+                {
+                    "type": "content_block_start",
+                    "index": index,
+                    "content_block": opening,
+                },
+            )
+            gap = self._generation_time(_TOKENS_PER_DELTA)
+            for i, delta in enumerate(deltas):
+                if i:
+                    time.sleep(gap)
+                self._event(
+                    "content_block_delta",
+                    {"type": "content_block_delta", "index": index, "delta": delta},
+                )
+            self._event(
+                "content_block_stop", {"type": "content_block_stop", "index": index}
+            )
+        self._event(
+            "message_delta",
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                "usage": {"output_tokens": message["usage"]["output_tokens"]},
+            },
+        )
+        self._event("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
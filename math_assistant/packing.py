@@ -0,0 +1,66 @@
+"""Splitting of packed multi-problem responses into per-problem answers."""
+
+import re
+from typing import Dict, Iterable, Iterator, List, TypedDict, TypeVar
+
+T = TypeVar("T")
+
+# The model is asked to start each answer with this line
+PACK_HEADER = "=== Problem {} ==="
+
+# Tolerates Markdown decoration the model may add around the header
+HEADER_PATTERN = re.compile(
+    r"^[\s#*_>]*=+\s*Problem\s+(\d+)\s*=+[\s*_]*$", re.IGNORECASE | re.MULTILINE
+)
+
+
+class PackingStats(TypedDict):
+    """Type definition for packed-request statistics."""
+
+    packed_requests: int
+    packed_problems: int
+    single_requests: int
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yield consecutive lists of at most ``size`` items."""
+    chunk: List[T] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def split_packed(text: str, count: int, truncated: bool = False) -> Dict[int, str]:
+    """Split a packed response into answers keyed by problem index.
+
+    Only answers that can be attributed unambiguously are returned: a
+    problem whose header is missing, repeated or out of range, or whose
+    answer is empty, is left out so the caller can ask for it on its own.
+
+    Args:
+        text: Full text of the packed response
+        count: Number of problems in the request
+        truncated: The response hit its token limit, so the last answer
+            found may be incomplete and is dropped
+
+    Returns:
+        Answer text by zero-based problem index
+    """
+    headers = list(HEADER_PATTERN.finditer(text))
+    numbers = [int(match.group(1)) for match in headers]
+    sections: Dict[int, str] = {}
+    for position, match in enumerate(headers):
+        number = numbers[position]
+        if not 1 <= number <= count or numbers.count(number) > 1:
+            continue
+        end = headers[position + 1].start() if position + 1 < len(headers) else None
+        if end is None and truncated:
+            continue
+        answer = text[match.end() : end].strip()
+        if answer:
+            sections[number - 1] = answer
+    return sections
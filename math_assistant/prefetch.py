@@ -0,0 +1,204 @@
+"""Speculative background requests for the interactive session."""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence, TypedDict, Union
+from .config import Config
+from .prompts import explanation_request, practice_request
+from .scheduler import estimate_request
+
+if TYPE_CHECKING:
+    from .math_assistant import MathAssistant
+
+KINDS = ("practice", "explain")
+
+
+class PrefetchCancelled(Exception):
+    """Raised inside a speculative request whose image is no longer current."""
+
+    pass
+
+
+class PrefetchStats(TypedDict):
+    """Type definition for prefetch statistics."""
+
+    started: int
+    used: int
+    cancelled: int
+    skipped: int
+    spent_tokens: int
+    token_budget: int
+
+
+class Prefetcher:
+    """Requests likely follow-ups for the current image in the background.
+
+    Speculative requests are streamed so that changing the image stops them
+    mid-response. Their total cost is capped at ``token_budget`` tokens per
+    session: each request reserves its worst-case cost before it starts, and
+    the reservation is replaced by the actual usage when it finishes.
+    """
+
+    def __init__(
+        self,
+        assistant: "MathAssistant",
+        kinds: Sequence[str] = ("practice",),
+        token_budget: Optional[int] = None,
+        num_problems: int = 3,
+    ) -> None:
+        """Initialize the prefetcher.
+
+        Args:
+            assistant: Assistant that makes the requests
+            kinds: Which results to prefetch: 'practice' and/or 'explain'
+            token_budget: Cap on speculative tokens for the session
+                (default: Config.PREFETCH_TOKEN_BUDGET)
+            num_problems: Number of practice problems to request
+        """
+        unknown = set(kinds) - set(KINDS)
+        if unknown:
+            raise ValueError(f"Unknown prefetch kinds: {', '.join(sorted(unknown))}")
+        self.assistant = assistant
+        self.kinds = tuple(kinds)
+        self.token_budget = (
+            Config.PREFETCH_TOKEN_BUDGET if token_budget is None else token_budget
+        )
+        self.num_problems = num_problems
+
+        self.started = 0
+        self.used = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self.spent_tokens = 0
+
+        self._image: Optional[str] = None
+        self._generation = 0
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(KINDS), thread_name_prefix="prefetch"
+        )
+
+    def start(self, image_path: Union[str, Path]) -> None:
+        """Cancel work for the previous image and prefetch for a new one."""
+        with self._lock:
+            self._cancel_locked()
+            self._image = str(image_path)
+            for kind in self.kinds:
+                self._submit_locked(kind)
+
+    def take(
+        self, kind: str, image_path: Union[str, Path], timeout: Optional[float] = None
+    ) -> Optional[Any]:
+        """Return a prefetched response, waiting for it if still in flight.
+
+        Returns:
+            The response content, or None if nothing usable was prefetched
+        """
+        with self._lock:
+            if self._image != str(image_path):
+                return None
+            future = self._futures.pop(kind, None)
+        if future is None:
+            return None
+
+        try:
+            content = future.result(timeout)
+        except Exception:
+            return None
+        if content is None:
+            return None
+
+        with self._lock:
+            self.used += 1
+            # Asking for practice again means new problems; prepare the next set
+            if kind == "practice" and self._image == str(image_path):
+                self._submit_locked(kind)
+        return content
+
+    def cancel(self) -> None:
+        """Cancel all speculative work."""
+        with self._lock:
+            self._cancel_locked()
+            self._image = None
+
+    def close(self) -> None:
+        """Cancel all speculative work and stop the worker threads."""
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> PrefetchStats:
+        """Return counters and speculative token spend."""
+        with self._lock:
+            return {
+                "started": self.started,
+                "used": self.used,
+                "cancelled": self.cancelled,
+                "skipped": self.skipped,
+                "spent_tokens": self.spent_tokens,
+                "token_budget": self.token_budget,
+            }
+
+    def _cancel_locked(self) -> None:
+        self._generation += 1
+        for future in self._futures.values():
+            if future.cancel():
+                self.cancelled += 1
+        self._futures.clear()
+
+    def _submit_locked(self, kind: str) -> None:
+        self._futures[kind] = self._executor.submit(
+            self._run, kind, self._image, self._generation
+        )
+
+    def _run(self, kind: str, image_path: str, generation: int) -> Optional[Any]:
+        image_block = self.assistant._image_block(image_path)
+        if kind == "practice":
+            params = practice_request(image_block, self.num_problems)
+        else:
+            params = explanation_request(image_block, "")
+        estimate = sum(estimate_request(params))
+
+        with self._lock:
+            if generation != self._generation:
+                return None
+            if self.spent_tokens + estimate > self.token_budget:
+                self.skipped += 1
+                return None
+            self.spent_tokens += estimate
+            self.started += 1
+
+        def check_current(_: str) -> None:
+            if generation != self._generation:
+                raise PrefetchCancelled()
+
+        try:
+            # Not coalesced: a foreground request for the same image must
+            # not wait on a call that PrefetchCancelled can abort
+            message = self.assistant._create_message(
+                cacheable=kind == "explain",
+                on_text=check_current,
+                coalesce=False,
+                **params,
+            )
+        except PrefetchCancelled:
+            # Cost of the partial response is unknown; keep the reservation
+            with self._lock:
+                self.cancelled += 1
+            return None
+        except Exception:
+            with self._lock:
+                self.spent_tokens -= estimate
+            raise
+
+        usage = getattr(message, "usage", None)
+        if usage is not None:
+            actual = (
+                (usage.input_tokens or 0)
+                + (getattr(usage, "cache_creation_input_tokens", None) or 0)
+                + (usage.output_tokens or 0)
+            )
+            with self._lock:
+                self.spent_tokens += actual - estimate
+        return message.content
@@ -0,0 +1,222 @@
+"""CPU and memory profiling of a whole CLI invocation.
+
+``Profiler`` runs cProfile and tracemalloc between ``start`` and ``stop``
+and writes two files: a pstats dump (``python -m pstats FILE``, snakeviz)
+and collapsed stacks, one ``frame;frame;frame microseconds`` line per call
+path, which flamegraph tools (flamegraph.pl, speedscope, inferno) read.
+
+cProfile records caller/callee pairs rather than whole stacks, so the
+collapsed stacks are rebuilt from the call graph: a function's time is
+split between its callers in proportion to the time each call edge took.
+Threads started while profiling are profiled too; worker processes are
+not.
+"""
+
+import cProfile
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, TypedDict, Union
+
+FunctionKey = Tuple[str, int, str]
+
+
+class AllocationSite(TypedDict):
+    """Type definition for memory still allocated from one source line."""
+
+    location: str
+    size: int
+    count: int
+
+
+class ProfileReport(TypedDict):
+    """Type definition for the result of a profiling run."""
+
+    pstats_path: Path
+    collapsed_path: Path
+    seconds: float
+    peak_memory: int
+    top_allocations: List[AllocationSite]
+
+
+def _frame_label(function: FunctionKey) -> str:
+    filename, lineno, name = function
+    if filename == "~":
+        # Built-in function: cProfile records only its name
+        label = name
+    else:
+        label = f"{name} ({Path(filename).name}:{lineno})"
+    # ';' separates frames
+    return label.replace(";", ",")
+
+
+def collapsed_stacks(
+    stats: pstats.Stats, min_fraction: float = 0.001, max_depth: int = 64
+) -> Dict[Tuple[str, ...], float]:
+    """Rebuild call stacks and their self time from profile statistics.
+
+    Args:
+        stats: Statistics from cProfile
+        min_fraction: Call paths below this fraction of the total time are
+            folded into their caller
+        max_depth: Deepest stack to expand
+
+    Returns:
+        Seconds of self time by stack of frame labels, outermost first
+    """
+    entries: Dict[FunctionKey, Any] = stats.stats  # type: ignore[attr-defined]
+    callees: Dict[FunctionKey, Dict[FunctionKey, float]] = defaultdict(dict)
+    for function, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees[caller][function] = edge[3]
+
+    roots = [function for function, entry in entries.items() if not entry[4]]
+    threshold = sum(entries[root][3] for root in roots) * min_fraction
+    weights: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def walk(
+        function: FunctionKey,
+        path: Tuple[FunctionKey, ...],
+        labels: Tuple[str, ...],
+        value: float,
+    ) -> None:
+        # Split by own time plus each call edge's time. With recursion the
+        # edges overlap and add up to more than the cumulative time, so
+        # dividing by their sum keeps the stack totals equal to the root's.
+        total = entries[function][2] + sum(callees[function].values())
+        if total <= 0:
+            weights[labels] += value
+            return
+        self_time = value * entries[function][2] / total
+        if len(path) < max_depth:
+            for callee, edge_time in callees[function].items():
+                share = value * edge_time / total
+                if share < threshold or callee in path:
+                    # Too small to draw, or recursion already on the stack
+                    self_time += share
+                    continue
+                walk(
+                    callee,
+                    path + (callee,),
+                    labels + (_frame_label(callee),),
+                    share,
+                )
+        else:
+            self_time = value
+        weights[labels] += self_time
+
+    for root in roots:
+        walk(root, (root,), (_frame_label(root),), entries[root][3])
+    return weights
+
+
+class Profiler:
+    """Runs cProfile and tracemalloc around a block of work."""
+
+    def __init__(
+        self,
+        output_dir: Union[str, Path],
+        name: str = "profile",
+        top_allocations: int = 10,
+    ) -> None:
+        """Initialize the profiler.
+
+        Args:
+            output_dir: Where the pstats and collapsed-stack files go
+            name: File name prefix, e.g. the subcommand being profiled
+            top_allocations: Number of allocation sites to report
+        """
+        self.output_dir = Path(output_dir)
+        self.name = name
+        self.top_allocations = top_allocations
+        self._profile = cProfile.Profile()
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._started: Optional[float] = None
+
+    def _profile_thread(self, *args: Any) -> None:
+        """Profile hook for new threads: give each thread its own profiler."""
+        profile = cProfile.Profile()
+        with self._lock:
+            self._thread_profiles.append(profile)
+        # Replaces this hook for the rest of the thread
+        profile.enable()
+
+    def start(self) -> None:
+        """Start tracing allocations and profiling calls."""
+        self._started = time.perf_counter()
+        tracemalloc.start()
+        if sys.version_info < (3, 12):
+            # From 3.12 cProfile uses sys.monitoring, which sees every thread
+            threading.setprofile(self._profile_thread)
+        self._profile.enable()
+
+    def stop(self) -> ProfileReport:
+        """Stop profiling and write the pstats and collapsed-stack files."""
+        self._profile.disable()
+        threading.setprofile(None)  # type: ignore[arg-type]
+        seconds = time.perf_counter() - (self._started or time.perf_counter())
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        stats = pstats.Stats(self._profile)
+        with self._lock:
+            for profile in self._thread_profiles:
+                stats.add(profile)
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}"
+        pstats_path = self.output_dir / f"{stem}.pstats"
+        collapsed_path = self.output_dir / f"{stem}.collapsed"
+        stats.dump_stats(str(pstats_path))
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            for stack, value in sorted(collapsed_stacks(stats).items()):
+                microseconds = round(value * 1e6)
+                if microseconds > 0:
+                    f.write(f"{';'.join(stack)} {microseconds}\n")
+
+        snapshot = snapshot.filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            )
+        )
+        top: List[AllocationSite] = [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size": stat.size,
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[: self.top_allocations]
+        ]
+        return {
+            "pstats_path": pstats_path,
+            "collapsed_path": collapsed_path,
+            "seconds": seconds,
+            "peak_memory": peak,
+            "top_allocations": top,
+        }
+
+
+def format_report(report: ProfileReport) -> str:
+    """Render a profiling report as plain text."""
+    lines = [
+        f"Profiled {report['seconds']:.2f}s",
+        f"  pstats: {report['pstats_path']}",
+        f"  collapsed stacks: {report['collapsed_path']}",
+        f"Peak traced memory: {report['peak_memory'] / 2**20:.1f} MiB",
+    ]
+    if report["top_allocations"]:
+        lines.append("Top allocation sites (still allocated at exit):")
+        for site in report["top_allocations"]:
+            lines.append(
+                f"  {site['size'] / 1024:10.1f} KiB {site['count']:8d} blocks  "
+                f"{site['location']}"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,228 @@
+"""Request builders shared by the sync and async assistants."""
+
+from typing import Any, Dict, List, Optional
+from .config import Config
+from .packing import PACK_HEADER
+
+ContentBlock = Dict[str, Any]
+RequestParams = Dict[str, Any]
+
+# Requests put the breakpoint on the problem image, which opens the prompt:
+# text alone would be below the minimum cacheable prompt length
+CACHE_CONTROL: Dict[str, str] = {"type": "ephemeral"}
+
+
+def cached(block: ContentBlock) -> ContentBlock:
+    """Return a copy of a content block marked as a prompt-cache breakpoint."""
+    return {**block, "cache_control": CACHE_CONTROL}
+
+
+def image_content(encoded_image: str, media_type: str = "image/jpeg") -> ContentBlock:
+    """Build an image content block from base64 data."""
+    return {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": media_type,
+            "data": encoded_image,
+        },
+    }
+
+
+def explanation_request(
+    image_block: ContentBlock, additional_text: str
+) -> RequestParams:
+    """Build the request for explaining a problem."""
+    return {
+        "model": Config.DEFAULT_MODEL,
+        "max_tokens": Config.DEFAULT_MAX_TOKENS,
+        "temperature": 0,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    cached(image_block),
+                    {
+                        "type": "text",
+                        "text": f"""Please help me with this math problem. {additional_text}
+
+                                Provide:
+                                1. Concepts being tested
+                                2. Step-by-step solution
+                                3. Key points to remember
+                                4. Common mistakes to avoid""",
+                    },
+                ],
+            }
+        ],
+    }
+
+
+def packed_explanation_request(
+    image_blocks: List[ContentBlock], additional_text: str
+) -> RequestParams:
+    """Build one request that explains several problems, one per image.
+
+    Each image is preceded by its problem number, and the answer for each
+    problem must start with the header from ``packing.PACK_HEADER`` so the
+    response can be split back into per-problem explanations.
+    """
+    content: List[ContentBlock] = []
+    for number, image_block in enumerate(image_blocks, start=1):
+        content.append({"type": "text", "text": f"Problem {number}:"})
+        content.append(image_block)
+    count = len(image_blocks)
+    content.append(
+        {
+            "type": "text",
+            "text": f"""Please help me with these {count} math problems. {additional_text}
+
+                    Answer each problem separately and in order. Start the answer
+                    to each problem with a line containing only its header, for
+                    example "{PACK_HEADER.format(1)}", and do not refer to the
+                    other problems. For each problem provide:
+                    1. Concepts being tested
+                    2. Step-by-step solution
+                    3. Key points to remember
+                    4. Common mistakes to avoid""",
+        }
+    )
+    return {
+        "model": Config.DEFAULT_MODEL,
+        "max_tokens": min(Config.DEFAULT_MAX_TOKENS * count, Config.PACK_MAX_TOKENS),
+        "temperature": 0,
+        "messages": [{"role": "user", "content": content}],
+    }
+
+
+# Instructions for the difficulty targets of a practice request
+DIFFICULTY_TARGETS = {
+    "easier": "Make every problem easier than the original.",
+    "similar": "Keep every problem at the same difficulty as the original.",
+    "harder": "Make every problem harder than the original.",
+}
+
+
+def practice_request(
+    image_block: ContentBlock, num_problems: int, difficulty: Optional[str] = None
+) -> RequestParams:
+    """Build the request for generating similar practice problems.
+
+    Args:
+        image_block: Image content block of the original problem
+        num_problems: Number of problems to generate
+        difficulty: Difficulty target ('easier', 'similar' or 'harder');
+            None lets the model mix difficulties
+    """
+    target = f" {DIFFICULTY_TARGETS[difficulty]}" if difficulty else ""
+    return {
+        "model": Config.DEFAULT_MODEL,
+        "max_tokens": Config.DEFAULT_MAX_TOKENS * 2,
+        "temperature": 0.7,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    cached(image_block),
+                    {
+                        "type": "text",
+                        "text": f"""Generate {num_problems} similar practice problems that test
+                                the same concepts.{target} Start each problem with
+                                the line "{PACK_HEADER.format('N')}", numbered from 1.
+                                For each problem, provide:
+                                1. Problem statement
+                                2. Complete solution
+                                3. Difficulty level compared to original
+                                4. Key concepts being tested""",
+                    },
+                ],
+            }
+        ],
+    }
+
+
+def check_request(image_block: ContentBlock, student_solution: str) -> RequestParams:
+    """Build the request for reviewing a student's solution."""
+    return {
+        "model": Config.DEFAULT_MODEL,
+        "max_tokens": Config.DEFAULT_MAX_TOKENS,
+        "temperature": 0,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    cached(image_block),
+                    {
+                        "type": "text",
+                        "text": f"""Review this solution:
+
+                                Student solution:
+                                {student_solution}
+
+                                Please provide:
+                                1. Correctness assessment
+                                2. Detailed feedback on each step
+                                3. Suggestions for improvement
+                                4. Alternative solution methods
+                                5. Conceptual understanding assessment""",
+                    },
+                ],
+            }
+        ],
+    }
+
+
+def conversation_request(
+    history: List[Dict[str, Any]],
+    image_block: Optional[ContentBlock] = None,
+    image_turn: int = 0,
+) -> RequestParams:
+    """Build the request for a conversation about a problem image.
+
+    The image is attached to the user turn at ``image_turn``. Breakpoints on
+    the image and on the latest user turn let each follow-up reuse the
+    cached prefix of the conversation.
+
+    Args:
+        history: Text-only conversation turns
+        image_block: Image the conversation is about, if any
+        image_turn: Index in ``history`` of the turn that introduced the image
+    """
+    messages: List[Dict[str, Any]] = []
+    for index, turn in enumerate(history):
+        content = turn["content"]
+        if image_block is not None and index == image_turn:
+            content = [cached(image_block), {"type": "text", "text": content}]
+        messages.append({"role": turn["role"], "content": content})
+
+    if messages and messages[-1]["role"] == "user":
+        last = messages[-1]
+        if isinstance(last["content"], str):
+            last["content"] = [{"type": "text", "text": last["content"]}]
+        last["content"] = [*last["content"][:-1], cached(last["content"][-1])]
+
+    return {
+        "model": Config.DEFAULT_MODEL,
+        "max_tokens": Config.DEFAULT_MAX_TOKENS,
+        "temperature": 0,
+        "messages": messages,
+    }
+
+
+def summary_request(conversation: str) -> RequestParams:
+    """Build the request for summarizing older conversation turns."""
+    return {
+        "model": Config.DEFAULT_MODEL,
+        "max_tokens": Config.HISTORY_SUMMARY_MAX_TOKENS,
+        "temperature": 0,
+        "messages": [
+            {
+                "role": "user",
+                "content": f"""Summarize this tutoring conversation so it can replace
+the original turns. Keep the problem being discussed, what has been explained,
+any answers or formulas reached, and what the student is still unsure about.
+
+{conversation}""",
+            }
+        ],
+    }
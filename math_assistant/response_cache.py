@@ -0,0 +1,208 @@
+"""Persistent cache for deterministic API responses."""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, TypedDict, Union
+
+
+class ResponseCacheStats(TypedDict):
+    """Type definition for response cache statistics."""
+
+    hits: int
+    misses: int
+    entries: int
+    total_bytes: int
+    lifetime_hits: int
+
+
+def request_key(params: Dict[str, Any]) -> str:
+    """Build a stable key for a Messages API request.
+
+    Base64 image payloads are replaced by their SHA-256 digest before
+    hashing, so the key stays cheap to compute and log.
+    """
+
+    def normalize(value: Any) -> Any:
+        if isinstance(value, dict):
+            if value.get("type") == "base64" and "data" in value:
+                digest = hashlib.sha256(str(value["data"]).encode("utf-8")).hexdigest()
+                return {**value, "data": f"sha256:{digest}"}
+            return {k: normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        if hasattr(value, "model_dump"):
+            return normalize(value.model_dump())
+        return value
+
+    payload = json.dumps(normalize(params), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response cache with TTL and size-based LRU eviction."""
+
+    def __init__(
+        self,
+        db_path: Union[str, Path],
+        ttl_seconds: float = 30 * 24 * 3600,
+        max_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            db_path: SQLite database file (created if missing)
+            ttl_seconds: Entries older than this are treated as misses
+            max_bytes: Least recently used entries are evicted above this size
+        """
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_created ON responses (created_at)"
+        )
+        # The total size is kept up to date by triggers, so eviction never
+        # has to scan the table and every process sharing the file agrees
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS response_totals (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                total_bytes INTEGER NOT NULL
+            )""")
+        self._conn.execute(
+            "INSERT OR IGNORE INTO response_totals (id, total_bytes) "
+            "SELECT 0, COALESCE(SUM(size), 0) FROM responses"
+        )
+        self._conn.executescript("""
+            CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses
+            BEGIN
+                UPDATE response_totals SET total_bytes = total_bytes + new.size;
+            END;
+            CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses
+            BEGIN
+                UPDATE response_totals SET total_bytes = total_bytes - old.size;
+            END;
+            CREATE TRIGGER IF NOT EXISTS responses_update
+            AFTER UPDATE OF size ON responses
+            BEGIN
+                UPDATE response_totals
+                SET total_bytes = total_bytes - old.size + new.size;
+            END;
+            """)
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response for a key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ?, hit_count = hit_count + 1 "
+                "WHERE key = ?",
+                (now, key),
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        """Store a response and evict old entries if over the size limit."""
+        payload = json.dumps(response)
+        now = time.time()
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE: REPLACE deletes the
+            # old row without firing the delete trigger
+            self._conn.execute(
+                """INSERT INTO responses (key, response, size, created_at, accessed_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (key) DO UPDATE SET
+                       response = excluded.response,
+                       size = excluded.size,
+                       created_at = excluded.created_at,
+                       accessed_at = excluded.accessed_at,
+                       hit_count = 0""",
+                (key, payload, len(payload), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def stats(self) -> ResponseCacheStats:
+        """Return hit/miss counters for this process and totals for the database."""
+        with self._lock:
+            entries, total, lifetime_hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hit_count), 0) "
+                "FROM responses"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "total_bytes": total,
+            "lifetime_hits": lifetime_hits,
+        }
+
+    def clear(self) -> None:
+        """Delete every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self) -> None:
+        """Drop expired entries, then least recently used ones over max_bytes.
+
+        Runs in the caller's transaction. Both steps use an index, and the
+        size check reads the trigger-maintained total.
+        """
+        self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,),
+        )
+        total = self._total_bytes()
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses "
+                "ORDER BY accessed_at ASC, rowid ASC LIMIT 32"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute(
+            "SELECT total_bytes FROM response_totals WHERE id = 0"
+        ).fetchone()[0]
@@ -0,0 +1,373 @@
+"""Client-side rate limiting, retries and adaptive concurrency for API calls."""
+
+import asyncio
+import math
+import random
+import threading
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Mapping,
+    Optional,
+    Tuple,
+    TypedDict,
+    TypeVar,
+)
+from .config import Config
+from .history import estimate_tokens
+
+T = TypeVar("T")
+
+# Rough input-token cost of one image at the model's effective resolution
+IMAGE_TOKENS = 1600
+
+# HTTP statuses worth retrying: rate limited, overloaded, transient server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Response headers that report the server-side token buckets
+LIMIT_HEADERS = {
+    "requests": "anthropic-ratelimit-requests",
+    "input_tokens": "anthropic-ratelimit-input-tokens",
+    "output_tokens": "anthropic-ratelimit-output-tokens",
+}
+
+
+class SchedulerStats(TypedDict):
+    """Type definition for scheduler statistics."""
+
+    requests: int
+    retries: int
+    rate_limited: int
+    waited_seconds: float
+    in_flight: int
+    concurrency_limit: float
+
+
+def estimate_request(params: Dict[str, Any]) -> Tuple[int, int]:
+    """Estimate (input tokens, maximum output tokens) of a Messages request."""
+    images = 0
+    text_tokens = estimate_tokens(params.get("system") or "")
+    for message in params.get("messages", []):
+        text_tokens += estimate_tokens(message["content"])
+        if not isinstance(message["content"], str):
+            images += sum(
+                1
+                for block in message["content"]
+                if isinstance(block, dict) and block.get("type") == "image"
+            )
+    return text_tokens + images * IMAGE_TOKENS, int(params.get("max_tokens", 0))
+
+
+class TokenBucket:
+    """A bucket refilled continuously at ``capacity`` per minute."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.capacity / 60)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` tokens are available (0 if they are now)."""
+        self._refill(now)
+        # A request larger than the whole bucket only waits for a full bucket
+        needed = min(amount, self.capacity) - self.tokens
+        return max(0.0, needed * 60 / self.capacity) if self.capacity else 0.0
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= amount
+
+    def give(self, amount: float, now: float) -> None:
+        """Return unused tokens, e.g. after an estimate turned out too high."""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def observe(self, limit: float, remaining: float, now: float) -> None:
+        """Align with the server's view of this bucket."""
+        self._refill(now)
+        if limit > 0:
+            self.capacity = float(limit)
+        self.tokens = min(self.tokens, float(remaining))
+
+
+class RequestScheduler:
+    """Admits API calls within request and token budgets, retrying failures.
+
+    Each call reserves one request plus its estimated input and output tokens
+    from per-minute token buckets before it is sent, and settles the
+    reservation against the actual usage afterwards. Limits reported in
+    ``anthropic-ratelimit-*`` response headers replace the configured ones.
+    Rate-limit and overload errors are retried with jittered exponential
+    backoff, honouring ``retry-after``; while a retry-after is pending no
+    other call is admitted. The number of calls in flight grows by about one
+    per window of successes and halves on every rate-limit error (AIMD).
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        input_tokens_per_minute: Optional[float] = None,
+        output_tokens_per_minute: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+    ) -> None:
+        """Initialize the scheduler; unset arguments default to Config values."""
+        self.buckets: Dict[str, TokenBucket] = {
+            "requests": TokenBucket(requests_per_minute or Config.RATE_LIMIT_RPM),
+            "input_tokens": TokenBucket(
+                input_tokens_per_minute or Config.RATE_LIMIT_INPUT_TPM
+            ),
+            "output_tokens": TokenBucket(
+                output_tokens_per_minute or Config.RATE_LIMIT_OUTPUT_TPM
+            ),
+        }
+        self.max_concurrency = max_concurrency or Config.MAX_CONCURRENCY
+        self.max_retries = Config.MAX_RETRIES if max_retries is None else max_retries
+        self.base_delay = base_delay or Config.RETRY_BASE_DELAY
+        self.max_delay = max_delay or Config.RETRY_MAX_DELAY
+
+        self.concurrency_limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.waited_seconds = 0.0
+        # Typical output size, so reservations are not always max_tokens
+        self._output_estimate: Optional[float] = None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def call(
+        self,
+        send: Callable[[], Tuple[T, Mapping[str, str]]],
+        params: Dict[str, Any],
+    ) -> T:
+        """Send a request through the scheduler.
+
+        Args:
+            send: Performs the request, returning the message and the
+                response headers
+            params: The request parameters, used to estimate token cost
+
+        Returns:
+            The message returned by ``send``
+        """
+        reservation = self._reservation(params)
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            while True:
+                with self._lock:
+                    wait = self._try_acquire(reservation)
+                    if wait == 0:
+                        break
+                    self._released.wait(wait)
+            self._waited(time.monotonic() - start)
+
+            try:
+                message, headers = send()
+            except Exception as e:
+                delay = self._failed(e, reservation, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled or interrupted: the slot must not leak
+                self._abandoned(reservation)
+                raise
+            self._succeeded(message, headers, reservation)
+            return message
+        raise AssertionError("unreachable")
+
+    async def acall(
+        self,
+        send: Callable[[], Awaitable[Tuple[T, Mapping[str, str]]]],
+        params: Dict[str, Any],
+    ) -> T:
+        """Asyncio variant of ``call``; ``send`` returns an awaitable."""
+        reservation = self._reservation(params)
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            while True:
+                with self._lock:
+                    wait = self._try_acquire(reservation)
+                if wait == 0:
+                    break
+                await asyncio.sleep(wait)
+            self._waited(time.monotonic() - start)
+
+            try:
+                message, headers = await send()
+            except Exception as e:
+                delay = self._failed(e, reservation, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled or interrupted: the slot must not leak
+                self._abandoned(reservation)
+                raise
+            self._succeeded(message, headers, reservation)
+            return message
+        raise AssertionError("unreachable")
+
+    def stats(self) -> SchedulerStats:
+        """Return counters and the current concurrency limit."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "waited_seconds": round(self.waited_seconds, 3),
+                "in_flight": self.in_flight,
+                "concurrency_limit": round(self.concurrency_limit, 2),
+            }
+
+    def _reservation(self, params: Dict[str, Any]) -> Dict[str, float]:
+        input_tokens, max_tokens = estimate_request(params)
+        with self._lock:
+            output = max_tokens
+            if self._output_estimate is not None:
+                output = min(max_tokens, math.ceil(self._output_estimate))
+        return {"requests": 1, "input_tokens": input_tokens, "output_tokens": output}
+
+    def _try_acquire(self, reservation: Dict[str, float]) -> float:
+        """Reserve capacity if available; otherwise return seconds to wait.
+
+        Must be called with the lock held.
+        """
+        now = time.monotonic()
+        wait = self._paused_until - now
+        for name, bucket in self.buckets.items():
+            wait = max(wait, bucket.wait_time(reservation[name], now))
+        if wait > 0:
+            return wait
+        if self.in_flight >= max(1, math.floor(self.concurrency_limit)):
+            # Woken early by a release; the timeout is only a safety net
+            return 0.05
+        for name, bucket in self.buckets.items():
+            bucket.take(reservation[name], now)
+        self.in_flight += 1
+        return 0
+
+    def _waited(self, seconds: float) -> None:
+        with self._lock:
+            self.waited_seconds += seconds
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._released.notify_all()
+
+    def _succeeded(
+        self, message: Any, headers: Mapping[str, str], reservation: Dict[str, float]
+    ) -> None:
+        usage = getattr(message, "usage", None)
+        now = time.monotonic()
+        with self._lock:
+            self._release()
+            self.requests += 1
+            self.concurrency_limit = min(
+                float(self.max_concurrency),
+                self.concurrency_limit + 1 / self.concurrency_limit,
+            )
+            if usage is not None:
+                actual = {
+                    "input_tokens": (usage.input_tokens or 0)
+                    + (getattr(usage, "cache_creation_input_tokens", None) or 0),
+                    "output_tokens": usage.output_tokens or 0,
+                }
+                for name, used in actual.items():
+                    self.buckets[name].give(reservation[name] - used, now)
+                self._output_estimate = (
+                    actual["output_tokens"]
+                    if self._output_estimate is None
+                    else 0.8 * self._output_estimate + 0.2 * actual["output_tokens"]
+                )
+            self._observe(headers, now)
+
+    def _abandoned(self, reservation: Dict[str, float]) -> None:
+        """Release a call that was cancelled or interrupted mid-send."""
+        now = time.monotonic()
+        with self._lock:
+            self._release()
+            self.buckets["input_tokens"].give(reservation["input_tokens"], now)
+            self.buckets["output_tokens"].give(reservation["output_tokens"], now)
+
+    def _failed(
+        self, error: Exception, reservation: Dict[str, float], attempt: int
+    ) -> Optional[float]:
+        """Release a failed call; return the retry delay, or None to give up."""
+        status = getattr(error, "status_code", None)
+        retryable = status in RETRYABLE_STATUS or (
+            status is None and _is_connection_error(error)
+        )
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        if headers.get("x-should-retry") == "false":
+            retryable = False
+        elif headers.get("x-should-retry") == "true":
+            retryable = True
+
+        now = time.monotonic()
+        with self._lock:
+            self._release()
+            # The request never ran, so its tokens were not spent
+            self.buckets["input_tokens"].give(reservation["input_tokens"], now)
+            self.buckets["output_tokens"].give(reservation["output_tokens"], now)
+            if not retryable or attempt >= self.max_retries:
+                return None
+
+            self.retries += 1
+            delay = _retry_after(headers)
+            if delay is None:
+                backoff = min(self.max_delay, self.base_delay * 2**attempt)
+                delay = random.uniform(backoff / 2, backoff)
+            if status == 429:
+                self.rate_limited += 1
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+                # Hold every caller back, not just this one, to avoid a storm
+                self._paused_until = max(self._paused_until, now + delay)
+            self._observe(headers, now)
+            return delay
+
+    def _observe(self, headers: Mapping[str, str], now: float) -> None:
+        """Update buckets from ``anthropic-ratelimit-*`` headers."""
+        for name, prefix in LIMIT_HEADERS.items():
+            limit = headers.get(f"{prefix}-limit")
+            remaining = headers.get(f"{prefix}-remaining")
+            if limit is None or remaining is None:
+                continue
+            try:
+                self.buckets[name].observe(float(limit), float(remaining), now)
+            except ValueError:
+                continue
+
+
+def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Parse ``retry-after-ms`` or ``retry-after`` (seconds) from headers."""
+    for header, scale in (("retry-after-ms", 1000), ("retry-after", 1)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) / scale)
+        except ValueError:
+            continue
+    return None
+
+
+def _is_connection_error(error: Exception) -> bool:
+    import anthropic
+
+    return isinstance(error, anthropic.APIConnectionError)
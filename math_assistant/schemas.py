@@ -0,0 +1,273 @@
+"""Tool schemas for structured (JSON) responses.
+
+Requests built by ``prompts`` can be turned into structured requests with
+``structured_request``: the model is made to answer by calling a tool whose
+input schema describes the result, and ``tool_result`` returns that input as
+a plain dict. No text has to be parsed.
+"""
+
+from typing import Any, Dict, List, Literal, Optional, TypedDict
+from .exceptions import APIError
+
+Tool = Dict[str, Any]
+StructuredKind = Literal["explain", "practice", "check"]
+
+
+class Step(TypedDict):
+    """Type definition for one step of a worked solution."""
+
+    description: str
+    work: str
+
+
+class Explanation(TypedDict):
+    """Type definition for a structured explanation."""
+
+    concepts: List[str]
+    steps: List[Step]
+    answer: str
+    key_points: List[str]
+    common_mistakes: List[str]
+
+
+class PracticeProblem(TypedDict):
+    """Type definition for one generated practice problem."""
+
+    statement: str
+    solution: str
+    difficulty: Literal["easier", "similar", "harder"]
+    concepts: List[str]
+
+
+class PracticeSet(TypedDict):
+    """Type definition for a structured set of practice problems."""
+
+    problems: List[PracticeProblem]
+
+
+class StepFeedback(TypedDict):
+    """Type definition for feedback on one step of a student's solution."""
+
+    step: str
+    correct: bool
+    score: float
+    feedback: str
+
+
+class SolutionFeedback(TypedDict):
+    """Type definition for structured feedback on a student's solution."""
+
+    correct: bool
+    score: float
+    steps: List[StepFeedback]
+    suggestions: List[str]
+    alternative_methods: List[str]
+    conceptual_understanding: str
+
+
+def _strings(description: str) -> Dict[str, Any]:
+    return {"type": "array", "items": {"type": "string"}, "description": description}
+
+
+def _score(description: str) -> Dict[str, Any]:
+    return {"type": "number", "minimum": 0, "maximum": 1, "description": description}
+
+
+EXPLANATION_TOOL: Tool = {
+    "name": "record_explanation",
+    "description": "Record the explanation of the math problem in the image.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "concepts": _strings("Concepts being tested"),
+            "steps": {
+                "type": "array",
+                "description": "Step-by-step solution, in order",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "description": {
+                            "type": "string",
+                            "description": "What is done in this step and why",
+                        },
+                        "work": {
+                            "type": "string",
+                            "description": "The mathematics of this step",
+                        },
+                    },
+                    "required": ["description", "work"],
+                },
+            },
+            "answer": {"type": "string", "description": "The final answer"},
+            "key_points": _strings("Key points to remember"),
+            "common_mistakes": _strings("Common mistakes to avoid"),
+        },
+        "required": ["concepts", "steps", "answer", "key_points", "common_mistakes"],
+    },
+}
+
+PRACTICE_TOOL: Tool = {
+    "name": "record_practice_problems",
+    "description": "Record practice problems similar to the one in the image.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "problems": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "statement": {"type": "string"},
+                        "solution": {
+                            "type": "string",
+                            "description": "Complete worked solution",
+                        },
+                        "difficulty": {
+                            "type": "string",
+                            "enum": ["easier", "similar", "harder"],
+                            "description": "Difficulty compared to the original",
+                        },
+                        "concepts": _strings("Key concepts being tested"),
+                    },
+                    "required": ["statement", "solution", "difficulty", "concepts"],
+                },
+            }
+        },
+        "required": ["problems"],
+    },
+}
+
+CHECK_TOOL: Tool = {
+    "name": "record_solution_feedback",
+    "description": "Record the review of the student's solution.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "correct": {
+                "type": "boolean",
+                "description": "Whether the final answer is correct",
+            },
+            "score": _score("Overall correctness, from 0 (wrong) to 1 (correct)"),
+            "steps": {
+                "type": "array",
+                "description": "Feedback on each step of the student's solution",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "step": {
+                            "type": "string",
+                            "description": "The student's step",
+                        },
+                        "correct": {"type": "boolean"},
+                        "score": _score("Correctness of this step"),
+                        "feedback": {"type": "string"},
+                    },
+                    "required": ["step", "correct", "score", "feedback"],
+                },
+            },
+            "suggestions": _strings("Suggestions for improvement"),
+            "alternative_methods": _strings("Alternative solution methods"),
+            "conceptual_understanding": {
+                "type": "string",
+                "description": "Assessment of the student's conceptual understanding",
+            },
+        },
+        "required": [
+            "correct",
+            "score",
+            "steps",
+            "suggestions",
+            "alternative_methods",
+            "conceptual_understanding",
+        ],
+    },
+}
+
+TOOLS: Dict[str, Tool] = {
+    "explain": EXPLANATION_TOOL,
+    "practice": PRACTICE_TOOL,
+    "check": CHECK_TOOL,
+}
+
+
+def structured_request(params: Dict[str, Any], kind: StructuredKind) -> Dict[str, Any]:
+    """Return a copy of a request that must answer through the kind's tool."""
+    tool = TOOLS[kind]
+    return {
+        **params,
+        "tools": [tool],
+        "tool_choice": {"type": "tool", "name": tool["name"]},
+    }
+
+
+def _schema_errors(value: Any, schema: Dict[str, Any], path: str) -> List[str]:
+    """Return where ``value`` breaks the subset of JSON Schema used by TOOLS."""
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(value, dict):
+            return [f"{path} is not an object"]
+        errors = [
+            f"{path}.{key} is missing"
+            for key in schema.get("required", [])
+            if key not in value
+        ]
+        for key, subschema in schema.get("properties", {}).items():
+            if key in value:
+                errors += _schema_errors(value[key], subschema, f"{path}.{key}")
+        return errors
+    if kind == "array":
+        if not isinstance(value, list):
+            return [f"{path} is not an array"]
+        errors = []
+        for index, item in enumerate(value):
+            errors += _schema_errors(item, schema.get("items", {}), f"{path}[{index}]")
+        return errors
+    if kind == "string" and not isinstance(value, str):
+        return [f"{path} is not a string"]
+    if kind == "boolean" and not isinstance(value, bool):
+        return [f"{path} is not a boolean"]
+    if kind == "number":
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return [f"{path} is not a number"]
+        if not schema.get("minimum", value) <= value <= schema.get("maximum", value):
+            return [f"{path} is out of range"]
+    if "enum" in schema and value not in schema["enum"]:
+        return [f"{path} is not one of {schema['enum']}"]
+    return []
+
+
+def tool_result(
+    content: Any, kind: StructuredKind, stop_reason: Optional[str] = None
+) -> Dict[str, Any]:
+    """Return the input of the kind's tool call from response content.
+
+    Args:
+        content: Response content blocks
+        kind: Which structured result the request asked for
+        stop_reason: The response's stop reason, if known
+
+    Raises:
+        APIError: If the response does not call the tool, was cut off at
+            max_tokens, or its input does not match the tool's schema
+    """
+    if stop_reason == "max_tokens":
+        raise APIError(f"Structured {kind} result was cut off at max_tokens")
+    tool = TOOLS[kind]
+    name = tool["name"]
+    for block in content or []:
+        if isinstance(block, dict):
+            if block.get("type") == "tool_use" and block.get("name") == name:
+                result = dict(block["input"])
+                break
+        elif getattr(block, "type", None) == "tool_use" and block.name == name:
+            result = dict(block.input)
+            break
+    else:
+        raise APIError(f"Response did not include a structured {kind} result")
+    errors = _schema_errors(result, tool["input_schema"], kind)
+    if errors:
+        raise APIError(
+            f"Structured {kind} result does not match its schema: "
+            + "; ".join(errors[:3])
+        )
+    return result
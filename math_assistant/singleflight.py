@@ -0,0 +1,127 @@
+"""Coalescing of identical concurrent calls into a single execution."""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Generic, Tuple, TypedDict, TypeVar
+
+T = TypeVar("T")
+
+# Result of a call whose leader was cancelled; followers retry on seeing it
+_ABANDONED = object()
+
+
+class SingleFlightStats(TypedDict):
+    """Type definition for coalescing statistics."""
+
+    in_flight: int
+    coalesced: int
+
+
+class _Call(Generic[T]):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share it.
+
+    The first caller for a key (the leader) runs the function. Callers that
+    arrive while it is running wait and receive the same result or
+    exception. Once the call finishes the key is forgotten, so later calls
+    run again; this is coalescing, not caching.
+    """
+
+    def __init__(self) -> None:
+        self.coalesced = 0
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], T]) -> Tuple[T, bool]:
+        """Run ``func`` once for all concurrent callers with the same key.
+
+        Returns:
+            The result, and whether it was shared from another caller's call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> SingleFlightStats:
+        """Return the number of calls in flight and of coalesced callers."""
+        with self._lock:
+            return {"in_flight": len(self._calls), "coalesced": self.coalesced}
+
+
+class AsyncSingleFlight:
+    """Asyncio counterpart of SingleFlight for callers on one event loop.
+
+    Cancelling the leader cancels only the leader: a waiting follower takes
+    over and runs the call itself.
+    """
+
+    def __init__(self) -> None:
+        self.coalesced = 0
+        self._calls: Dict[str, "asyncio.Future[Any]"] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Await ``func`` once for all concurrent callers with the same key.
+
+        Returns:
+            The result, and whether it was shared from another caller's call
+        """
+        future = self._calls.get(key)
+        while future is not None:
+            self.coalesced += 1
+            # Shield so a cancelled follower does not cancel the leader
+            result = await asyncio.shield(future)
+            if result is not _ABANDONED:
+                return result, True
+            # The leader was cancelled: the first follower back runs the call
+            self.coalesced -= 1
+            future = self._calls.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            # Only this caller was cancelled; hand the call to a follower
+            future.set_result(_ABANDONED)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited error is not logged
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> SingleFlightStats:
+        """Return the number of calls in flight and of coalesced callers."""
+        return {"in_flight": len(self._calls), "coalesced": self.coalesced}
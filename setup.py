@@ -15,6 +15,10 @@ setup(
         "rich>=10.0.0",
         "click>=8.0.0",
     ],
+    extras_require={
+        # Symbolic comparison of final answers in check_solution
+        "cas": ["sympy>=1.12"],
+    },
     entry_points={
         "console_scripts": [
             "math-assist=math_assistant.__main__:run_cli",
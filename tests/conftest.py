@@ -0,0 +1,38 @@
+import pytest
+from math_assistant.config import Config
+from math_assistant.image_processor import ImageProcessor
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep on-disk caches out of the user's home directory."""
+    monkeypatch.setattr(Config, "CACHE_DIR", tmp_path / "cache")
+    ImageProcessor.set_cache(None)
+    yield tmp_path / "cache"
+    ImageProcessor.set_cache(None)
+
+
+@pytest.fixture
+def image_file(tmp_path):
+    """A small synthetic problem image."""
+    from PIL import Image
+
+    path = tmp_path / "problem.jpg"
+    Image.new("RGB", (320, 240), "white").save(path)
+    return path
+
+
+@pytest.fixture
+def make_assistant(monkeypatch):
+    """Factory for a MathAssistant wired to an offline fake client."""
+    from math_assistant.math_assistant import MathAssistant
+    from tests.fakes import FakeClient
+
+    monkeypatch.setattr(Config, "ANTHROPIC_API_KEY", "test-key")
+
+    def factory(text="42", **kwargs):
+        assistant = MathAssistant(**kwargs)
+        assistant.client = FakeClient(text)
+        return assistant
+
+    return factory
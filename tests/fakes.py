@@ -0,0 +1,193 @@
+"""Offline stand-ins for the Anthropic client used by unit tests."""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+from anthropic.types import Message
+
+
+def make_message(text: str = "42", **usage: int) -> Message:
+    """Build a Messages API response containing a single text block."""
+    return Message.model_validate(
+        {
+            "id": "msg_test",
+            "type": "message",
+            "role": "assistant",
+            "model": "test-model",
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 10, "output_tokens": 5, **usage},
+        }
+    )
+
+
+def make_tool_message(name: str, tool_input: Dict[str, Any]) -> Message:
+    """Build a Messages API response that calls a single tool."""
+    return Message.model_validate(
+        {
+            "id": "msg_test",
+            "type": "message",
+            "role": "assistant",
+            "model": "test-model",
+            "content": [
+                {
+                    "type": "tool_use",
+                    "id": "toolu_test",
+                    "name": name,
+                    "input": tool_input,
+                }
+            ],
+            "stop_reason": "tool_use",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 10, "output_tokens": 5},
+        }
+    )
+
+
+class FakeMessages:
+    """Records requests and returns canned responses.
+
+    Exceptions queued in ``errors`` are raised, one per call, before any
+    response is returned; ``headers`` are reported as response headers.
+    Requests that force a tool get a call to it with ``tool_input``.
+    """
+
+    def __init__(self, text: str = "42") -> None:
+        self.text = text
+        self.tool_input: Dict[str, Any] = {}
+        self.calls: List[Dict[str, Any]] = []
+        self.errors: List[Exception] = []
+        self.headers: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _record(self, params: Dict[str, Any]) -> None:
+        with self._lock:
+            self.calls.append(params)
+            error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+
+    def create(self, **params: Any) -> Message:
+        self._record(params)
+        if "tool_choice" in params:
+            return make_tool_message(params["tool_choice"]["name"], self.tool_input)
+        return make_message(self.text)
+
+    def stream(self, **params: Any) -> "FakeStream":
+        self._record({**params, "stream": True})
+        return FakeStream(self.text, self.headers)
+
+    @property
+    def with_raw_response(self) -> "FakeRawMessages":
+        return FakeRawMessages(self)
+
+
+class FakeRawResponse:
+    """Mimics the SDK's raw response wrapper."""
+
+    def __init__(self, message: Message, headers: Dict[str, str]) -> None:
+        self.message = message
+        self.headers = headers
+
+    def parse(self) -> Message:
+        return self.message
+
+
+class FakeRawMessages:
+    """``messages.with_raw_response`` for FakeMessages."""
+
+    def __init__(self, messages: FakeMessages) -> None:
+        self.messages = messages
+
+    def create(self, **params: Any) -> FakeRawResponse:
+        return FakeRawResponse(self.messages.create(**params), self.messages.headers)
+
+
+class FakeStream:
+    """Context manager mimicking ``MessageStreamManager``."""
+
+    def __init__(self, text: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.text = text
+        self.response = FakeRawResponse(make_message(text), headers or {})
+        self.text_stream = iter(
+            text.split(" ")[:1] + [" " + w for w in text.split(" ")[1:]]
+        )
+
+    def __enter__(self) -> "FakeStream":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+    def get_final_message(self) -> Message:
+        return make_message(self.text)
+
+
+class FakeClient:
+    """Minimal replacement for ``anthropic.Anthropic``."""
+
+    def __init__(self, text: str = "42") -> None:
+        self.messages = FakeMessages(text)
+
+
+class AsyncFakeMessages(FakeMessages):
+    """Async variant of FakeMessages that yields to the event loop."""
+
+    async def create(self, **params: Any) -> Message:  # type: ignore[override]
+        import asyncio
+
+        await asyncio.sleep(0)
+        return super().create(**params)
+
+    def stream(self, **params: Any) -> "AsyncFakeStream":  # type: ignore[override]
+        self._record({**params, "stream": True})
+        return AsyncFakeStream(self.text, self.headers)
+
+    @property
+    def with_raw_response(self) -> "AsyncFakeRawMessages":  # type: ignore[override]
+        return AsyncFakeRawMessages(self)
+
+
+class AsyncFakeStream(FakeStream):
+    """Async context manager mimicking ``AsyncMessageStreamManager``."""
+
+    def __init__(self, text: str, headers: Optional[Dict[str, str]] = None) -> None:
+        super().__init__(text, headers)
+        chunks = list(self.text_stream)
+
+        async def text_stream() -> Any:
+            for chunk in chunks:
+                yield chunk
+
+        self.text_stream = text_stream()
+
+    async def __aenter__(self) -> "AsyncFakeStream":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        pass
+
+    async def get_final_message(self) -> Message:  # type: ignore[override]
+        return make_message(self.text)
+
+
+class AsyncFakeRawResponse(FakeRawResponse):
+    async def parse(self) -> Message:  # type: ignore[override]
+        return self.message
+
+
+class AsyncFakeRawMessages(FakeRawMessages):
+    async def create(self, **params: Any) -> AsyncFakeRawResponse:  # type: ignore[override]
+        message = await self.messages.create(**params)
+        return AsyncFakeRawResponse(message, self.messages.headers)
+
+
+class AsyncFakeClient:
+    """Minimal replacement for ``anthropic.AsyncAnthropic``."""
+
+    def __init__(self, text: str = "42") -> None:
+        self.messages = AsyncFakeMessages(text)
+
+    async def close(self) -> None:
+        pass
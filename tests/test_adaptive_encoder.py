@@ -0,0 +1,58 @@
+import base64
+import pytest
+from PIL import Image, ImageDraw
+from math_assistant.config import Config
+from math_assistant.image_processor import ImageProcessor
+
+
+class TestAdaptiveEncoder:
+    @pytest.fixture
+    def photo(self, tmp_path):
+        path = tmp_path / "photo.jpg"
+        Image.effect_noise((2400, 1800), 50).convert("RGB").save(path, quality=90)
+        return path
+
+    @pytest.fixture
+    def scan(self, tmp_path):
+        path = tmp_path / "scan.png"
+        img = Image.new("RGB", (2000, 1500), "white")
+        draw = ImageDraw.Draw(img)
+        for row in range(0, 1500, 40):
+            draw.text((20, row), "2x + 3 = 11, so x = 4", fill="black")
+        img.save(path)
+        return path
+
+    def test_fits_byte_and_pixel_budget(self, photo):
+        result = ImageProcessor.process_image_adaptive(
+            photo, max_bytes=100_000, max_pixels=500_000
+        )
+        assert result["bytes"] <= 100_000
+        assert len(base64.b64decode(result["data"])) == result["bytes"]
+        assert result["size"][0] * result["size"][1] <= 500_000
+        assert result["media_type"] == "image/jpeg"
+
+    def test_line_art_uses_png(self, scan):
+        result = ImageProcessor.process_image_adaptive(scan)
+        assert result["media_type"] == "image/png"
+
+    def test_rgba_is_flattened(self, tmp_path):
+        path = tmp_path / "alpha.png"
+        Image.new("RGBA", (300, 200), (255, 0, 0, 128)).save(path)
+        result = ImageProcessor.process_image_adaptive(path)
+        assert result["bytes"] > 0
+
+    def test_report_shows_savings(self, photo):
+        report = ImageProcessor.encoding_report(photo)
+        assert report["saved_bytes"] == (
+            report["standard_bytes"] - report["adaptive_bytes"]
+        )
+        assert report["saved_bytes"] > 0
+
+    def test_assistant_sends_adaptive_media_type(
+        self, make_assistant, scan, monkeypatch
+    ):
+        monkeypatch.setattr(Config, "IMAGE_ENCODER", "adaptive")
+        assistant = make_assistant()
+        assistant.explain_problem(scan)
+        image = assistant.client.messages.calls[0]["messages"][0]["content"][0]
+        assert image["source"]["media_type"] == "image/png"
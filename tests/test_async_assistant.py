@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from PIL import Image
+from math_assistant import AsyncMathAssistant
+from math_assistant.config import Config
+from math_assistant.exceptions import ImageProcessingError
+from math_assistant.packing import PACK_HEADER
+from tests.fakes import AsyncFakeClient
+
+
+class TestAsyncMathAssistant:
+    @pytest.fixture
+    def assistant(self, monkeypatch):
+        monkeypatch.setattr(Config, "ANTHROPIC_API_KEY", "test-key")
+        assistant = AsyncMathAssistant(use_cache=False)
+        assistant.client = AsyncFakeClient("x = 3")
+        return assistant
+
+    def test_explain_problem(self, assistant, image_file):
+        explanation = asyncio.run(assistant.explain_problem(image_file))
+        assert "x = 3" in explanation
+
+    def test_concurrent_requests(self, assistant, image_file):
+        async def run_all():
+            return await asyncio.gather(
+                *(assistant.check_solution(image_file, f"x = {i}") for i in range(5))
+            )
+
+        results = asyncio.run(run_all())
+        assert all("x = 3" in result for result in results)
+        assert len(assistant.client.messages.calls) == 5
+
+    def test_conversation_keeps_history(self, assistant, image_file):
+        async def converse():
+            await assistant.ask_about_problem(image_file, "Why?", format_style="basic")
+            await assistant.continue_conversation("And then?", format_style="basic")
+
+        asyncio.run(converse())
+        roles = [m["role"] for m in assistant.get_conversation_history()]
+        assert roles == ["user", "assistant", "user", "assistant"]
+
+    def test_conversation_streams(self, assistant, image_file, capsys):
+        async def converse():
+            await assistant.ask_about_problem(
+                image_file, "Why?", format_style="pretty", stream=True
+            )
+            return await assistant.continue_conversation(
+                "And then?", format_style="pretty", stream=True
+            )
+
+        response = asyncio.run(converse())
+        assert response[0].text == "x = 3"
+        assert capsys.readouterr().out == "x = 3\nx = 3\n"
+        assert all(call["stream"] for call in assistant.client.messages.calls)
+        assert assistant.last_time_to_first_token is not None
+        assert len(assistant.get_conversation_history()) == 4
+
+    def test_packed_explanations(self, assistant, tmp_path):
+        images = []
+        for i in range(3):
+            images.append(tmp_path / f"p{i}.jpg")
+            Image.new("RGB", (100 + i, 100), "white").save(images[-1])
+        assistant.client.messages.text = "\n".join(
+            f"{PACK_HEADER.format(i)}\nx = {i}" for i in (1, 2)
+        )
+
+        explanations = asyncio.run(assistant.explain_problems(images, pack_size=2))
+        assert explanations[:2] == ["x = 1", "x = 2"]
+        assert assistant.get_packing_stats() == {
+            "packed_requests": 1,
+            "packed_problems": 2,
+            "single_requests": 1,
+        }
+
+    def test_invalid_image_path(self, assistant):
+        with pytest.raises(ImageProcessingError):
+            asyncio.run(assistant.explain_problem("nonexistent.jpg"))
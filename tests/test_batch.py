@@ -0,0 +1,74 @@
+import json
+import threading
+import time
+import pytest
+from PIL import Image
+from math_assistant.batch import BatchRunner, find_images
+
+
+class TestBatchRunner:
+    @pytest.fixture
+    def image_dir(self, tmp_path):
+        directory = tmp_path / "scans"
+        directory.mkdir()
+        for i in range(3):
+            Image.new("RGB", (100 + i, 100), "white").save(directory / f"p{i}.jpg")
+        (directory / "notes.md").write_text("not an image")
+        return directory
+
+    def test_find_images_filters_and_sorts(self, image_dir):
+        assert [p.name for p in find_images(image_dir)] == ["p0.jpg", "p1.jpg", "p2.jpg"]
+
+    def test_explain_writes_one_output_per_image(
+        self, make_assistant, image_dir, tmp_path
+    ):
+        assistant = make_assistant(text="The answer is 4")
+        runner = BatchRunner(assistant, "explain", tmp_path / "out", concurrency=2)
+        completed = []
+        results = runner.run(find_images(image_dir), on_complete=completed.append)
+
+        assert len(completed) == 3
+        assert all(r["status"] == "ok" for r in results)
+        assert len(assistant.client.messages.calls) == 3
+        for result in results:
+            with open(result["output"], encoding="utf-8") as f:
+                assert "The answer is 4" in f.read()
+
+        summary = json.loads((tmp_path / "out" / "summary.json").read_text())
+        assert summary["succeeded"] == 3
+
+    def test_check_requires_solution_file(self, make_assistant, image_dir, tmp_path):
+        (image_dir / "p0.txt").write_text("x = 2")
+        runner = BatchRunner(make_assistant(), "check", tmp_path / "out")
+        results = runner.run(find_images(image_dir))
+        assert [r["status"] for r in results] == ["ok", "error", "error"]
+
+    def test_results_are_reported_while_images_are_still_preprocessing(
+        self, make_assistant, image_dir, tmp_path
+    ):
+        images = find_images(image_dir)
+        runner = BatchRunner(make_assistant(), "explain", tmp_path / "out")
+        run_group = runner.run_group
+        first_done = threading.Event()
+        completed = []
+        reported_before_last = []
+
+        def finish_group(group):
+            results = run_group(group)
+            first_done.set()
+            return results
+
+        def preprocessed(images):
+            yield images[0]
+            # The first request finishes while the next image is encoding
+            assert first_done.wait(timeout=5)
+            time.sleep(0.05)
+            yield images[1]
+            reported_before_last.append(len(completed))
+            yield images[2]
+
+        runner.run_group = finish_group
+        runner._preprocessed = preprocessed
+        results = runner.run(images, on_complete=completed.append)
+        assert reported_before_last == [1]
+        assert all(r["status"] == "ok" for r in results)
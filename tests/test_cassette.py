@@ -0,0 +1,166 @@
+import asyncio
+import json
+import pytest
+from click.testing import CliRunner
+from math_assistant import cassette as cassette_module
+from math_assistant.cassette import (
+    Cassette,
+    CassetteClient,
+    CassetteMessages,
+    cassette_client,
+)
+from math_assistant.cli import main
+from math_assistant.config import Config
+from math_assistant.exceptions import APIError, ConfigurationError
+from math_assistant.math_assistant import MathAssistant
+from tests.fakes import FakeMessages
+
+
+@pytest.fixture
+def drop_api_key(monkeypatch):
+    """Call to remove the API key from the environment and Config."""
+
+    def drop():
+        monkeypatch.setattr(Config, "ANTHROPIC_API_KEY", None)
+        monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+
+    return drop
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record replay delays instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(cassette_module.time, "sleep", delays.append)
+    return delays
+
+
+def recorder(path, text, monkeypatch):
+    """A MathAssistant recording the offline fake client's answers."""
+    monkeypatch.setattr(Config, "ANTHROPIC_API_KEY", "test-key")
+    assistant = MathAssistant(api_key="test-key", use_cache=False)
+    fake = FakeMessages(text)
+    fake.headers = {"anthropic-ratelimit-requests-limit": "50", "x-request-id": "r"}
+    assistant.client = CassetteClient(
+        CassetteMessages(Cassette(path), "record", messages=fake)
+    )
+    return assistant, fake
+
+
+class TestCassette:
+    def test_record_then_replay_without_network(
+        self, tmp_path, image_file, monkeypatch, drop_api_key
+    ):
+        path = tmp_path / "session.jsonl"
+        assistant, fake = recorder(path, "Divide both sides by 2", monkeypatch)
+        assistant.explain_problem(image_file)
+        assert len(fake.calls) == 1
+
+        (line,) = path.read_text().splitlines()
+        interaction = json.loads(line)
+        assert "sha256:" in json.dumps(interaction) or "base64" not in line
+        assert interaction["headers"] == {"anthropic-ratelimit-requests-limit": "50"}
+        assert len(line) < 2000
+
+        drop_api_key()
+        replayer = MathAssistant(cassette=path, replay_latency=0, use_cache=False)
+        assert "Divide both sides by 2" in replayer.explain_problem(image_file)
+
+    def test_replay_scales_the_recorded_latency(
+        self, tmp_path, image_file, sleeps, monkeypatch
+    ):
+        path = tmp_path / "session.jsonl"
+        recorder(path, "x = 4", monkeypatch)[0].explain_problem(image_file)
+        lines = path.read_text().splitlines()
+        interaction = json.loads(lines[0])
+        interaction["latency"] = 2.0
+        path.write_text(json.dumps(interaction) + "\n")
+
+        for scale, expected in ((1.0, 2.0), (0.25, 0.5), (0.0, 0.0)):
+            sleeps.clear()
+            MathAssistant(
+                api_key="test-key", cassette=path, replay_latency=scale
+            ).explain_problem(image_file)
+            assert sleeps == [expected]
+
+    def test_streams_replay_with_recorded_timing(
+        self, tmp_path, image_file, sleeps, monkeypatch
+    ):
+        path = tmp_path / "session.jsonl.gz"
+        assistant, _ = recorder(path, "First subtract three then divide", monkeypatch)
+        chunks = []
+        assistant.explain_problem(image_file, format_output=False)
+        assistant._get_explanation(image_file, "Show every step", on_text=chunks.append)
+
+        replayer = MathAssistant(api_key="test-key", cassette=path, replay_latency=1)
+        replayed = []
+        replayer._get_explanation(
+            image_file, "Show every step", on_text=replayed.append
+        )
+        assert "".join(replayed) == "".join(chunks)
+        assert len(replayed) == len(chunks)
+        assert len(sleeps) == len(chunks)
+
+    def test_repeated_requests_replay_in_order(
+        self, tmp_path, image_file, sleeps, monkeypatch
+    ):
+        path = tmp_path / "session.jsonl"
+        assistant, fake = recorder(path, "Problem set A", monkeypatch)
+        assistant.generate_similar_problems(image_file, format_output=False)
+        fake.text = "Problem set B"
+        assistant.generate_similar_problems(image_file, format_output=False)
+
+        replayer = MathAssistant(api_key="test-key", cassette=path)
+        texts = [
+            replayer.generate_similar_problems(image_file, format_output=False)[0].text
+            for _ in range(3)
+        ]
+        assert texts == ["Problem set A", "Problem set B", "Problem set A"]
+
+    def test_unrecorded_request_fails(self, tmp_path, image_file, drop_api_key):
+        drop_api_key()
+        replayer = MathAssistant(cassette=tmp_path / "empty.jsonl", use_cache=False)
+        with pytest.raises(APIError, match="record it first"):
+            replayer.explain_problem(image_file)
+
+    def test_async_replay(self, tmp_path, image_file, monkeypatch, drop_api_key):
+        from math_assistant.async_assistant import AsyncMathAssistant
+
+        path = tmp_path / "session.jsonl"
+        recorder(path, "x = 4", monkeypatch)[0].explain_problem(image_file)
+        drop_api_key()
+
+        async def run():
+            async with AsyncMathAssistant(
+                cassette=path, replay_latency=0, use_cache=False
+            ) as assistant:
+                return await assistant.explain_problem(image_file)
+
+        assert asyncio.run(run()) == "x = 4"
+
+    def test_async_transport_does_not_stream(self, tmp_path):
+        client = cassette_client(tmp_path / "c.jsonl", "replay", asynchronous=True)
+        with pytest.raises(ConfigurationError, match="needs MathAssistant"):
+            client.messages.stream(model="m", max_tokens=1, messages=[])
+
+    def test_cli_replay_needs_no_api_key(
+        self, tmp_path, image_file, monkeypatch, drop_api_key
+    ):
+        path = tmp_path / "session.jsonl"
+        recorder(path, "Subtract 3", monkeypatch)[0].explain_problem(image_file)
+        drop_api_key()
+        result = CliRunner().invoke(
+            main,
+            [
+                "--replay",
+                str(path),
+                "--replay-latency",
+                "0",
+                "explain",
+                str(image_file),
+                "--format",
+                "basic",
+            ],
+        )
+        assert result.exit_code == 0, result.output
+        assert "Subtract 3" in result.output
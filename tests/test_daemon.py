@@ -0,0 +1,113 @@
+import threading
+import pytest
+from click.testing import CliRunner
+from math_assistant import daemon
+from math_assistant.cli import main
+from math_assistant.config import Config
+from math_assistant.exceptions import ImageProcessingError
+from math_assistant.formatters import ResponseFormatter
+
+
+class TestDaemon:
+    @pytest.fixture
+    def server(self, make_assistant, tmp_path, monkeypatch):
+        monkeypatch.setattr(Config, "DAEMON_SOCKET", tmp_path / "daemon.sock")
+        assistant = make_assistant(text="Subtract 3, then divide by 2")
+        server = daemon.DaemonServer(assistant, idle_timeout=0)
+        thread = threading.Thread(target=server.serve, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        thread.join(timeout=5)
+
+    def test_not_running_without_a_socket(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Config, "DAEMON_SOCKET", tmp_path / "missing.sock")
+        assert not daemon.is_running()
+        with pytest.raises(daemon.DaemonUnavailable):
+            daemon.request({"command": "ping"})
+
+    def test_explain_reuses_the_warm_assistant(self, server, image_file):
+        payload = {"command": "explain", "image": str(image_file)}
+        first = daemon.request(payload)
+        second = daemon.request(payload)
+
+        assert first["text"] == second["text"] == "Subtract 3, then divide by 2"
+        status = daemon.request({"command": "status"})
+        assert status["requests"] == 2
+        assert status["image_cache"]["hits"] >= 1
+        assert len(server.assistant.client.messages.calls) == 2
+
+    def test_explain_streams_chunks(self, server, image_file):
+        chunks = []
+        result = daemon.request(
+            {"command": "explain", "image": str(image_file), "stream": True},
+            on_text=chunks.append,
+        )
+        assert len(chunks) > 1
+        assert "".join(chunks) == result["text"]
+
+    def test_errors_are_reraised_by_type(self, server, tmp_path):
+        with pytest.raises(ImageProcessingError):
+            daemon.request({"command": "explain", "image": str(tmp_path / "x.png")})
+
+    def test_cli_forwards_to_the_daemon(self, server, image_file, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        result = CliRunner().invoke(
+            main, ["explain", str(image_file), "--format", "basic"]
+        )
+        assert result.exit_code == 0
+        assert "Subtract 3, then divide by 2" in result.output
+        assert server.requests == 1
+
+    def test_cli_basic_output_matches_in_process(self, server, image_file, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        text = "Step 1:\n    Subtract 3\\nStep 2:   divide by 2\n\n"
+        server.assistant.client.messages.text = text
+        result = CliRunner().invoke(
+            main, ["explain", str(image_file), "--format", "basic"]
+        )
+        assert result.exit_code == 0
+        assert result.output == ResponseFormatter.clean_text(text) + "\n"
+
+    def test_shutdown_removes_the_socket(self, server):
+        daemon.request({"command": "shutdown"})
+        for _ in range(50):
+            if not server.path.exists():
+                break
+            threading.Event().wait(0.1)
+        assert not server.path.exists()
+        assert not daemon.is_running()
+
+
+class TestOfflineCommands:
+    @pytest.fixture(autouse=True)
+    def no_api_key(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+        monkeypatch.setattr(Config, "ANTHROPIC_API_KEY", None)
+        monkeypatch.setattr(Config, "DAEMON_SOCKET", tmp_path / "missing.sock")
+
+    @pytest.mark.parametrize(
+        "args",
+        [
+            ["cache"],
+            ["inspect", "{image}"],
+            ["answer", "{image}", "x = 4"],
+            ["answer", "{image}"],
+            ["daemon", "status"],
+            ["daemon", "stop"],
+        ],
+    )
+    def test_runs_without_an_api_key(self, args, image_file):
+        args = [arg.format(image=image_file) for arg in args]
+        result = CliRunner().invoke(main, args)
+        assert "API Key" not in result.output
+        # `daemon status` exits 1 when no daemon is running
+        assert result.exit_code == (1 if args == ["daemon", "status"] else 0)
+
+    def test_daemon_start_needs_an_api_key(self, monkeypatch):
+        started = []
+        monkeypatch.setattr(daemon, "start_background", started.append)
+        result = CliRunner().invoke(main, ["daemon", "start"])
+        assert result.exit_code == 1
+        assert "API Key" in result.output
+        assert not started
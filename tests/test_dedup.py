@@ -0,0 +1,75 @@
+import random
+import pytest
+from PIL import Image, ImageDraw, ImageEnhance
+from math_assistant.dedup import DedupIndex, hamming
+from math_assistant.image_processor import ImageProcessor
+
+
+def worksheet(path, seed=0):
+    """Draw a page of 'handwriting' strokes, different for each seed."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", (800, 1000), "white")
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = rng.randrange(50, 650), rng.randrange(50, 900)
+        draw.rectangle([x, y, x + rng.randrange(40, 150), y + 25], fill="black")
+    img.save(path)
+    return path
+
+
+class TestPerceptualHash:
+    def test_retaken_photos_are_close(self, tmp_path):
+        original = worksheet(tmp_path / "a.jpg")
+        with Image.open(original) as img:
+            retaken = ImageEnhance.Brightness(img.rotate(1, fillcolor="white"))
+            retaken.enhance(0.8).crop((8, 10, 795, 990)).save(tmp_path / "b.jpg")
+        other = worksheet(tmp_path / "c.jpg", seed=1)
+
+        a = ImageProcessor.perceptual_hash(original)
+        assert hamming(a, ImageProcessor.perceptual_hash(tmp_path / "b.jpg")) <= 6
+        assert hamming(a, ImageProcessor.perceptual_hash(other)) > 12
+
+
+class TestDedupIndex:
+    @pytest.fixture
+    def index(self, tmp_path):
+        index = DedupIndex(tmp_path / "dedup.sqlite3", max_distance=6)
+        yield index
+        index.close()
+
+    def test_finds_the_closest_hash_within_the_distance(self, index, image_file):
+        rng = random.Random(0)
+        for _ in range(200):
+            index.add(rng.getrandbits(64), "explain", image_file, {"n": 0})
+        target = (1 << 63) | 0xF0F0
+        index.add(target, "explain", image_file, {"n": 1})
+        index.add(target ^ 0b111, "explain", image_file, {"n": 2})
+
+        match = index.lookup(target ^ 0b1, "explain")
+        assert (match["distance"], match["response"]) == (1, {"n": 1})
+        assert index.lookup(target ^ 0xFF00, "explain") is None
+        assert index.lookup(target, "explain-structured") is None
+        assert index.stats()["reused"] == 1
+
+
+class TestAssistantReuse:
+    def test_near_duplicate_reuses_the_explanation(self, make_assistant, tmp_path):
+        original = worksheet(tmp_path / "a.jpg")
+        with Image.open(original) as img:
+            ImageEnhance.Brightness(img).enhance(0.9).save(tmp_path / "b.jpg")
+        assistant = make_assistant(text="x = 4", dedup=True)
+
+        first = assistant.explain_problem(original)
+        second = assistant.explain_problem(tmp_path / "b.jpg")
+
+        assert first == second
+        assert len(assistant.client.messages.calls) == 1
+        assert assistant.reused_from(original) is None
+        provenance = assistant.reused_from(tmp_path / "b.jpg")
+        assert provenance["image"] == str(original.resolve())
+
+    def test_questions_are_not_reused(self, make_assistant, image_file):
+        assistant = make_assistant(dedup=True)
+        assistant.explain_problem(image_file, "Why?")
+        assistant.explain_problem(image_file, "Why?")
+        assert assistant.dedup_index.stats()["entries"] == 0
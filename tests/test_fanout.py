@@ -0,0 +1,148 @@
+import asyncio
+from math_assistant.config import Config
+from math_assistant.fanout import (
+    ProblemMerger,
+    join_problems,
+    plan_slices,
+    problem_key,
+    split_problems,
+)
+from math_assistant.packing import PACK_HEADER
+from math_assistant.prompts import DIFFICULTY_TARGETS
+from tests.fakes import make_message
+
+
+def slice_text(difficulty, count):
+    """Practice text whose first problem is the same in every slice."""
+    statements = ["Solve x + 1 = 2"] + [
+        f"Solve {difficulty} {n}x = {n}" for n in range(1, count)
+    ]
+    return "\n\n".join(
+        f"{PACK_HEADER.format(n)}\n{statement}\n\nSolution\nx = 1"
+        for n, statement in enumerate(statements, 1)
+    )
+
+
+def respond_by_difficulty(messages):
+    """Make the fake client answer with a slice matching the requested target."""
+
+    def create(**params):
+        messages._record(params)
+        prompt = params["messages"][0]["content"][-1]["text"]
+        difficulty = next(d for d, t in DIFFICULTY_TARGETS.items() if t in prompt)
+        count = int(prompt.split()[1])
+        return make_message(slice_text(difficulty, count))
+
+    messages.create = create
+
+
+class TestPlanning:
+    def test_slices_are_even_and_span_difficulties(self):
+        assert plan_slices(8, 3) == [(3, "easier"), (3, "similar"), (2, "harder")]
+        assert plan_slices(6, 3) == [(3, "easier"), (3, "harder")]
+        assert plan_slices(2, 3) == [(2, "similar")]
+
+    def test_split_and_join_round_trip(self):
+        problems = ["A\nSolution\n1", "B\nSolution\n2"]
+        assert split_problems("Intro\n" + join_problems(problems)) == problems
+        assert split_problems("No headers") == ["No headers"]
+
+    def test_key_ignores_formatting_and_solution(self):
+        assert problem_key("**Solve  X+1=2**\nSolution\nx = 1") == problem_key(
+            "solve x+1=2\n\n2. Complete solution\nx=1, done"
+        )
+        assert problem_key("Solve x+1=2") != problem_key("Solve x-1=2")
+
+    def test_merger_numbers_in_arrival_order(self):
+        merger = ProblemMerger(problem_key)
+        assert merger.add(["A", "B"]) == [(1, "A"), (2, "B")]
+        assert merger.add(["b", "C"]) == [(3, "C")]
+        assert merger.duplicates == 1
+
+
+class TestFanOut:
+    def test_small_requests_use_one_call(self, make_assistant, image_file):
+        assistant = make_assistant(text=slice_text("similar", 3))
+        assistant.generate_similar_problems(image_file, num_problems=3)
+        assert len(assistant.client.messages.calls) == 1
+
+    def test_large_requests_are_split_merged_and_renumbered(
+        self, make_assistant, image_file
+    ):
+        assistant = make_assistant()
+        respond_by_difficulty(assistant.client.messages)
+        text = assistant.generate_similar_problems(
+            image_file, num_problems=8, format_output=False
+        )[0].text
+
+        calls = assistant.client.messages.calls
+        assert len(calls) == 3
+        prompts = " ".join(c["messages"][0]["content"][-1]["text"] for c in calls)
+        assert all(target in prompts for target in DIFFICULTY_TARGETS.values())
+
+        problems = split_problems(text)
+        # Each slice repeats 'Solve x + 1 = 2'; only one copy is kept
+        assert len(problems) == 6
+        assert sum("x + 1 = 2" in p for p in problems) == 1
+        assert [line for line in text.splitlines() if "Problem" in line] == [
+            PACK_HEADER.format(n) for n in range(1, 7)
+        ]
+
+    def test_problems_print_as_slices_complete(
+        self, make_assistant, image_file, monkeypatch, capsys
+    ):
+        monkeypatch.setattr(Config, "PRACTICE_FANOUT_THRESHOLD", 2)
+        monkeypatch.setattr(Config, "PRACTICE_SLICE_SIZE", 2)
+        assistant = make_assistant()
+        respond_by_difficulty(assistant.client.messages)
+        assert (
+            assistant.generate_similar_problems(
+                image_file, num_problems=4, format_style="pretty"
+            )
+            is None
+        )
+        output = capsys.readouterr().out
+        assert [line for line in output.splitlines() if "Similar Problem" in line] == [
+            "Similar Problem 1",
+            "Similar Problem 2",
+            "Similar Problem 3",
+        ]
+
+    def test_structured_slices_are_merged(self, make_assistant, image_file):
+        assistant = make_assistant()
+        problem = {
+            "statement": "Solve x + 1 = 2",
+            "solution": "x = 1",
+            "difficulty": "similar",
+            "concepts": ["linear equations"],
+        }
+        assistant.client.messages.tool_input = {"problems": [problem]}
+        result = assistant.generate_similar_problems(
+            image_file, num_problems=6, structured=True
+        )
+        assert len(assistant.client.messages.calls) == 2
+        assert result == {"problems": [problem]}
+
+    def test_async_fan_out(self, monkeypatch, image_file):
+        from math_assistant.async_assistant import AsyncMathAssistant
+        from tests.fakes import AsyncFakeClient
+
+        monkeypatch.setattr(Config, "ANTHROPIC_API_KEY", "test-key")
+
+        async def run():
+            async with AsyncMathAssistant() as assistant:
+                assistant.client = AsyncFakeClient()
+                messages = assistant.client.messages
+                respond_by_difficulty(messages)
+                sync_create = messages.create
+
+                async def create(**params):
+                    return sync_create(**params)
+
+                messages.create = create
+                return await assistant.generate_similar_problems(
+                    image_file, num_problems=8, format_output=False
+                )
+
+        text = asyncio.run(run())[0].text
+        assert len(split_problems(text)) == 6
@@ -0,0 +1,51 @@
+from math_assistant.history import (
+    SUMMARY_PREFIX,
+    content_text,
+    history_tokens,
+    split_history,
+)
+from tests.fakes import make_message
+
+
+def exchange(n, size=400):
+    return [
+        {"role": "user", "content": f"question {n} " + "x" * size},
+        {"role": "assistant", "content": make_message(f"answer {n}").content},
+    ]
+
+
+class TestHistory:
+    def test_content_text_handles_blocks(self):
+        blocks = make_message("hello").content
+        assert content_text(blocks) == "hello"
+        assert content_text([{"type": "text", "text": "hi"}]) == "hi"
+
+    def test_split_keeps_recent_turns(self):
+        history = exchange(1) + exchange(2) + exchange(3)
+        older, recent = split_history(history, keep_turns=2)
+        assert len(older) == 2
+        assert recent[0]["content"].startswith("question 2")
+
+    def test_history_within_budget_is_untouched(self, make_assistant):
+        assistant = make_assistant(history_token_budget=10_000)
+        assistant.conversation_history = exchange(1)
+        assert assistant.compact_history() is False
+
+    def test_compaction_summarizes_older_turns(self, make_assistant, image_file):
+        assistant = make_assistant(
+            text="the summary", history_token_budget=150, history_keep_turns=1
+        )
+        assistant.ask_about_problem(image_file, "q0", format_style="basic")
+        assistant.conversation_history += exchange(1) + exchange(2)
+        before = history_tokens(assistant.conversation_history)
+
+        assistant.continue_conversation("next?", format_style="basic")
+
+        history = assistant.conversation_history
+        assert history[0]["content"].startswith(SUMMARY_PREFIX)
+        assert "the summary" in history[0]["content"]
+        assert history[2]["content"].startswith("question 2")
+        assert assistant.history_tokens() < before
+        # The image moved to the summary turn and is still sent
+        last_request = assistant.client.messages.calls[-1]
+        assert last_request["messages"][0]["content"][0]["type"] == "image"
@@ -0,0 +1,74 @@
+import os
+import pytest
+from PIL import Image
+from math_assistant.image_cache import ImageCache
+from math_assistant.image_processor import ImageProcessor
+
+
+class TestImageCache:
+    @pytest.fixture
+    def image_file(self, tmp_path):
+        path = tmp_path / "problem.jpg"
+        Image.new("RGB", (300, 200), "white").save(path)
+        return path
+
+    def test_process_image_hits_memory_cache(self, image_file):
+        first = ImageProcessor.process_image(image_file)
+        second = ImageProcessor.process_image(image_file)
+        stats = ImageProcessor.get_cache().stats()
+        assert first == second
+        assert stats["misses"] == 1
+        assert stats["hits"] == 1
+
+    def test_disk_tier_survives_new_cache(self, image_file, tmp_path):
+        cache_dir = tmp_path / "images"
+        ImageProcessor.set_cache(ImageCache(cache_dir=cache_dir))
+        first = ImageProcessor.process_image(image_file)
+
+        ImageProcessor.set_cache(ImageCache(cache_dir=cache_dir))
+        second = ImageProcessor.process_image(image_file)
+        assert first == second
+        assert ImageProcessor.get_cache().stats()["disk_hits"] == 1
+
+    def test_changed_file_is_reencoded(self, image_file):
+        first, _ = ImageProcessor.process_image(image_file)
+        Image.new("RGB", (400, 100), "black").save(image_file)
+        second, size = ImageProcessor.process_image(image_file)
+        assert first != second
+        assert size == (400, 100)
+
+    def test_parameters_are_part_of_key(self, image_file):
+        ImageProcessor.process_image(image_file, quality=95)
+        ImageProcessor.process_image(image_file, quality=50)
+        assert ImageProcessor.get_cache().stats()["misses"] == 2
+
+    def test_memory_tier_respects_byte_cap(self):
+        cache = ImageCache(max_memory_bytes=10)
+        cache.put("a", "12345", (1, 1))
+        cache.put("b", "67890", (1, 1))
+        cache.put("c", "abcde", (1, 1))
+        assert cache.get("a") is None
+        assert cache.get("c") == ("abcde", (1, 1), "image/jpeg")
+        assert cache.stats()["memory_bytes"] <= 10
+
+    def test_disk_tier_prunes_oldest_entries(self, tmp_path):
+        cache_dir = tmp_path / "images"
+        ImageCache(cache_dir=cache_dir).put("probe", "x" * 60, (1, 1))
+        entry_bytes = (cache_dir / "probe.json").stat().st_size
+        (cache_dir / "probe.json").unlink()
+        cap = int(entry_bytes * 3.5)
+
+        cache = ImageCache(cache_dir=cache_dir, max_disk_bytes=cap)
+        for i, key in enumerate("abc"):
+            cache.put(key, "x" * 60, (1, 1))
+            # Distinct, increasing mtimes regardless of filesystem resolution
+            os.utime(cache_dir / f"{key}.json", (1000 + i, 1000 + i))
+        cache.put("d", "x" * 60, (1, 1))
+
+        remaining = sorted(path.stem for path in cache_dir.glob("*.json"))
+        assert remaining == ["b", "c", "d"]
+        assert sum(path.stat().st_size for path in cache_dir.glob("*.json")) <= cap
+
+        fresh = ImageCache(cache_dir=cache_dir, max_disk_bytes=cap)
+        assert fresh.get("a") is None
+        assert fresh.get("b") is not None
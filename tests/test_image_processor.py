@@ -32,3 +32,37 @@ class TestImageProcessor:
     def test_process_image_resize(self, test_image):
         encoded, size = ImageProcessor.process_image(test_image)
         assert max(size) <= 2048  # Max size from config
+
+    @pytest.fixture
+    def large_photo(self, tmp_path):
+        from PIL import Image
+
+        path = tmp_path / "large.jpg"
+        gradient = Image.linear_gradient("L").resize((5000, 3750))
+        Image.merge("RGB", (gradient, gradient.rotate(90), gradient)).save(path)
+        return path
+
+    def test_process_image_large_jpeg_uses_scaled_decode(self, large_photo):
+        _, size = ImageProcessor.process_image(large_photo)
+        assert max(size) == 2048
+        assert size == (2048, 1536)
+
+    def test_check_image_reads_header_only(self, large_photo, tmp_path):
+        truncated = tmp_path / "truncated.jpg"
+        truncated.write_bytes(large_photo.read_bytes()[:2048])
+        info = ImageProcessor.check_image(truncated)
+        assert info["dimensions"] == (5000, 3750)
+
+    def test_estimate_file_size_uses_proxy(self, large_photo):
+        estimate = ImageProcessor.estimate_file_size(large_photo)
+        encoded, _ = ImageProcessor.process_image(large_photo)
+        actual = len(encoded) * 3 // 4
+        assert 0.5 * actual < estimate < 2 * actual
+
+    def test_process_image_rgba_png(self, tmp_path):
+        from PIL import Image
+
+        path = tmp_path / "alpha.png"
+        Image.new("RGBA", (200, 100), (0, 0, 255, 100)).save(path)
+        encoded, size = ImageProcessor.process_image(path)
+        assert size == (200, 100)
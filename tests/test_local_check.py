@@ -0,0 +1,118 @@
+import pytest
+from math_assistant import local_check
+from math_assistant.local_check import ReferenceAnswers, compare_answers, final_answer
+
+
+class TestCompareAnswers:
+    @pytest.mark.parametrize(
+        "student, reference, verdict",
+        [
+            ("x = 4", "4", "match"),
+            ("2(x + 1)", "2x + 2", "match"),
+            ("0.75", "3/4", "match"),
+            ("2√3", "sqrt(12)", "match"),
+            ("x = -2 or x = 2", "2, -2", "match"),
+            ("5", "4", "mismatch"),
+            ("2", "x = 2 or x = -2", "mismatch"),
+            ("0.333", "1/3", None),
+            ("x^2", "x^3", None),
+            ("the answer is four", "4", None),
+            ("x <= 4", "x >= 4", None),
+            ("x ≥ 4", "x = 4", None),
+            ("x != 4", "x = 4", None),
+            ("x ≠ 4", "4", None),
+            ("x = 2 and y = 3", "x = 3, y = 2", "mismatch"),
+            ("y = 3, x = 2", "x = 2 and y = 3", "match"),
+            ("y = 4", "x = 4", None),
+            ("1,000", "1000", "match"),
+            ("x = 1,500", "1500", "match"),
+            ("2(4) + 3 = 11", "11", None),
+        ],
+    )
+    def test_symbolic(self, student, reference, verdict):
+        pytest.importorskip("sympy")
+        assert compare_answers(student, reference) == verdict
+
+    def test_numbers_without_sympy(self, monkeypatch):
+        monkeypatch.setattr(local_check, "_sympy", lambda: None)
+        assert compare_answers("x = 6/8", "3/4") == "match"
+        assert compare_answers("1/2", "3/4") == "mismatch"
+        assert compare_answers("2x + 2", "2(x + 1)") is None
+
+    @pytest.mark.parametrize(
+        "answer", ["x = 9^9^9", "x = 2^(9^99)", "((9^99)^99)^99", "1e999999999"]
+    )
+    def test_huge_numbers_are_left_to_the_model(self, answer):
+        pytest.importorskip("sympy")
+        assert compare_answers(answer, "x = 4") is None
+        assert compare_answers("x = 4", answer) is None
+
+    def test_huge_numbers_without_sympy(self, monkeypatch):
+        monkeypatch.setattr(local_check, "_sympy", lambda: None)
+        assert compare_answers("1e999999999", "4") is None
+        assert compare_answers("1" * 5000, "4") is None
+        assert compare_answers("1e5", "100000") == "match"
+
+    def test_final_answer_is_the_last_line(self):
+        work = "2x + 3 = 11\n2x = 8\n\nTherefore x = 4.\n"
+        assert final_answer(work) == "x = 4"
+        assert final_answer("Final answer: $\\boxed{12}$") == "12"
+        assert final_answer("work\nx = 2 or x = -2") == "x = 2 or x = -2"
+
+    def test_working_on_the_last_line_is_not_an_answer(self):
+        assert final_answer("2x + 3 = 11\n2(4) + 3 = 11") is None
+        assert final_answer("x = 4\n12") is None
+        assert final_answer("Let me check: it works") is None
+
+
+class TestLocalCheck:
+    def test_user_answers_win_over_explanations(self, tmp_path, image_file):
+        answers = ReferenceAnswers(tmp_path / "answers.sqlite3")
+        answers.put(image_file, "4")
+        answers.put(image_file, "5", source="explanation")
+        assert answers.get(image_file) == "4"
+
+    def test_clear_answers_skip_the_api(self, make_assistant, image_file):
+        assistant = make_assistant(text="Model feedback")
+        assistant.set_reference_answer(image_file, "x = 4")
+
+        correct = assistant.check_solution(image_file, "2x = 8\nx = 4")
+        wrong = assistant.check_solution(image_file, "2x = 8\nx = 16")
+
+        assert correct.startswith("Correct")
+        assert wrong.startswith("Not quite")
+        assert assistant.client.messages.calls == []
+        stats = assistant.get_check_stats()
+        assert (stats["matches"], stats["mismatches"]) == (1, 1)
+        assert stats["local_fraction"] == 1.0
+
+    def test_unclear_answers_go_to_the_model(self, make_assistant, image_file):
+        assistant = make_assistant(text="Model feedback")
+        assistant.set_reference_answer(image_file, "x = 4")
+
+        assert "Model feedback" in assistant.check_solution(image_file, "I think 4ish")
+        assert "Model feedback" in assistant.check_solution(
+            image_file, "x = 4", step_feedback=True
+        )
+        assert len(assistant.client.messages.calls) == 2
+        assert assistant.get_check_stats()["local_fraction"] == 0
+
+    def test_structured_explanations_provide_the_reference(
+        self, make_assistant, image_file
+    ):
+        assistant = make_assistant()
+        assistant.client.messages.tool_input = {
+            "concepts": [],
+            "steps": [],
+            "answer": "x = 4",
+            "key_points": [],
+            "common_mistakes": [],
+        }
+        assistant.explain_problem(image_file, structured=True)
+        assert assistant.local_checker.answers.get(image_file) == "x = 4"
+
+    def test_can_be_disabled(self, make_assistant, image_file):
+        assistant = make_assistant(local_check=False)
+        assert assistant.get_check_stats() is None
+        assistant.check_solution(image_file, "x = 4")
+        assert len(assistant.client.messages.calls) == 1
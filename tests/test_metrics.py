@@ -0,0 +1,121 @@
+import json
+import pytest
+from click.testing import CliRunner
+from math_assistant.cli import main
+from math_assistant.image_processor import ImageProcessor
+from math_assistant.metrics import METRICS, STAGE_SECONDS, MetricsRegistry
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    METRICS.reset()
+    yield
+    METRICS.reset()
+
+
+class TestRegistry:
+    def test_percentiles(self):
+        registry = MetricsRegistry()
+        for value in range(1, 101):
+            registry.observe("latency", value / 1000)
+        (summary,) = registry.histograms()
+        assert summary["count"] == 100
+        assert (summary["p50"], summary["p95"], summary["p99"]) == (0.05, 0.095, 0.099)
+
+    def test_percentiles_use_recent_samples(self):
+        registry = MetricsRegistry(max_samples=10)
+        for value in [100.0] * 10 + [1.0] * 10:
+            registry.observe("latency", value)
+        (summary,) = registry.histograms()
+        assert summary["count"] == 20
+        assert summary["p99"] == 1.0
+
+    def test_span_counts_errors(self):
+        registry = MetricsRegistry()
+        with pytest.raises(ValueError):
+            with registry.span("image.decode"):
+                raise ValueError("corrupt")
+        assert registry.stage("image.decode")["count"] == 1
+        assert registry.counters() == [
+            {
+                "name": "stage_errors_total",
+                "labels": {"stage": "image.decode"},
+                "value": 1,
+            }
+        ]
+
+    def test_disabled_registry_records_nothing(self):
+        registry = MetricsRegistry(enabled=False)
+        with registry.span("api.request"):
+            pass
+        registry.increment("responses_total")
+        assert registry.histograms() == [] and registry.counters() == []
+
+    def test_prometheus_text(self):
+        registry = MetricsRegistry()
+        registry.observe(STAGE_SECONDS, 0.25, stage="api.request")
+        registry.increment("stop_reasons_total", reason="end_turn")
+        text = registry.to_prometheus()
+        assert "# TYPE math_assistant_stage_seconds summary" in text
+        assert (
+            'math_assistant_stage_seconds{stage="api.request",quantile="0.95"} 0.25'
+            in text
+        )
+        assert 'math_assistant_stage_seconds_count{stage="api.request"} 1' in text
+        assert "# TYPE math_assistant_stop_reasons_total counter" in text
+        assert 'math_assistant_stop_reasons_total{reason="end_turn"} 1' in text
+
+    def test_export_by_suffix(self, tmp_path):
+        registry = MetricsRegistry()
+        registry.observe(STAGE_SECONDS, 0.5, stage="format.rich")
+        registry.export(tmp_path / "metrics.jsonl")
+        registry.export(tmp_path / "metrics.prom")
+
+        records = [
+            json.loads(line)
+            for line in (tmp_path / "metrics.jsonl").read_text().splitlines()
+        ]
+        assert records[0]["type"] == "histogram"
+        assert records[0]["labels"] == {"stage": "format.rich"}
+        assert "quantile" in (tmp_path / "metrics.prom").read_text()
+
+
+class TestInstrumentation:
+    def test_explain_records_stages_and_usage(self, make_assistant, image_file):
+        assistant = make_assistant(text="x = 2")
+        assistant.explain_problem(image_file)
+
+        for stage in (
+            "assistant.explain",
+            "image.process",
+            "image.decode",
+            "image.resize",
+            "image.jpeg_encode",
+            "image.base64",
+            "format.clean_text",
+        ):
+            assert METRICS.stage(stage)["count"] >= 1, stage
+        counters = {
+            (c["name"], tuple(c["labels"].values())): c["value"]
+            for c in METRICS.counters()
+        }
+        assert counters[("tokens_total", ("input_tokens",))] == 10
+        assert counters[("tokens_total", ("output_tokens",))] == 5
+        assert counters[("stop_reasons_total", ("end_turn",))] == 1
+        assert counters[("responses_total", ("api",))] == 1
+        assert assistant.last_stop_reason == "end_turn"
+
+    def test_image_cache_hits_skip_encoding_stages(self, image_file):
+        ImageProcessor.process_image(image_file)
+        ImageProcessor.process_image(image_file)
+        assert METRICS.stage("image.process")["count"] == 2
+        assert METRICS.stage("image.jpeg_encode")["count"] == 1
+
+    def test_cli_writes_metrics_on_exit(self, image_file, tmp_path, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        path = tmp_path / "metrics.prom"
+        result = CliRunner().invoke(
+            main, ["--metrics", str(path), "inspect", str(image_file)]
+        )
+        assert result.exit_code == 0
+        assert 'stage="image.decode"' in path.read_text()
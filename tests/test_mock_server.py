@@ -0,0 +1,122 @@
+import random
+import anthropic
+import pytest
+from math_assistant.loadtest import format_report, run_load_test
+from math_assistant.mock_server import LatencyModel, MockAPIServer
+from math_assistant.schemas import TOOLS
+
+MESSAGE = {
+    "model": "test-model",
+    "max_tokens": 40,
+    "messages": [{"role": "user", "content": "Solve 2x + 3 = 11"}],
+}
+
+
+@pytest.fixture
+def serve():
+    """Start mock servers that are closed after the test."""
+    servers = []
+
+    def factory(**kwargs):
+        kwargs.setdefault("latency", LatencyModel("fixed", 0.0))
+        kwargs.setdefault("tokens_per_second", 0)
+        server = MockAPIServer(seed=0, **kwargs).start()
+        servers.append(server)
+        return anthropic.Anthropic(api_key="k", base_url=server.url, max_retries=0)
+
+    yield factory
+    for server in servers:
+        server.close()
+
+
+class TestMockServer:
+    def test_message(self, serve):
+        client = serve(output_tokens=20)
+        raw = client.messages.with_raw_response.create(**MESSAGE)
+        message = raw.parse()
+        assert message.content[0].type == "text"
+        assert message.usage.output_tokens <= 40
+        assert len(message.content[0].text.split()) == message.usage.output_tokens
+        assert message.usage.input_tokens > 0
+        assert raw.headers["anthropic-ratelimit-requests-limit"] == "4000"
+
+    def test_stream_matches_final_message(self, serve):
+        client = serve(output_tokens=30)
+        with client.messages.stream(**MESSAGE) as stream:
+            chunks = list(stream.text_stream)
+            final = stream.get_final_message()
+        assert len(chunks) > 1
+        assert "".join(chunks) == final.content[0].text
+        assert final.stop_reason in ("end_turn", "max_tokens")
+
+    def test_forced_tool_call_fits_schema(self, serve):
+        client = serve()
+        tool = TOOLS["explain"]
+        message = client.messages.create(
+            **MESSAGE,
+            tools=[tool],
+            tool_choice={"type": "tool", "name": tool["name"]},
+        )
+        (block,) = message.content
+        assert block.type == "tool_use" and message.stop_reason == "tool_use"
+        assert set(block.input) == set(tool["input_schema"]["properties"])
+
+    def test_injected_errors(self, serve):
+        with pytest.raises(anthropic.RateLimitError) as error:
+            serve(rate_limit_rate=1.0, retry_after=3).messages.create(**MESSAGE)
+        assert error.value.response.headers["retry-after"] == "3"
+        with pytest.raises(anthropic.APIStatusError) as error:
+            serve(overload_rate=1.0).messages.create(**MESSAGE)
+        assert error.value.status_code == 529
+
+    def test_requests_per_minute_limit(self, serve):
+        client = serve(requests_per_minute=2)
+        client.messages.create(**MESSAGE)
+        client.messages.create(**MESSAGE)
+        with pytest.raises(anthropic.RateLimitError) as error:
+            client.messages.create(**MESSAGE)
+        assert int(error.value.response.headers["retry-after"]) > 0
+
+    @pytest.mark.parametrize(
+        "distribution", ["uniform", "normal", "lognormal", "exponential"]
+    )
+    def test_latency_distributions_have_the_requested_mean(self, distribution):
+        model = LatencyModel(distribution, mean=0.4, spread=0.5)
+        rng = random.Random(0)
+        samples = [model.sample(rng) for _ in range(20000)]
+        assert min(samples) >= 0
+        assert sum(samples) / len(samples) == pytest.approx(0.4, rel=0.05)
+
+
+class TestLoadTest:
+    def test_counts_operations_and_errors(self, make_assistant, image_file):
+        assistants = []
+
+        def create():
+            assistant = make_assistant(text="x = 4", use_cache=False)
+            if not assistants:
+                assistant.client.messages.errors.append(ValueError("boom"))
+            assistants.append(assistant)
+            return assistant
+
+        report = run_load_test(
+            image_file, concurrency=3, operations=12, create_assistant=create
+        )
+        assert len(assistants) == 3
+        assert report["operations"] == 12
+        assert report["errors"] == 1
+        assert report["error_rate"] == pytest.approx(1 / 12)
+        assert report["api_requests"] == 11
+        assert 0 < report["latency"]["p50"] <= report["latency"]["p99"]
+        assert "Errors: 1 (8.3%)" in format_report(report)
+
+    def test_conversation_is_three_turns(self, make_assistant, image_file):
+        report = run_load_test(
+            image_file,
+            workload="conversation",
+            concurrency=2,
+            operations=4,
+            create_assistant=lambda: make_assistant(use_cache=False),
+        )
+        assert report["errors"] == 0
+        assert report["api_requests"] == 12
@@ -0,0 +1,84 @@
+import json
+import pytest
+from PIL import Image
+from math_assistant.batch import BatchRunner, find_images
+from math_assistant.packing import PACK_HEADER, chunked, split_packed
+
+PACKED = "\n\n".join(f"{PACK_HEADER.format(n)}\nAnswer {n}: x = {n}" for n in (1, 2, 3))
+
+
+class TestSplitPacked:
+    def test_splits_in_problem_order(self):
+        sections = split_packed(PACKED, 3)
+        assert sections == {
+            0: "Answer 1: x = 1",
+            1: "Answer 2: x = 2",
+            2: "Answer 3: x = 3",
+        }
+
+    def test_tolerates_markdown_headers(self):
+        text = "Intro\n## **=== Problem 2 ===**\nB\n### === problem 1 ===\nA"
+        assert split_packed(text, 2) == {0: "A", 1: "B"}
+
+    def test_leaves_out_ambiguous_answers(self):
+        text = (
+            f"{PACK_HEADER.format(1)}\nA\n{PACK_HEADER.format(1)}\nA again\n"
+            f"{PACK_HEADER.format(2)}\n\n{PACK_HEADER.format(7)}\nG"
+        )
+        assert split_packed(text, 3) == {}
+
+    def test_drops_the_last_answer_when_truncated(self):
+        assert sorted(split_packed(PACKED, 3, truncated=True)) == [0, 1]
+
+    def test_chunked(self):
+        assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+class TestPackedExplanations:
+    @pytest.fixture
+    def images(self, tmp_path):
+        paths = []
+        for i in range(3):
+            path = tmp_path / f"p{i}.jpg"
+            Image.new("RGB", (100 + i, 100), "white").save(path)
+            paths.append(path)
+        return paths
+
+    def test_one_request_for_several_images(self, make_assistant, images):
+        assistant = make_assistant(text=PACKED)
+        explanations = assistant.explain_problems(images, pack_size=4)
+
+        assert explanations == [f"Answer {n}: x = {n}" for n in (1, 2, 3)]
+        calls = assistant.client.messages.calls
+        assert len(calls) == 1
+        content = calls[0]["messages"][0]["content"]
+        assert [block["type"] for block in content].count("image") == 3
+        assert assistant.get_packing_stats() == {
+            "packed_requests": 1,
+            "packed_problems": 3,
+            "single_requests": 0,
+        }
+
+    def test_falls_back_to_single_requests(self, make_assistant, images):
+        assistant = make_assistant(text="x = 4")
+        explanations = assistant.explain_problems(images, pack_size=3)
+
+        assert explanations == ["x = 4"] * 3
+        assert len(assistant.client.messages.calls) == 4
+        assert assistant.get_packing_stats()["single_requests"] == 3
+
+    def test_batch_reports_requests_per_problem(self, make_assistant, images, tmp_path):
+        runner = BatchRunner(
+            make_assistant(text=PACKED), "explain", tmp_path / "out", pack_size=3
+        )
+        results = runner.run(find_images(tmp_path))
+
+        assert all(r["status"] == "ok" for r in results)
+        with open(results[1]["output"], encoding="utf-8") as f:
+            assert "x = 2" in f.read()
+        summary = json.loads((tmp_path / "out" / "summary.json").read_text())
+        assert (summary["api_requests"], summary["requests_per_problem"]) == (1, 0.333)
+
+    def test_packing_is_explain_only(self, make_assistant, tmp_path):
+        with pytest.raises(ValueError):
+            BatchRunner(make_assistant(), "practice", tmp_path, pack_size=2)
@@ -0,0 +1,127 @@
+import threading
+import time
+import pytest
+from PIL import Image
+from math_assistant.prefetch import Prefetcher
+from tests.fakes import FakeStream
+
+
+class SlowStream(FakeStream):
+    """A stream that produces one word every 20ms until the test releases it."""
+
+    def __init__(self, text, headers=None, started=None):
+        super().__init__(text, headers)
+        words = list(self.text_stream)
+        self.started = started
+
+        def slow():
+            for word in words * 50:
+                if self.started:
+                    self.started.set()
+                time.sleep(0.02)
+                yield word
+
+        self.text_stream = slow()
+
+
+class TestPrefetcher:
+    @pytest.fixture
+    def other_image(self, tmp_path):
+        path = tmp_path / "other.jpg"
+        Image.new("RGB", (200, 200), "white").save(path)
+        return path
+
+    def test_practice_is_ready_for_the_loaded_image(self, make_assistant, image_file):
+        assistant = make_assistant(text="1. Solve 3x + 2 = 11")
+        prefetcher = Prefetcher(assistant)
+        prefetcher.start(image_file)
+
+        content = prefetcher.take("practice", image_file, timeout=5)
+        prefetcher.close()
+
+        assert "Solve 3x + 2 = 11" in content[0].text
+        practice_calls = assistant.client.messages.calls
+        assert practice_calls[0]["temperature"] == 0.7
+        assert practice_calls[0]["stream"] is True
+        assert prefetcher.stats()["used"] == 1
+
+    def test_explain_is_optional(self, make_assistant, image_file):
+        assistant = make_assistant()
+        prefetcher = Prefetcher(assistant, kinds=["explain"])
+        prefetcher.start(image_file)
+        assert prefetcher.take("explain", image_file, timeout=5) is not None
+        assert prefetcher.take("practice", image_file) is None
+        prefetcher.close()
+
+    def test_nothing_is_returned_for_another_image(
+        self, make_assistant, image_file, other_image
+    ):
+        prefetcher = Prefetcher(make_assistant())
+        prefetcher.start(image_file)
+        assert prefetcher.take("practice", other_image) is None
+        prefetcher.close()
+
+    def test_changing_the_image_stops_the_stream(
+        self, make_assistant, image_file, other_image
+    ):
+        assistant = make_assistant(text="one two three")
+        started = threading.Event()
+        assistant.client.messages.stream = lambda **params: SlowStream(
+            "one two three", started=started
+        )
+        prefetcher = Prefetcher(assistant)
+        prefetcher.start(image_file)
+        assert started.wait(5)
+
+        prefetcher.cancel()
+        for _ in range(100):
+            if prefetcher.stats()["cancelled"]:
+                break
+            time.sleep(0.02)
+        prefetcher.close()
+        assert prefetcher.stats()["cancelled"] == 1
+
+    def test_foreground_request_does_not_wait_on_a_prefetch(
+        self, make_assistant, image_file
+    ):
+        assistant = make_assistant(text="x = 4")
+        started = threading.Event()
+        assistant.client.messages.stream = lambda **params: SlowStream(
+            "x = 4", started=started
+        )
+        prefetcher = Prefetcher(assistant, kinds=["explain"])
+        prefetcher.start(image_file)
+        assert started.wait(5)
+
+        results, errors = [], []
+
+        def explain():
+            try:
+                results.append(assistant._get_explanation(image_file, ""))
+            except Exception as e:
+                errors.append(e)
+
+        foreground = threading.Thread(target=explain)
+        foreground.start()
+        time.sleep(0.1)
+        prefetcher.cancel()
+        foreground.join(5)
+        prefetcher.close()
+
+        assert errors == []
+        assert results[0][0].text == "x = 4"
+        assert assistant.single_flight.coalesced == 0
+
+    def test_spend_is_capped(self, make_assistant, image_file):
+        assistant = make_assistant()
+        prefetcher = Prefetcher(assistant, token_budget=1000)
+        prefetcher.start(image_file)
+
+        assert prefetcher.take("practice", image_file, timeout=5) is None
+        prefetcher.close()
+        assert assistant.client.messages.calls == []
+        assert prefetcher.stats()["skipped"] == 1
+
+    def test_unknown_kinds_are_rejected(self, make_assistant):
+        with pytest.raises(ValueError):
+            Prefetcher(make_assistant(), kinds=["solve"])
@@ -0,0 +1,64 @@
+import pytest
+from PIL import Image
+from math_assistant.batch import BatchRunner, find_images
+from math_assistant.config import Config
+from math_assistant.image_processor import ImageProcessor
+
+
+class TestProcessMany:
+    @pytest.fixture
+    def images(self, tmp_path):
+        paths = []
+        for i in range(3):
+            path = tmp_path / f"scan{i}.jpg"
+            Image.new("RGB", (1200 + i * 100, 900), "white").save(path)
+            paths.append(path)
+        return paths
+
+    def test_matches_single_image_encoding(self, images):
+        results = {r["path"]: r for r in ImageProcessor.process_many(images, 2)}
+        assert set(results) == set(images)
+
+        ImageProcessor.set_cache(None)
+        Config.IMAGE_CACHE_ENABLED, enabled = False, Config.IMAGE_CACHE_ENABLED
+        try:
+            for path in images:
+                data, media_type = ImageProcessor.encode_for_api(path)
+                assert results[path]["data"] == data
+                assert results[path]["media_type"] == media_type
+                assert results[path]["error"] is None
+        finally:
+            Config.IMAGE_CACHE_ENABLED = enabled
+
+    def test_results_fill_the_shared_cache(self, images):
+        list(ImageProcessor.process_many(images, 2))
+        cache = ImageProcessor.get_cache()
+        hits = cache.stats()["hits"]
+
+        ImageProcessor.encode_for_api(images[0])
+        assert cache.stats()["hits"] == hits + 1
+
+    def test_errors_are_reported_per_image(self, images, tmp_path):
+        broken = tmp_path / "broken.jpg"
+        broken.write_bytes(b"not a jpeg")
+        results = list(
+            ImageProcessor.process_many([*images, broken, tmp_path / "gone.png"], 2)
+        )
+
+        errors = [r for r in results if r["error"]]
+        assert len(results) == 5
+        assert {r["path"].name for r in errors} == {"broken.jpg", "gone.png"}
+        assert all(r["data"] is None for r in errors)
+
+    def test_batch_runner_pipeline(self, make_assistant, images, tmp_path):
+        assistant = make_assistant(text="The answer is 4")
+        runner = BatchRunner(
+            assistant, "explain", tmp_path / "out", preprocess_workers=2
+        )
+        results = runner.run(find_images(tmp_path))
+
+        assert [r["status"] for r in results] == ["ok", "ok", "ok"]
+        assert len(assistant.client.messages.calls) == 3
+        # One miss per image before the pool, then the requests hit memory
+        stats = ImageProcessor.get_cache().stats()
+        assert (stats["misses"], stats["hits"]) == (3, 3)
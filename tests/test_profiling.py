@@ -0,0 +1,82 @@
+import pstats
+import threading
+from click.testing import CliRunner
+from math_assistant.cli import main
+from math_assistant.profiling import Profiler, collapsed_stacks
+
+
+def busy_leaf():
+    return sum(i * i for i in range(20000))
+
+
+def busy_parent():
+    return [busy_leaf() for _ in range(5)]
+
+
+def allocate():
+    return [bytearray(1024) for _ in range(200)]
+
+
+class TestProfiler:
+    def test_writes_pstats_and_collapsed_stacks(self, tmp_path):
+        profiler = Profiler(tmp_path, name="unit")
+        profiler.start()
+        busy_parent()
+        kept = allocate()
+        report = profiler.stop()
+
+        stats = pstats.Stats(str(report["pstats_path"]))
+        assert any(name == "busy_leaf" for _, _, name in stats.stats)
+
+        lines = report["collapsed_path"].read_text().splitlines()
+        assert lines
+        for line in lines:
+            stack, value = line.rsplit(" ", 1)
+            assert int(value) > 0
+        assert any("busy_parent" in line and "busy_leaf" in line for line in lines)
+
+        assert report["peak_memory"] >= 200 * 1024
+        assert any(
+            "test_profiling.py" in site["location"]
+            for site in report["top_allocations"]
+        )
+        del kept
+
+    def test_threads_are_profiled(self, tmp_path):
+        profiler = Profiler(tmp_path)
+        profiler.start()
+        thread = threading.Thread(target=busy_parent)
+        thread.start()
+        thread.join()
+        report = profiler.stop()
+
+        stats = pstats.Stats(str(report["pstats_path"]))
+        assert any(name == "busy_leaf" for _, _, name in stats.stats)
+
+    def test_stack_times_add_up_to_the_roots(self, tmp_path):
+        profiler = Profiler(tmp_path)
+        profiler.start()
+        busy_parent()
+        report = profiler.stop()
+
+        stats = pstats.Stats(str(report["pstats_path"]))
+        roots = sum(entry[3] for entry in stats.stats.values() if not entry[4])
+        assert abs(sum(collapsed_stacks(stats).values()) - roots) < 1e-6
+
+
+def test_cli_profile_option(image_file, tmp_path, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    result = CliRunner().invoke(
+        main,
+        [
+            "--profile",
+            "--profile-dir",
+            str(tmp_path / "prof"),
+            "inspect",
+            str(image_file),
+        ],
+    )
+    assert result.exit_code == 0
+    assert "Peak traced memory" in result.output
+    names = sorted(path.suffix for path in (tmp_path / "prof").iterdir())
+    assert names == [".collapsed", ".pstats"]
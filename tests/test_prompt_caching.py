@@ -0,0 +1,66 @@
+from math_assistant.prompts import conversation_request
+from tests.fakes import make_message
+
+
+def breakpoints(params):
+    count = 0
+    for message in params["messages"]:
+        if isinstance(message["content"], list):
+            count += sum(
+                isinstance(block, dict) and "cache_control" in block
+                for block in message["content"]
+            )
+    return count
+
+
+class TestPromptCaching:
+    def test_image_sent_once_per_conversation(self, make_assistant, image_file):
+        assistant = make_assistant()
+        assistant.ask_about_problem(image_file, "Explain", format_style="basic")
+        assistant.ask_about_problem(image_file, "Why?", format_style="basic")
+        assistant.continue_conversation("And then?", format_style="basic")
+
+        calls = assistant.client.messages.calls
+        first_turns = [call["messages"][0]["content"] for call in calls]
+        # The same cached image opens every request in the conversation
+        assert all(turns[0]["type"] == "image" for turns in first_turns)
+        assert all("cache_control" in turns[0] for turns in first_turns)
+        images = [
+            block
+            for message in calls[-1]["messages"]
+            if isinstance(message["content"], list)
+            for block in message["content"]
+            if isinstance(block, dict) and block.get("type") == "image"
+        ]
+        assert len(images) == 1
+
+    def test_breakpoint_follows_the_image(self, make_assistant, image_file):
+        assistant = make_assistant()
+        assistant.explain_problem(image_file)
+        assistant.check_solution(image_file, "x = 4")
+        for call in assistant.client.messages.calls:
+            image, text = call["messages"][0]["content"]
+            assert image["type"] == "image" and "cache_control" in image
+            assert "cache_control" not in text
+            assert "system" not in call
+
+    def test_breakpoint_limit(self):
+        history = [
+            {"role": "user", "content": "q1"},
+            {"role": "assistant", "content": "a1"},
+            {"role": "user", "content": "q2"},
+        ]
+        image = {"type": "image", "source": {"type": "base64", "data": "x"}}
+        params = conversation_request(history, image, 0)
+        assert breakpoints(params) <= 4
+        assert "cache_control" in params["messages"][-1]["content"][-1]
+
+    def test_usage_includes_cache_tokens(self, make_assistant, image_file):
+        assistant = make_assistant()
+        assistant.client.messages.create = lambda **params: make_message(
+            "ok", cache_read_input_tokens=1500, cache_creation_input_tokens=0
+        )
+        assistant.explain_problem(image_file)
+        assistant.explain_problem(image_file)
+        assert assistant.last_usage["cache_read_input_tokens"] == 1500
+        assert assistant.get_usage()["cache_read_input_tokens"] == 3000
@@ -0,0 +1,85 @@
+import time
+from math_assistant.response_cache import ResponseCache, request_key
+
+
+class TestResponseCache:
+    def test_request_key_ignores_image_encoding_identity(self):
+        params = {
+            "model": "m",
+            "messages": [{"source": {"type": "base64", "data": "abc"}}],
+        }
+        same = {
+            "model": "m",
+            "messages": [{"source": {"type": "base64", "data": "abc"}}],
+        }
+        other = {
+            "model": "m",
+            "messages": [{"source": {"type": "base64", "data": "abd"}}],
+        }
+        assert request_key(params) == request_key(same)
+        assert request_key(params) != request_key(other)
+
+    def test_get_put_roundtrip(self, tmp_path):
+        cache = ResponseCache(tmp_path / "r.sqlite3")
+        assert cache.get("k") is None
+        cache.put("k", {"content": "x"})
+        assert cache.get("k") == {"content": "x"}
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+    def test_expired_entries_are_misses(self, tmp_path):
+        cache = ResponseCache(tmp_path / "r.sqlite3", ttl_seconds=0.01)
+        cache.put("k", {"content": "x"})
+        time.sleep(0.02)
+        assert cache.get("k") is None
+        assert cache.stats()["entries"] == 0
+
+    def test_lru_eviction_over_size_limit(self, tmp_path):
+        cache = ResponseCache(tmp_path / "r.sqlite3", max_bytes=80)
+        cache.put("a", {"content": "a" * 20})
+        cache.put("b", {"content": "b" * 20})
+        cache.get("a")
+        cache.put("c", {"content": "c" * 20})
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+
+    def test_size_total_is_kept_without_scanning(self, tmp_path):
+        cache = ResponseCache(tmp_path / "r.sqlite3", max_bytes=200)
+        for key in "abcdef":
+            cache.put(key, {"content": key * 20})
+        cache.put("f", {"content": "f" * 40})
+        cache.clear()
+        cache.put("g", {"content": "g" * 10})
+        other = ResponseCache(tmp_path / "r.sqlite3")
+        other.put("h", {"content": "h" * 10})
+        assert cache._total_bytes() == cache.stats()["total_bytes"]
+
+    def test_existing_database_gets_a_size_total(self, tmp_path):
+        cache = ResponseCache(tmp_path / "r.sqlite3")
+        cache.put("a", {"content": "a" * 20})
+        cache._conn.execute("DROP TABLE response_totals")
+        cache._conn.commit()
+        cache.close()
+        reopened = ResponseCache(tmp_path / "r.sqlite3")
+        assert reopened._total_bytes() == reopened.stats()["total_bytes"] > 0
+
+    def test_assistant_serves_repeat_explanations_from_cache(
+        self, make_assistant, image_file
+    ):
+        assistant = make_assistant(use_cache=True)
+        first = assistant.explain_problem(image_file)
+        second = assistant.explain_problem(image_file)
+        assert first == second
+        assert len(assistant.client.messages.calls) == 1
+
+    def test_refresh_bypasses_lookup(self, make_assistant, image_file):
+        make_assistant(use_cache=True).explain_problem(image_file)
+        assistant = make_assistant(use_cache=True, refresh_cache=True)
+        assistant.explain_problem(image_file)
+        assert len(assistant.client.messages.calls) == 1
+
+    def test_practice_problems_are_not_cached(self, make_assistant, image_file):
+        assistant = make_assistant(use_cache=True)
+        assistant.generate_similar_problems(image_file)
+        assistant.generate_similar_problems(image_file)
+        assert len(assistant.client.messages.calls) == 2
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+import anthropic
+import pytest
+from math_assistant.scheduler import RequestScheduler, TokenBucket, estimate_request
+from tests.fakes import make_message
+
+
+def status_error(status, headers=None):
+    # Stands in for the HTTP response the SDK attaches to status errors
+    response = SimpleNamespace(status_code=status, headers=headers or {}, request=None)
+    error_class = {
+        429: anthropic.RateLimitError,
+        400: anthropic.BadRequestError,
+        529: anthropic.OverloadedError,
+    }[status]
+    return error_class(f"status {status}", response=response, body=None)
+
+
+def sender(*outcomes):
+    """Build a send callable that raises or returns each outcome in turn."""
+    outcomes = list(outcomes)
+
+    def send():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome, {}
+
+    return send
+
+
+PARAMS = {"max_tokens": 100, "messages": [{"role": "user", "content": "hi"}]}
+
+
+class TestTokenBucket:
+    def test_refills_at_the_per_minute_rate(self):
+        bucket = TokenBucket(60)
+        now = time.monotonic()
+        bucket.take(60, now)
+        assert bucket.wait_time(1, now) == pytest.approx(1.0)
+        assert bucket.wait_time(1, now + 1) == 0
+
+    def test_oversized_requests_wait_for_a_full_bucket(self):
+        bucket = TokenBucket(100)
+        now = time.monotonic()
+        assert bucket.wait_time(500, now) == 0
+
+    def test_observe_adopts_server_limits(self):
+        bucket = TokenBucket(50)
+        now = time.monotonic()
+        bucket.observe(4000, 10, now)
+        assert bucket.capacity == 4000
+        assert bucket.tokens == 10
+
+
+class TestRequestScheduler:
+    def test_estimate_counts_text_and_images(self):
+        params = {
+            "max_tokens": 700,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [{"type": "image"}, {"type": "text", "text": "x" * 40}],
+                }
+            ],
+        }
+        assert estimate_request(params) == (1610, 700)
+
+    def test_retries_rate_limits_honouring_retry_after(self):
+        scheduler = RequestScheduler(max_concurrency=8)
+        send = sender(status_error(429, {"retry-after": "0"}), make_message("ok"))
+
+        message = scheduler.call(send, PARAMS)
+
+        assert message.content[0].text == "ok"
+        stats = scheduler.stats()
+        assert (stats["retries"], stats["rate_limited"]) == (1, 1)
+        assert stats["concurrency_limit"] < 8
+        assert stats["in_flight"] == 0
+
+    def test_client_errors_are_not_retried(self):
+        scheduler = RequestScheduler()
+        with pytest.raises(anthropic.BadRequestError):
+            scheduler.call(sender(status_error(400), make_message()), PARAMS)
+        assert scheduler.stats()["retries"] == 0
+
+    def test_gives_up_after_max_retries(self):
+        scheduler = RequestScheduler(max_retries=2, base_delay=0.001)
+        with pytest.raises(anthropic.OverloadedError):
+            scheduler.call(sender(*[status_error(529)] * 3), PARAMS)
+        assert scheduler.stats()["retries"] == 2
+
+    def test_limits_concurrency(self):
+        scheduler = RequestScheduler(max_concurrency=2)
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def send():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return make_message(), {}
+
+        threads = [
+            threading.Thread(target=scheduler.call, args=(send, PARAMS))
+            for _ in range(6)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert peak[0] == 2
+        assert scheduler.stats()["requests"] == 6
+
+    def test_headers_update_limits(self):
+        scheduler = RequestScheduler()
+        headers = {
+            "anthropic-ratelimit-requests-limit": "4000",
+            "anthropic-ratelimit-requests-remaining": "3999",
+        }
+        scheduler.call(lambda: (make_message(), headers), PARAMS)
+        assert scheduler.buckets["requests"].capacity == 4000
+
+    def test_async_retry(self):
+        scheduler = RequestScheduler()
+        outcomes = [status_error(429, {"retry-after-ms": "5"}), make_message("ok")]
+
+        async def send():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome, {}
+
+        message = asyncio.run(scheduler.acall(send, PARAMS))
+        assert message.content[0].text == "ok"
+        assert scheduler.stats()["retries"] == 1
+
+    def test_cancelled_call_releases_its_slot(self):
+        scheduler = RequestScheduler(max_concurrency=1)
+        tokens = scheduler.buckets["input_tokens"].tokens
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        async def send():
+            return make_message("ok"), {}
+
+        async def run():
+            task = asyncio.ensure_future(scheduler.acall(hang, PARAMS))
+            await asyncio.sleep(0.01)
+            assert scheduler.stats()["in_flight"] == 1
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert scheduler.stats()["in_flight"] == 0
+            assert scheduler.buckets["input_tokens"].tokens == pytest.approx(tokens)
+            return await asyncio.wait_for(scheduler.acall(send, PARAMS), 1)
+
+        assert asyncio.run(run()).content[0].text == "ok"
+
+    def test_interrupted_call_releases_its_slot(self):
+        scheduler = RequestScheduler(max_concurrency=1)
+
+        def interrupted():
+            raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            scheduler.call(interrupted, PARAMS)
+        assert scheduler.stats()["in_flight"] == 0
+
+    def test_assistant_requests_go_through_the_scheduler(
+        self, make_assistant, image_file
+    ):
+        assistant = make_assistant(text="x = 4")
+        assistant.client.messages.errors.append(status_error(429, {"retry-after": "0"}))
+        assert "x = 4" in assistant.explain_problem(image_file)
+        assert len(assistant.client.messages.calls) == 2
+        assert assistant.scheduler.stats()["rate_limited"] == 1
@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import time
+import pytest
+from math_assistant.singleflight import AsyncSingleFlight, SingleFlight
+from tests.fakes import AsyncFakeClient, make_message
+
+
+class TestSingleFlight:
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+        barrier = threading.Barrier(5)
+
+        def work():
+            calls.append(1)
+            time.sleep(0.1)
+            return "answer"
+
+        results = []
+
+        def caller():
+            barrier.wait()
+            results.append(flight.do("key", work))
+
+        threads = [threading.Thread(target=caller) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert [r[0] for r in results] == ["answer"] * 5
+        assert sorted(r[1] for r in results) == [False] + [True] * 4
+        assert flight.stats() == {"in_flight": 0, "coalesced": 4}
+
+    def test_errors_are_shared_and_not_remembered(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            flight.do("key", fail)
+        assert flight.do("key", lambda: "ok") == ("ok", False)
+
+    def test_async_callers_share_one_call(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        async def main():
+            return await asyncio.gather(*(flight.do("key", work) for _ in range(4)))
+
+        results = asyncio.run(main())
+        assert len(calls) == 1
+        assert [r[0] for r in results] == ["answer"] * 4
+        assert flight.coalesced == 3
+
+    def test_follower_takes_over_from_a_cancelled_leader(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        async def main():
+            leader = asyncio.ensure_future(flight.do("key", work))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do("key", work))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await asyncio.wait_for(follower, 1)
+
+        assert asyncio.run(main()) == ("answer", False)
+        assert len(calls) == 2
+        assert flight.stats() == {"in_flight": 0, "coalesced": 0}
+
+    def test_followers_share_the_retried_call(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        async def main():
+            leader = asyncio.ensure_future(flight.do("key", work))
+            await asyncio.sleep(0)
+            followers = [
+                asyncio.ensure_future(flight.do("key", work)) for _ in range(3)
+            ]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await asyncio.wait_for(asyncio.gather(*followers), 1)
+
+        results = asyncio.run(main())
+        assert len(calls) == 2
+        assert sorted(shared for _, shared in results) == [False, True, True]
+        assert flight.coalesced == 2
+
+
+class TestAssistantCoalescing:
+    def test_identical_explanations_make_one_api_call(self, make_assistant, image_file):
+        assistant = make_assistant(text="x = 4")
+        create = assistant.client.messages.create
+
+        def slow_create(**params):
+            time.sleep(0.1)
+            return create(**params)
+
+        assistant.client.messages.create = slow_create
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(assistant.explain_problem(image_file))
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(assistant.client.messages.calls) == 1
+        assert assistant.single_flight.coalesced == 3
+        assert all("x = 4" in r for r in results)
+        # Only the call that ran is counted
+        assert assistant.get_usage()["output_tokens"] == 5
+
+    def test_practice_problems_are_not_coalesced(self, make_assistant, image_file):
+        assistant = make_assistant()
+        assistant.generate_similar_problems(image_file)
+        assistant.generate_similar_problems(image_file)
+        assert assistant.single_flight.stats()["coalesced"] == 0
+        assert len(assistant.client.messages.calls) == 2
+
+    def test_async_assistant_coalesces(self, monkeypatch, image_file):
+        from math_assistant.async_assistant import AsyncMathAssistant
+        from math_assistant.config import Config
+
+        monkeypatch.setattr(Config, "ANTHROPIC_API_KEY", "test-key")
+
+        async def main():
+            async with AsyncMathAssistant() as assistant:
+                assistant.client = AsyncFakeClient("x = 4")
+                create = assistant.client.messages.create
+
+                async def slow_create(**params):
+                    await asyncio.sleep(0.1)
+                    return await create(**params)
+
+                assistant.client.messages.create = slow_create
+                await asyncio.gather(
+                    *(assistant.explain_problem(image_file) for _ in range(3))
+                )
+                return assistant
+
+        assistant = asyncio.run(main())
+        assert len(assistant.client.messages.calls) == 1
+        assert assistant.single_flight.coalesced == 2
+
+    def test_async_requests_can_opt_out_of_coalescing(self, monkeypatch):
+        from math_assistant.async_assistant import AsyncMathAssistant
+        from math_assistant.config import Config
+
+        monkeypatch.setattr(Config, "ANTHROPIC_API_KEY", "test-key")
+        params = {
+            "model": "m",
+            "max_tokens": 10,
+            "temperature": 0,
+            "messages": [{"role": "user", "content": "hi"}],
+        }
+
+        async def main():
+            async with AsyncMathAssistant() as assistant:
+                assistant.client = AsyncFakeClient("x = 4")
+                create = assistant.client.messages.create
+
+                async def slow_create(**kwargs):
+                    await asyncio.sleep(0.05)
+                    return await create(**kwargs)
+
+                assistant.client.messages.create = slow_create
+                await asyncio.gather(
+                    *(
+                        assistant._create_message(coalesce=False, **params)
+                        for _ in range(2)
+                    )
+                )
+                return assistant
+
+        assistant = asyncio.run(main())
+        assert len(assistant.client.messages.calls) == 2
+        assert assistant.single_flight.coalesced == 0
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Generous enough for slow CI machines; the real budget lives in
+# benchmarks/bench_startup.py.
+IMPORT_BUDGET_MS = 500
+
+
+def run_python(code, tmp_path):
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "MATH_ASSISTANT_CACHE_DIR": str(tmp_path / "cache"),
+        "ANTHROPIC_API_KEY": "test-key",
+    }
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=ROOT,
+        check=True,
+    ).stdout
+
+
+class TestStartup:
+    def test_cli_import_defers_heavy_packages(self, tmp_path):
+        loaded = run_python(
+            "import sys, math_assistant, math_assistant.cli; "
+            "print(' '.join(m for m in ('anthropic', 'PIL', 'rich') "
+            "if m in sys.modules))",
+            tmp_path,
+        )
+        assert loaded.split() == []
+
+    def test_package_exports_resolve_lazily(self):
+        import math_assistant
+        from math_assistant.math_assistant import MathAssistant
+
+        assert math_assistant.MathAssistant is MathAssistant
+        assert "AsyncMathAssistant" in dir(math_assistant)
+        with pytest.raises(AttributeError):
+            math_assistant.Missing
+
+    def test_basic_explain_never_imports_rich(self, tmp_path, image_file):
+        output = run_python(
+            "import sys, anthropic\n"
+            "from click.testing import CliRunner\n"
+            "from tests.fakes import FakeClient\n"
+            "anthropic.Anthropic = lambda **kwargs: FakeClient('x = 4')\n"
+            "from math_assistant.cli import main\n"
+            f"result = CliRunner().invoke(main, ['explain', {str(image_file)!r}, "
+            "'--format', 'basic'])\n"
+            "print(result.output.strip(), 'rich' in sys.modules)\n",
+            tmp_path,
+        )
+        assert "x = 4" in output
+        assert output.split()[-1] == "False"
+
+    def test_import_time_budget(self):
+        from benchmarks.bench_startup import importtime
+
+        best = min(importtime()["math_assistant.cli"] for _ in range(3))
+        assert best / 1000 < IMPORT_BUDGET_MS
@@ -0,0 +1,36 @@
+from math_assistant.formatters import LivePanel
+
+
+class TestStreaming:
+    def test_explain_streams_to_console(self, make_assistant, image_file, capsys):
+        assistant = make_assistant(text="Step one then step two")
+        assistant.explain_problem(image_file, format_style="pretty", stream=True)
+        assert "Step one then step two" in capsys.readouterr().out
+        assert assistant.client.messages.calls[0]["stream"] is True
+        assert assistant.last_time_to_first_token is not None
+
+    def test_conversation_streams_and_records_history(self, make_assistant):
+        assistant = make_assistant(text="Use the chain rule")
+        chunks = []
+        message = assistant._create_message(
+            on_text=chunks.append, model="m", max_tokens=10, messages=[]
+        )
+        assert "".join(chunks) == "Use the chain rule"
+        assert len(chunks) > 1
+        assert message.content[0].text == "Use the chain rule"
+
+    def test_cached_response_is_delivered_as_one_chunk(
+        self, make_assistant, image_file
+    ):
+        assistant = make_assistant(text="cached answer", use_cache=True)
+        assistant.explain_problem(image_file)
+        chunks = []
+        assistant._get_explanation(image_file, "", on_text=chunks.append)
+        assert chunks == ["cached answer"]
+        assert len(assistant.client.messages.calls) == 1
+
+    def test_live_panel_accumulates_text(self):
+        with LivePanel(title="Test") as live:
+            live.append("Hello")
+            live.append(" world")
+        assert live.text == "Hello world"
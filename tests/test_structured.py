@@ -0,0 +1,114 @@
+import json
+import pytest
+from PIL import Image
+from math_assistant.batch import BatchRunner, find_images
+from math_assistant.exceptions import APIError
+from math_assistant.formatters import ResponseFormatter
+from math_assistant.schemas import (
+    CHECK_TOOL,
+    EXPLANATION_TOOL,
+    PRACTICE_TOOL,
+    structured_request,
+    tool_result,
+)
+from tests.fakes import make_message, make_tool_message
+
+EXPLANATION = {
+    "concepts": ["linear equations"],
+    "steps": [{"description": "Subtract 3", "work": "2x = 8"}],
+    "answer": "x = 4",
+    "key_points": ["Undo operations in reverse order"],
+    "common_mistakes": ["Dividing before subtracting"],
+}
+
+
+class TestStructuredOutput:
+    def test_request_forces_the_tool(self):
+        params = structured_request({"max_tokens": 10}, "check")
+        assert params["tools"] == [CHECK_TOOL]
+        assert params["tool_choice"] == {"type": "tool", "name": CHECK_TOOL["name"]}
+
+    def test_explain_returns_the_parsed_object(self, make_assistant, image_file):
+        assistant = make_assistant()
+        assistant.client.messages.tool_input = EXPLANATION
+
+        assert assistant.explain_problem(image_file, structured=True) == EXPLANATION
+        assert assistant.client.messages.calls[0]["tool_choice"]["type"] == "tool"
+
+    def test_check_scores_each_step(self, make_assistant, image_file):
+        feedback = {
+            "correct": False,
+            "score": 0.5,
+            "steps": [
+                {"step": "2x = 8", "correct": True, "score": 1, "feedback": "Good"},
+                {"step": "x = 16", "correct": False, "score": 0, "feedback": "Divide"},
+            ],
+            "suggestions": [],
+            "alternative_methods": [],
+            "conceptual_understanding": "Partial",
+        }
+        assistant = make_assistant()
+        assistant.client.messages.tool_input = feedback
+        result = assistant.check_solution(image_file, "x = 16", structured=True)
+        assert [step["score"] for step in result["steps"]] == [1, 0]
+
+    def test_missing_tool_call_is_an_error(self):
+        with pytest.raises(APIError):
+            tool_result(make_message("plain text").content, "explain")
+
+    def test_truncated_tool_call_is_an_error(self, make_assistant, image_file):
+        assistant = make_assistant()
+        message = make_tool_message(
+            EXPLANATION_TOOL["name"], {"concepts": ["linear equations"]}
+        )
+        assistant.client.messages.create = lambda **params: message.model_copy(
+            update={"stop_reason": "max_tokens"}
+        )
+        with pytest.raises(APIError, match="max_tokens"):
+            assistant.explain_problem(image_file, structured=True)
+
+    @pytest.mark.parametrize(
+        "tool_input",
+        [
+            {key: value for key, value in EXPLANATION.items() if key != "answer"},
+            {**EXPLANATION, "steps": [{"description": "Subtract 3"}]},
+            {**EXPLANATION, "concepts": "linear equations"},
+        ],
+    )
+    def test_tool_input_must_match_the_schema(self, tool_input):
+        content = make_tool_message(EXPLANATION_TOOL["name"], tool_input).content
+        with pytest.raises(APIError, match="schema"):
+            tool_result(content, "explain")
+
+    def test_practice_difficulty_must_be_in_the_enum(self):
+        problem = {
+            "statement": "Solve 3x + 1 = 7",
+            "solution": "x = 2",
+            "difficulty": "trivial",
+            "concepts": [],
+        }
+        content = make_tool_message(
+            PRACTICE_TOOL["name"], {"problems": [problem]}
+        ).content
+        with pytest.raises(APIError, match=r"problems\[0\]\.difficulty"):
+            tool_result(content, "practice")
+
+    def test_batch_writes_json_results(self, make_assistant, tmp_path):
+        Image.new("RGB", (100, 100), "white").save(tmp_path / "p0.jpg")
+        assistant = make_assistant()
+        assistant.client.messages.tool_input = EXPLANATION
+        streamed = []
+        runner = BatchRunner(assistant, "explain", tmp_path / "out", structured=True)
+        results = runner.run(find_images(tmp_path), on_complete=streamed.append)
+
+        assert streamed[0]["result"] == EXPLANATION
+        assert json.loads(json.dumps(streamed[0]))["status"] == "ok"
+        with open(results[0]["output"], encoding="utf-8") as f:
+            assert json.load(f) == EXPLANATION
+        summary = json.loads((tmp_path / "out" / "summary.json").read_text())
+        assert "result" not in summary["results"][0]
+
+
+def test_clean_text_reads_content_blocks():
+    content = make_message("Step 1: x = 4\n\\frac{a}{b}").content
+    assert ResponseFormatter.clean_text(content) == "Step 1: x = 4\n\\frac{a}{b}"